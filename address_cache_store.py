@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Defines the on-disk store of address cleaning results for the Data Joiner application.
+Results are kept in a local SQLite file keyed on the cleaning-rules fingerprint and the
+normalized address, so later sessions only classify addresses they have not seen yet.
+
+Usage:
+    python address_cache_store.py size     # show how many results are stored
+    python address_cache_store.py clear    # delete all stored results
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+
+class PersistentAddressCache:
+    """An SQLite-backed store of cleaning results shared across sessions."""
+
+    def __init__(self, path="address_cache.sqlite"):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS address_cache ("
+            " fingerprint TEXT NOT NULL,"
+            " address TEXT NOT NULL,"
+            " cleaned TEXT NOT NULL,"
+            " auto_cleaned TEXT NOT NULL,"
+            " may_have_word TEXT NOT NULL,"
+            " PRIMARY KEY (fingerprint, address)"
+            ") WITHOUT ROWID"
+        )
+        return conn
+
+    def get_many(self, fingerprint, keys):
+        """Look up each key, returning a list of (cleaned, auto_cleaned, may_have_word) tuples or None"""
+        keys = list(keys)
+        if not keys:
+            return []
+        with closing(self._connect()) as conn:
+            stored = conn.execute(
+                "SELECT COUNT(*) FROM address_cache WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()[0]
+            if len(keys) * 4 >= stored:
+                # Large lookups are cheaper as one sequential scan of the rule set
+                rows = conn.execute(
+                    "SELECT address, cleaned, auto_cleaned, may_have_word"
+                    " FROM address_cache WHERE fingerprint = ?",
+                    (fingerprint,)
+                )
+            else:
+                # Join against a temporary table instead of building huge IN (...) lists
+                conn.execute("CREATE TEMP TABLE lookup (address TEXT PRIMARY KEY)")
+                conn.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((key,) for key in keys))
+                rows = conn.execute(
+                    "SELECT c.address, c.cleaned, c.auto_cleaned, c.may_have_word"
+                    " FROM lookup l JOIN address_cache c ON c.fingerprint = ? AND c.address = l.address",
+                    (fingerprint,)
+                )
+            found = {row[0]: row[1:] for row in rows}
+        return [found.get(key) for key in keys]
+
+    def put_many(self, fingerprint, keys, cleaned_addresses, auto_cleaned_flags, may_have_word_flags):
+        """Store results for the given keys under the rules fingerprint"""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO address_cache VALUES (?, ?, ?, ?, ?)",
+                ((fingerprint, key, cleaned, auto_cleaned, may_have_word)
+                 for key, cleaned, auto_cleaned, may_have_word
+                 in zip(keys, cleaned_addresses, auto_cleaned_flags, may_have_word_flags))
+            )
+
+    def info(self):
+        """Return a dict with the number of stored results, per rule set, and the file size"""
+        if not os.path.exists(self.path):
+            return {"entries": 0, "rule_sets": {}, "file_bytes": 0}
+        with closing(self._connect()) as conn:
+            rule_sets = dict(conn.execute(
+                "SELECT fingerprint, COUNT(*) FROM address_cache GROUP BY fingerprint"
+            ).fetchall())
+        return {
+            "entries": sum(rule_sets.values()),
+            "rule_sets": rule_sets,
+            "file_bytes": os.path.getsize(self.path),
+        }
+
+    def describe(self):
+        """Return a short human-readable summary of the store"""
+        info = self.info()
+        return (f"{info['entries']:,} stored addresses across {len(info['rule_sets'])} rule set(s), "
+                f"{info['file_bytes'] / (1024 * 1024):.1f} MB ({self.path})")
+
+    def clear(self):
+        """Delete all stored results and shrink the file"""
+        if not os.path.exists(self.path):
+            return
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM address_cache")
+            conn.execute("VACUUM")
+
+
+def main():
+    """Show the size of, or clear, the on-disk address cache"""
+    parser = argparse.ArgumentParser(description="Manage the on-disk address cleaning cache.")
+    parser.add_argument("command", choices=["size", "clear"], help="'size' to show the cache size, 'clear' to empty it")
+    parser.add_argument("--path", default="address_cache.sqlite", help="Cache file (default: address_cache.sqlite)")
+    args = parser.parse_args()
+
+    store = PersistentAddressCache(args.path)
+    if args.command == "clear":
+        store.clear()
+        print(f"Cleared address cache: {args.path}")
+    else:
+        print(store.describe())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Defines the vectorized address-cleaning engine for the Data Joiner application.
+The cleaning rules from settings.json are compiled once into combined regular
+expressions and applied to a whole address column with pandas string methods.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from default_settings import DefaultSettings
+
+
+# The cleaner used inside each worker process of the parallel pool
+_worker_cleaner = None
+
+
+def _init_worker(settings):
+    """Compile the cleaning settings once per worker process"""
+    global _worker_cleaner
+    _worker_cleaner = AddressCleaner(settings)
+
+
+def _clean_chunk(addresses):
+    """Clean one chunk of distinct addresses inside a worker process"""
+    return _worker_cleaner.clean_unique(addresses)
+
+
+def rules_fingerprint(settings):
+    """Return a short hash of the settings that affect cleaning results"""
+    rules = {key: settings.get(key, []) for key in ("apartment_words", "po_box_words", "number_patterns")}
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class AddressCleaningCache:
+    """A bounded LRU cache of cleaning results keyed on the normalized (stripped) address."""
+
+    def __init__(self, max_entries=1000000):
+        self.max_entries = max_entries
+        self.fingerprint = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.last_hits = 0
+        self.last_misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def hit_rate(self):
+        """Share of lookups answered from the cache since it was last cleared"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def last_hit_rate(self):
+        """Share of lookups answered from the cache in the most recent get_many call"""
+        lookups = self.last_hits + self.last_misses
+        return self.last_hits / lookups if lookups else 0.0
+
+    def clear(self):
+        """Drop all cached results and reset the statistics"""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.last_hits = 0
+        self.last_misses = 0
+
+    def bind(self, fingerprint):
+        """Tie the cache to a set of cleaning rules, clearing it if the rules changed"""
+        if fingerprint != self.fingerprint:
+            self.clear()
+            self.fingerprint = fingerprint
+
+    def get_many(self, keys):
+        """Look up each key, returning a list of (cleaned, auto_cleaned, may_have_word) tuples or None"""
+        results = []
+        for key in keys:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+            results.append(result)
+
+        self.last_misses = results.count(None)
+        self.last_hits = len(results) - self.last_misses
+        self.hits += self.last_hits
+        self.misses += self.last_misses
+        return results
+
+    def put_many(self, keys, cleaned_addresses, auto_cleaned_flags, may_have_word_flags):
+        """Store results for the given keys, evicting the least recently used entries"""
+        for key, result in zip(keys, zip(cleaned_addresses, auto_cleaned_flags, may_have_word_flags)):
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        """Return a one-line summary of the cache for status messages"""
+        return (f"{len(self.entries):,} cached addresses, {self.last_hit_rate:.1%} hit rate this run "
+                f"({self.hit_rate:.1%} overall)")
+
+
+class AddressCleaner:
+    """Compiles the address cleaning settings and applies them to whole columns."""
+
+    def __init__(self, settings, cache=None, store=None):
+        self.settings = settings
+        self.fingerprint = rules_fingerprint(settings)
+        self.cache = cache
+        self.store = store
+        if self.cache is not None:
+            self.cache.bind(self.fingerprint)
+        defaults = DefaultSettings.get_defaults()
+        self.parallel_workers = int(settings.get("parallel_workers", defaults["parallel_workers"]))
+        self.parallel_chunk_size = int(settings.get("parallel_chunk_size", defaults["parallel_chunk_size"]))
+        self.parallel_min_rows = int(settings.get("parallel_min_rows", defaults["parallel_min_rows"]))
+
+        self.apartment_words = list(settings.get("apartment_words", []))
+        self.po_box_words = list(settings.get("po_box_words", []))
+        self.number_patterns = list(settings.get("number_patterns", []))
+
+        # One alternation for every apartment word. The lazy prefix group captures
+        # everything before the earliest match, which is where the address is cut.
+        self.apartment_regex = None
+        if self.apartment_words:
+            words = "|".join(re.escape(word.upper()) for word in self.apartment_words)
+            self.apartment_regex = re.compile(r"(?s)^(.*?)\b(?:" + words + r")\b")
+
+        # '#', the PO Box words (plain substrings) and the number patterns all lead to the
+        # same review flag, so they are merged into a single alternation where possible.
+        literals = [re.escape("#")] + [re.escape(word.upper()) for word in self.po_box_words]
+        combinable, self.separate_number_regexes = self._split_number_patterns(self.number_patterns)
+        self.review_regex = re.compile("|".join(literals + [f"(?:{pattern})" for pattern in combinable]))
+
+    @staticmethod
+    def _split_number_patterns(patterns):
+        """Split the number patterns into combinable sources and standalone compiled regexes"""
+        compiled = [re.compile(pattern) for pattern in patterns]
+        # Patterns with their own groups or global flags cannot be safely merged into
+        # one alternation (group numbers would shift), so they are kept on their own.
+        combinable = [c.pattern for c in compiled if c.groups == 0 and not c.pattern.startswith("(?")]
+        separate = [c for c in compiled if c.groups != 0 or c.pattern.startswith("(?")]
+        return combinable, separate
+
+    def clean(self, address_series, progress=None):
+        """
+        Processes an address series based on the cleaning rules:
+        1. Auto-cleans addresses with high-confidence 'apartment_words'.
+        2. Flags addresses with ambiguous patterns ('#', PO Box, number patterns) for manual review.
+        Returns three Series: cleaned_addresses, auto_cleaned_flags, may_have_word_flags.
+        progress, if given, is called with (done, total) distinct addresses as they are cleaned.
+        """
+        values = pd.Series(address_series)
+        category_codes = None
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # The categories are already the distinct addresses
+            category_codes = values.cat.codes.to_numpy()
+            values = pd.Series(values.cat.categories, dtype=object)
+        else:
+            values = values.astype(object).reset_index(drop=True)
+        missing = values.isna()
+        if pd.api.types.infer_dtype(values, skipna=True) != "string":
+            values = values.where(missing, values[~missing].map(str))
+
+        # Each distinct address is only cleaned once. Missing values get code -1, which
+        # picks up the empty result appended to the end of each array.
+        codes, uniques = pd.factorize(values)
+        if category_codes is not None:
+            codes = np.where(category_codes >= 0, codes[category_codes], -1)
+        if self.cache is None and self.store is None:
+            cleaned_addresses, auto_cleaned_flags, may_have_word_flags = self.clean_distinct(uniques, progress)
+        else:
+            cleaned_addresses, auto_cleaned_flags, may_have_word_flags = self.clean_cached(uniques, progress)
+
+        return (
+            pd.Series(np.append(cleaned_addresses, "")[codes]),
+            pd.Series(np.append(auto_cleaned_flags, "No")[codes]),
+            pd.Series(np.append(may_have_word_flags, "No")[codes]),
+        )
+
+    def clean_cached(self, addresses, progress=None):
+        """
+        Cleans an array of distinct addresses, only classifying those missing from the
+        in-memory cache and the on-disk store.
+        Returns three object arrays: cleaned_addresses, auto_cleaned_flags, may_have_word_flags.
+        """
+        # Results only depend on the stripped text, so that is the cache key
+        key_codes, keys = pd.factorize(pd.Series(addresses, dtype=object).str.strip())
+        keys = keys.to_numpy(dtype=object)
+        results = [np.empty(len(keys), dtype=object) for _ in range(3)]
+        missing = np.ones(len(keys), dtype=bool)
+
+        def fill(positions, found):
+            for i in range(3):
+                results[i][positions] = [result[i] for result in found]
+            missing[positions] = False
+
+        if self.cache is not None:
+            cached = self.cache.get_many(keys)
+            hits = np.flatnonzero([result is not None for result in cached])
+            fill(hits, [cached[i] for i in hits])
+
+        if self.store is not None and missing.any():
+            lookup = np.flatnonzero(missing)
+            stored = self.store.get_many(self.fingerprint, keys[lookup])
+            hits = lookup[[result is not None for result in stored]]
+            fill(hits, [result for result in stored if result is not None])
+            if self.cache is not None and len(hits):
+                self.cache.put_many(keys[hits], *(results[i][hits] for i in range(3)))
+
+        if missing.any():
+            lookup = np.flatnonzero(missing)
+            fresh = self.clean_distinct(keys[lookup], progress)
+            for i in range(3):
+                results[i][lookup] = fresh[i]
+            if self.cache is not None:
+                self.cache.put_many(keys[lookup], *fresh)
+            if self.store is not None:
+                self.store.put_many(self.fingerprint, keys[lookup], *fresh)
+
+        return tuple(result[key_codes] for result in results)
+
+    def worker_count(self):
+        """Number of worker processes to use (0 in settings means one per CPU)"""
+        return self.parallel_workers if self.parallel_workers > 0 else (os.cpu_count() or 1)
+
+    def clean_distinct(self, addresses, progress=None):
+        """
+        Cleans an array of distinct addresses, in a process pool when it is large enough.
+        Small inputs are cleaned in-process because starting the pool would cost more than it saves.
+        """
+        workers = self.worker_count()
+        chunk_size = max(1, self.parallel_chunk_size)
+        chunks = [addresses[start:start + chunk_size] for start in range(0, len(addresses), chunk_size)]
+        results = []
+
+        if workers <= 1 or len(addresses) < max(self.parallel_min_rows, self.parallel_chunk_size):
+            if progress is None or len(chunks) <= 1:
+                results = [self.clean_unique(addresses)]
+            else:
+                # Clean chunk by chunk so progress (and cancelling) can happen in between
+                for start, chunk in zip(range(0, len(addresses), chunk_size), chunks):
+                    results.append(self.clean_unique(chunk))
+                    progress(start + len(chunk), len(addresses))
+        else:
+            pool = ProcessPoolExecutor(max_workers=min(workers, len(chunks)),
+                                       initializer=_init_worker, initargs=(self.settings,))
+            try:
+                # map() yields results in submission order, so the chunks line up again
+                for start, result in zip(range(0, len(addresses), chunk_size), pool.map(_clean_chunk, chunks)):
+                    results.append(result)
+                    if progress is not None:
+                        progress(start + len(result[0]), len(addresses))
+            finally:
+                # Queued chunks are dropped straight away if a progress report cancelled the task
+                pool.shutdown(cancel_futures=True)
+
+        if progress is not None:
+            progress(len(addresses), len(addresses))
+        return tuple(np.concatenate([result[i] for result in results]) for i in range(3))
+
+    def clean_unique(self, addresses):
+        """
+        Cleans an array of non-missing address strings.
+        Returns three object arrays: cleaned_addresses, auto_cleaned_flags, may_have_word_flags.
+        """
+        row_count = len(addresses)
+        cleaned_addresses = np.full(row_count, "", dtype=object)
+        auto_cleaned_flags = np.full(row_count, "No", dtype=object)
+        may_have_word_flags = np.full(row_count, "No", dtype=object)
+
+        stripped = pd.Series(addresses, dtype=object).str.strip()
+        stripped = stripped[stripped != ""]
+        if stripped.empty:
+            return cleaned_addresses, auto_cleaned_flags, may_have_word_flags
+
+        cleaned_addresses[stripped.index.to_numpy()] = stripped.to_numpy()
+        upper = stripped.str.upper()
+
+        # --- 1. High-Confidence Auto-Cleaning ---
+        auto_cleaned = pd.Series(False, index=stripped.index)
+        if self.apartment_regex is not None:
+            prefixes = upper.str.extract(self.apartment_regex, expand=False).dropna()
+            prefix_lengths = prefixes.str.len()
+            # A match is only used when it starts inside the original (non-uppercased) text.
+            prefix_lengths = prefix_lengths[prefix_lengths < stripped[prefixes.index].str.len()]
+            auto_cleaned[prefix_lengths.index] = True
+
+            auto_positions = prefix_lengths.index.to_numpy()
+            cleaned_addresses[auto_positions] = [
+                address[:length].strip()
+                for address, length in zip(stripped[prefix_lengths.index], prefix_lengths)
+            ]
+            auto_cleaned_flags[auto_positions] = "Yes"
+
+        # --- 2. Flag for Manual Review (No Auto-Cleaning) ---
+        review_upper = upper[~auto_cleaned]
+        flag_for_review = review_upper.str.contains(self.review_regex, regex=True)
+        for number_regex in self.separate_number_regexes:
+            flag_for_review |= review_upper.map(number_regex.search).notna()
+
+        may_have_word_flags[flag_for_review[flag_for_review].index.to_numpy()] = "Yes"
+
+        return cleaned_addresses, auto_cleaned_flags, may_have_word_flags
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Defines the approximate address matching used by the address join of the Data Joiner
+application. Addresses are first normalized with the USPS standard abbreviations
+(Publication 28), so "123 North Main Street" and "123 N Main St" become the same text
+and match through a hash lookup. Addresses still unmatched are only compared with
+candidates sharing their house number and either their ZIP code or the first letter
+of their street name, so the slow similarity score is computed for a few pairs per
+address rather than for every pair.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# USPS Publication 28, Appendix C1: street suffixes (the common spellings of each)
+STREET_SUFFIXES = {
+    "ALLEY": "ALY", "ALLEE": "ALY", "ALLY": "ALY",
+    "ANNEX": "ANX", "ANNX": "ANX",
+    "ARCADE": "ARC",
+    "AVENUE": "AVE", "AV": "AVE", "AVEN": "AVE", "AVENU": "AVE", "AVN": "AVE", "AVNUE": "AVE",
+    "BAYOU": "BYU", "BAYOO": "BYU",
+    "BEACH": "BCH",
+    "BEND": "BND",
+    "BLUFF": "BLF",
+    "BOULEVARD": "BLVD", "BOUL": "BLVD", "BOULV": "BLVD",
+    "BRANCH": "BR", "BRNCH": "BR",
+    "BRIDGE": "BRG", "BRDGE": "BRG",
+    "BROOK": "BRK",
+    "BYPASS": "BYP", "BYPA": "BYP", "BYPAS": "BYP", "BYPS": "BYP",
+    "CAMP": "CP", "CMP": "CP",
+    "CANYON": "CYN", "CANYN": "CYN", "CNYN": "CYN",
+    "CAUSEWAY": "CSWY", "CAUSWA": "CSWY",
+    "CENTER": "CTR", "CEN": "CTR", "CENT": "CTR", "CENTR": "CTR", "CENTRE": "CTR", "CNTER": "CTR", "CNTR": "CTR",
+    "CIRCLE": "CIR", "CIRC": "CIR", "CIRCL": "CIR", "CRCL": "CIR", "CRCLE": "CIR",
+    "CLIFF": "CLF",
+    "CLUB": "CLB",
+    "COMMON": "CMN",
+    "CORNER": "COR",
+    "COURSE": "CRSE",
+    "COURT": "CT",
+    "COVE": "CV",
+    "CREEK": "CRK",
+    "CRESCENT": "CRES", "CRSENT": "CRES", "CRSNT": "CRES",
+    "CROSSING": "XING", "CRSSNG": "XING",
+    "DALE": "DL",
+    "DAM": "DM",
+    "DIVIDE": "DV", "DIV": "DV", "DVD": "DV",
+    "DRIVE": "DR", "DRIV": "DR", "DRV": "DR",
+    "ESTATE": "EST",
+    "ESTATES": "ESTS",
+    "EXPRESSWAY": "EXPY", "EXP": "EXPY", "EXPR": "EXPY", "EXPRESS": "EXPY", "EXPW": "EXPY",
+    "EXTENSION": "EXT", "EXTN": "EXT", "EXTNSN": "EXT",
+    "FALLS": "FLS",
+    "FERRY": "FRY", "FRRY": "FRY",
+    "FIELD": "FLD",
+    "FIELDS": "FLDS",
+    "FOREST": "FRST", "FORESTS": "FRST",
+    "FORGE": "FRG", "FORG": "FRG",
+    "FORK": "FRK",
+    "FORT": "FT", "FRT": "FT",
+    "FREEWAY": "FWY", "FREEWY": "FWY", "FRWAY": "FWY", "FRWY": "FWY",
+    "GARDEN": "GDN", "GARDN": "GDN", "GRDEN": "GDN", "GRDN": "GDN",
+    "GARDENS": "GDNS", "GRDNS": "GDNS",
+    "GATEWAY": "GTWY", "GATEWY": "GTWY", "GATWAY": "GTWY", "GTWAY": "GTWY",
+    "GLEN": "GLN",
+    "GREEN": "GRN",
+    "GROVE": "GRV", "GROV": "GRV",
+    "HARBOR": "HBR", "HARB": "HBR", "HARBR": "HBR", "HRBOR": "HBR",
+    "HEIGHTS": "HTS", "HT": "HTS",
+    "HIGHWAY": "HWY", "HIGHWY": "HWY", "HIWAY": "HWY", "HIWY": "HWY", "HWAY": "HWY",
+    "HILL": "HL",
+    "HILLS": "HLS",
+    "HOLLOW": "HOLW", "HLLW": "HOLW", "HOLLOWS": "HOLW", "HOLWS": "HOLW",
+    "ISLAND": "IS", "ISLND": "IS",
+    "JUNCTION": "JCT", "JCTION": "JCT", "JCTN": "JCT", "JUNCTN": "JCT", "JUNCTON": "JCT",
+    "KNOLL": "KNL", "KNOL": "KNL",
+    "LAKE": "LK",
+    "LAKES": "LKS",
+    "LANDING": "LNDG", "LNDNG": "LNDG",
+    "LANE": "LN",
+    "LIGHT": "LGT",
+    "LOOP": "LOOP", "LOOPS": "LOOP",
+    "MANOR": "MNR",
+    "MEADOW": "MDW",
+    "MEADOWS": "MDWS", "MEDOWS": "MDWS",
+    "MILL": "ML",
+    "MISSION": "MSN", "MISSN": "MSN", "MSSN": "MSN",
+    "MOTORWAY": "MTWY",
+    "MOUNT": "MT", "MNT": "MT",
+    "MOUNTAIN": "MTN", "MNTAIN": "MTN", "MNTN": "MTN", "MOUNTIN": "MTN", "MTIN": "MTN",
+    "ORCHARD": "ORCH", "ORCHRD": "ORCH",
+    "PARKWAY": "PKWY", "PARKWY": "PKWY", "PKWAY": "PKWY", "PKY": "PKWY",
+    "PASSAGE": "PSGE",
+    "PIKE": "PIKE", "PIKES": "PIKE",
+    "PINE": "PNE",
+    "PINES": "PNES",
+    "PLACE": "PL",
+    "PLAIN": "PLN",
+    "PLAINS": "PLNS",
+    "PLAZA": "PLZ", "PLZA": "PLZ",
+    "POINT": "PT",
+    "POINTS": "PTS",
+    "PORT": "PRT",
+    "PRAIRIE": "PR", "PRR": "PR",
+    "RANCH": "RNCH", "RANCHES": "RNCH", "RNCHS": "RNCH",
+    "RIDGE": "RDG", "RDGE": "RDG",
+    "RIVER": "RIV", "RVR": "RIV", "RIVR": "RIV",
+    "ROAD": "RD",
+    "ROUTE": "RTE",
+    "SHORE": "SHR", "SHOAR": "SHR",
+    "SPRING": "SPG", "SPNG": "SPG", "SPRNG": "SPG",
+    "SPRINGS": "SPGS", "SPNGS": "SPGS", "SPRNGS": "SPGS",
+    "SQUARE": "SQ", "SQR": "SQ", "SQRE": "SQ", "SQU": "SQ",
+    "STATION": "STA", "STATN": "STA", "STN": "STA",
+    "STREET": "ST", "STRT": "ST", "STR": "ST",
+    "SUMMIT": "SMT", "SUMIT": "SMT", "SUMITT": "SMT",
+    "TERRACE": "TER", "TERR": "TER",
+    "TRACE": "TRCE", "TRACES": "TRCE",
+    "TRAIL": "TRL", "TRAILS": "TRL", "TRLS": "TRL",
+    "TUNNEL": "TUNL", "TUNEL": "TUNL", "TUNLS": "TUNL", "TUNNELS": "TUNL", "TUNNL": "TUNL",
+    "TURNPIKE": "TPKE", "TRNPK": "TPKE", "TURNPK": "TPKE",
+    "UNION": "UN",
+    "VALLEY": "VLY", "VALLY": "VLY", "VLLY": "VLY",
+    "VIADUCT": "VIA", "VDCT": "VIA", "VIADCT": "VIA",
+    "VIEW": "VW",
+    "VILLAGE": "VLG", "VILL": "VLG", "VILLAG": "VLG", "VILLG": "VLG", "VILLIAGE": "VLG",
+    "VILLE": "VL",
+    "VISTA": "VIS", "VIST": "VIS", "VST": "VIS", "VSTA": "VIS",
+    "WALKS": "WALK",
+    "WELL": "WL",
+    "WELLS": "WLS",
+}
+
+# USPS Publication 28, Appendix B: directionals
+DIRECTIONALS = {
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+    "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+
+# USPS Publication 28, Appendix C2: secondary unit designators
+UNIT_DESIGNATORS = {
+    "APARTMENT": "APT", "BUILDING": "BLDG", "DEPARTMENT": "DEPT", "FLOOR": "FL",
+    "HANGAR": "HNGR", "LOBBY": "LBBY", "OFFICE": "OFC", "PENTHOUSE": "PH",
+    "ROOM": "RM", "SPACE": "SPC", "SUITE": "STE", "TRAILER": "TRLR",
+}
+
+ABBREVIATIONS = {**STREET_SUFFIXES, **DIRECTIONALS, **UNIT_DESIGNATORS}
+
+# Every word with a standard abbreviation, as one alternation
+ABBREVIATION_REGEX = re.compile(r"\b(" + "|".join(sorted(ABBREVIATIONS, key=len, reverse=True)) + r")\b")
+
+# Anything but letters, digits and spaces becomes a space
+PUNCTUATION_REGEX = re.compile(r"[^A-Z0-9 ]+")
+
+# House number, street and ZIP code (ZIP+4 keeps its first five digits) of a normalized address
+PARTS_REGEX = re.compile(r"^(?:(\d+[A-Z]?)\b)?\s*(.*?)\s*(?:\b(\d{5})(?: \d{4})?)?$")
+
+# The first letter of a street name, after any directional
+STREET_INITIAL_REGEX = re.compile(r"^(?:(?:N|S|E|W|NE|NW|SE|SW) (?=\S))?(\S)")
+
+
+def _abbreviate(match):
+    word = match.group(1)
+    if word in STREET_SUFFIXES:
+        # A suffix word that starts the street name is part of the name ("PINE RD", "N COURT ST")
+        before = match.string[:match.start()].split()
+        if not before or before[-1][0].isdigit() or before[-1] in DIRECTIONALS or before[-1] in DIRECTIONALS.values():
+            return word
+    return ABBREVIATIONS[word]
+
+
+def normalize_addresses(addresses):
+    """
+    Return addresses (a Series) in USPS standard form: upper case, punctuation removed,
+    single spaces and standard abbreviations ("North Main Street" -> "N MAIN ST").
+    Missing addresses stay missing.
+    """
+    text = addresses.astype(str).where(addresses.notna())
+    text = text.str.upper().str.replace(PUNCTUATION_REGEX, " ", regex=True)
+    text = text.str.split().str.join(" ")
+    return text.str.replace(ABBREVIATION_REGEX, _abbreviate, regex=True)
+
+
+def address_parts(normalized):
+    """
+    Split normalized addresses into a DataFrame of 'House', 'Street', 'ZIP' and
+    'Street_Initial' (the first letter of the street name, used for blocking, so a
+    misspelling after it still finds its candidates).
+    """
+    parts = normalized.str.extract(PARTS_REGEX)
+    parts.columns = ["House", "Street", "ZIP"]
+    parts["Street"] = parts["Street"].fillna("")
+    parts["Street_Initial"] = parts["Street"].str.extract(STREET_INITIAL_REGEX, expand=False)
+    return parts
+
+
+# Pairs scored at once; pairs are grouped by length so short ones are not padded to long ones
+SCORE_BATCH_ROWS = 50000
+
+
+def _edit_distances(a, b):
+    """
+    Return the edit distances (insertions, deletions, substitutions and swaps of two
+    neighbouring characters) between two equal-length arrays of ASCII strings. Every pair
+    is computed at once: each row of the distance table is one set of array operations.
+    """
+    a_codes = np.array(a, dtype="S")
+    b_codes = np.array(b, dtype="S")
+    a_lengths = np.char.str_len(a_codes)
+    b_lengths = np.char.str_len(b_codes)
+    width = max(1, b_codes.itemsize)
+    A = a_codes.view(np.uint8).reshape(len(a), -1) if a_codes.itemsize else np.zeros((len(a), 0), np.uint8)
+    B = b_codes.view(np.uint8).reshape(len(b), width) if b_codes.itemsize else np.zeros((len(b), 1), np.uint8)
+    B_columns = B.shape[1]
+    steps = np.arange(B_columns + 1, dtype=np.int32)
+
+    distances = b_lengths.astype(np.int32)     # the distance from an empty string
+    before = None
+    previous = np.broadcast_to(steps, (len(a), B_columns + 1))
+    for i in range(1, A.shape[1] + 1):
+        char = A[:, i - 1][:, None]
+        # Substitution (or a match) and deletion, for every column at once
+        best = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + (char != B))
+        if before is not None and B_columns > 1:
+            swapped = (char == B[:, :-1]) & (A[:, i - 2][:, None] == B[:, 1:])
+            best[:, 1:] = np.where(swapped, np.minimum(best[:, 1:], before[:, :-2] + 1), best[:, 1:])
+        # Insertions run along the row: cell j = min over k <= j of (best k + j - k), a running minimum
+        shifted = np.concatenate([np.full((len(a), 1), i, dtype=np.int32), best - steps[1:]], axis=1)
+        current = np.minimum.accumulate(shifted, axis=1) + steps
+        ended = a_lengths == i
+        distances[ended] = current[ended, b_lengths[ended]]
+        before, previous = previous, current
+    return distances
+
+
+def similarity_scores(a, b, threshold=0.0):
+    """
+    Return how alike each pair of strings in a and b is, from 0 to 1: one minus the edit
+    distance divided by the longer length. Pairs whose lengths alone put them below
+    threshold are not compared and score 0.
+    """
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    a_lengths = np.fromiter(map(len, a), dtype=np.int64, count=len(a))
+    b_lengths = np.fromiter(map(len, b), dtype=np.int64, count=len(b))
+    longest = np.maximum(np.maximum(a_lengths, b_lengths), 1)
+    scores = np.zeros(len(a))
+    candidates = np.flatnonzero(1 - np.abs(a_lengths - b_lengths) / longest >= threshold)
+    candidates = candidates[np.argsort(longest[candidates], kind="stable")]
+    for start in range(0, len(candidates), SCORE_BATCH_ROWS):
+        batch = candidates[start:start + SCORE_BATCH_ROWS]
+        scores[batch] = 1 - _edit_distances(a[batch], b[batch]) / longest[batch]
+    return scores
+
+
+def similarity(a, b):
+    """Return how alike two strings are, from 0 to 1 (see similarity_scores)"""
+    return float(similarity_scores([a], [b])[0])
+
+
+class AddressMatcher:
+    """
+    Matches addresses against a fixed list of reference addresses. The reference side is
+    normalized and indexed once, so matching several tables against it (or the same
+    table again) only normalizes and looks up the new addresses.
+    """
+
+    def __init__(self, addresses, threshold=0.85):
+        if not 0 < threshold <= 1:
+            raise ValueError(f"The match threshold must be above 0 and at most 1, not {threshold}")
+        self.threshold = threshold
+        normalized = normalize_addresses(pd.Series(addresses).reset_index(drop=True))
+        first = ~normalized.duplicated() & normalized.notna()
+        self.duplicate_addresses = int((normalized.duplicated() & normalized.notna()).sum())
+        # One entry per distinct normalized address, pointing at its first row
+        self.rows = np.flatnonzero(first)
+        self.index = pd.Index(normalized[first].to_numpy())
+        self.parts = address_parts(normalized[first]).reset_index(drop=True)
+        self.parts["Reference"] = np.arange(len(self.parts))
+
+    def match(self, addresses, progress=None):
+        """
+        Match each address to a reference address. Returns (positions, scores): the row of
+        the matched reference address (-1 for none) and the similarity (1 for addresses
+        equal once normalized, NaN for none).
+        progress, if given, is called with (done, total) candidate pairs scored.
+        """
+        codes, distinct = pd.factorize(pd.Series(addresses), use_na_sentinel=True)
+        normalized = normalize_addresses(pd.Series(distinct, dtype=object))
+        found = self.index.get_indexer(normalized.to_numpy())
+        scores = np.where(found >= 0, 1.0, np.nan)
+
+        # Addresses with no exact match are scored against the reference addresses in their blocks
+        pending = np.flatnonzero((found < 0) & normalized.notna().to_numpy())
+        if len(pending) and len(self.parts):
+            parts = address_parts(normalized.iloc[pending]).reset_index(drop=True)
+            parts["Address"] = pending
+            best = self._best_candidates(parts.dropna(subset=["House"]), progress)
+            found[best.index.to_numpy()] = best["Reference"].to_numpy()
+            scores[best.index.to_numpy()] = best["Score"].to_numpy()
+
+        positions = np.where(found >= 0, self.rows[np.maximum(found, 0)] if len(self.rows) else -1, -1)
+        positions = np.append(positions, -1)[codes]      # code -1 (a missing address) is the appended entry
+        return positions, np.append(scores, np.nan)[codes]
+
+    def _best_candidates(self, parts, progress=None):
+        """The best reference address at or above the threshold for each address, indexed by 'Address'"""
+        blocks = []
+        for keys in (["House", "ZIP"], ["House", "Street_Initial"]):
+            blocks.append(parts.dropna(subset=keys).merge(self.parts.dropna(subset=keys), on=keys,
+                                                          suffixes=("", "_reference")))
+        pairs = pd.concat(blocks, ignore_index=True).drop_duplicates(subset=["Address", "Reference"])
+        # Two different ZIP codes are two different places, however alike the streets are
+        pairs = pairs[pairs["ZIP"].isna() | pairs["ZIP_reference"].isna() | (pairs["ZIP"] == pairs["ZIP_reference"])]
+        if pairs.empty:
+            return pd.DataFrame({"Reference": [], "Score": []})
+
+        streets = pairs["Street"].to_numpy(dtype=object)
+        references = pairs["Street_reference"].to_numpy(dtype=object)
+        step = 10 * SCORE_BATCH_ROWS
+        scores = np.empty(len(pairs))
+        for start in range(0, len(pairs), step):
+            stop = min(start + step, len(pairs))
+            scores[start:stop] = similarity_scores(streets[start:stop], references[start:stop], self.threshold)
+            if progress is not None:
+                progress(stop, len(pairs))
+        pairs = pairs.assign(Score=scores)
+        pairs = pairs[pairs["Score"] >= self.threshold]
+        # The highest score wins; equal scores keep the earliest reference address
+        best = pairs.sort_values(["Address", "Score", "Reference"], ascending=[True, False, True])
+        return best.drop_duplicates(subset="Address").set_index("Address")[["Reference", "Score"]]
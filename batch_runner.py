@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Defines the command-line batch runner for the Data Joiner application.
+A job manifest (JSON, or YAML when PyYAML is installed) lists the same choices the
+user makes in the GUI, and the whole workflow runs end to end without a window.
+
+Usage:
+    python batch_runner.py monthly_job.json
+    python batch_runner.py monthly_job.yaml --settings settings.json
+
+Example manifest (paths are relative to the manifest file):
+    {
+      "datasets": [
+        {"path": "clients_january.xlsx", "sheet": "Sheet1", "month": "January",
+         "year": 2024, "service": "Outreach", "renames": {"Addr": "Address"}}
+      ],
+      "address_column": "Address",
+      "additional_dataset": {"path": "visits.csv", "summarize_column": "Client",
+                             "join_column": "Client"},
+      "join_column": "Client_ID",
+      "dedup_column": "Client_ID",
+      "dedup_tie_breakers": [["Service", ["Housing", "Outreach"]], ["Dataset_Name", "file order"]],
+      "exports": {"final": "output/final.xlsx", "cleaned": "output/cleaned.csv"}
+    }
+
+"dedup_column" may also be a list of columns (a composite key). "dedup_tie_breakers"
+(optional) orders rows from the same month: each entry is a column (smallest first) or
+[column, order] with order "ascending", "descending", "file order" (the order of
+"datasets") or a list of values, best first.
+
+Set "match_addresses": true to join on addresses (e.g. "join_column": "new_Address")
+that are alike rather than equal: "123 North Main Street" matches "123 N Main St", and
+misspellings match at the same house number. "match_threshold" (0-1, optional) sets how
+alike they must be; the default is the address_match_threshold setting.
+
+"client_name_columns" (optional, e.g. ["First_Name", "Last_Name"]) links rows that are
+the same client spelled differently (names and cleaned addresses alike, at least the
+client_match_threshold setting) and gives them the same "Client_Cluster", which can be
+used as the "dedup_column".
+
+Each export's format comes from its extension: .xlsx, .csv, .csv.gz, .csv.zst (needs
+zstandard), .parquet (needs pyarrow) or .sqlite (a table named "export", with the join
+and dedup columns indexed). The rows deduplication dropped for each key are written
+next to the final export (output/final_dropped.csv for the example above), or wherever
+"dropped" under "exports" says.
+
+For CSV extracts too large to hold in memory, replace "exports" with
+    "stream": {"output": "output/joined.csv", "chunk_rows": 100000}
+to run steps 1-7 one chunk at a time and write the joined rows (not deduplicated) to
+the output file.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+import pipeline
+from address_cache_store import PersistentAddressCache
+from address_cleaner import AddressCleaner, AddressCleaningCache
+from dataset_cache import DatasetCache
+from default_settings import DefaultSettings
+
+
+# The tables a manifest can export, by the name used under "exports"
+EXPORTABLE_STAGES = {
+    "combined": "combined_data",
+    "cleaned": "cleaned_data",
+    "summarized": "summarized_additional_data",
+    "joined": "joined_additional_data",
+    "final": "final_data",
+    "dropped": "dropped_report",
+}
+
+
+def dropped_report_path(export_path):
+    """Where the dropped-rows report goes beside an export: output/final.xlsx -> output/final_dropped.csv"""
+    for extension, _ in pipeline.EXPORT_EXTENSIONS:
+        if export_path.lower().endswith(extension):
+            return export_path[:-len(extension)] + "_dropped.csv"
+    return os.path.splitext(export_path)[0] + "_dropped.csv"
+
+
+def load_manifest(path):
+    """Read a JSON or YAML job manifest"""
+    with open(path, 'r') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise pipeline.PipelineError("YAML manifests need PyYAML (pip install pyyaml), or use a JSON manifest.")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if not isinstance(manifest, dict):
+        raise pipeline.PipelineError(f"Manifest {path} must contain a mapping of job options.")
+    return manifest
+
+
+def load_settings(path):
+    """Load settings.json on top of the defaults, like the desktop app does"""
+    settings = DefaultSettings.get_defaults()
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            settings.update(json.load(f))
+    return settings
+
+
+def config_from_manifest(manifest, base_dir, settings):
+    """Build a PipelineConfig from a manifest, resolving file paths against base_dir"""
+    required = ["datasets", "address_column", "additional_dataset", "join_column", "dedup_column"]
+    missing = [key for key in required if key not in manifest]
+    if missing:
+        raise pipeline.PipelineError(f"Manifest is missing: {', '.join(missing)}")
+
+    additional = manifest["additional_dataset"]
+    for key in ("path", "summarize_column"):
+        if key not in additional:
+            raise pipeline.PipelineError(f"additional_dataset is missing '{key}'")
+
+    datasets = []
+    for spec in manifest["datasets"]:
+        if "path" not in spec:
+            raise pipeline.PipelineError("Every entry in datasets needs a 'path'")
+        datasets.append(dict(spec, path=os.path.join(base_dir, spec["path"])))
+
+    return pipeline.PipelineConfig(
+        datasets=datasets,
+        address_column=manifest["address_column"],
+        additional_dataset=dict(additional, path=os.path.join(base_dir, additional["path"])),
+        summarize_column=additional["summarize_column"],
+        cleaned_join_column=manifest["join_column"],
+        # The summary is keyed on the summarized column unless told otherwise
+        additional_join_column=additional.get("join_column", additional["summarize_column"]),
+        dedup_column=manifest["dedup_column"],
+        dedup_tie_breakers=manifest.get("dedup_tie_breakers", []),
+        settings=settings,
+        match_addresses=manifest.get("match_addresses", False),
+        match_threshold=manifest.get("match_threshold"),
+        client_name_columns=manifest.get("client_name_columns", []),
+    )
+
+
+def export_results(result, exports, base_dir, index_columns=()):
+    """
+    Write each requested stage table and return {path: ExportReport}. The format comes
+    from each path's extension; index_columns are indexed in SQLite exports.
+    """
+    unknown = [stage for stage in exports if stage not in EXPORTABLE_STAGES]
+    if unknown:
+        raise pipeline.PipelineError(
+            f"Unknown export(s): {', '.join(unknown)}. Choose from: {', '.join(EXPORTABLE_STAGES)}"
+        )
+
+    reports = {}
+    for stage, path in exports.items():
+        path = os.path.join(base_dir, path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        reports[path] = pipeline.export_dataset(getattr(result, EXPORTABLE_STAGES[stage]), path,
+                                                index_columns=index_columns)
+    return reports
+
+
+def run_job(manifest_path, settings_path="settings.json"):
+    """Run a manifest end to end, printing per-stage timings"""
+    manifest = load_manifest(manifest_path)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    settings = load_settings(settings_path)
+    config = config_from_manifest(manifest, base_dir, settings)
+
+    store = PersistentAddressCache(settings["cache_file"]) if settings.get("cache_file") else None
+    cache = AddressCleaningCache(settings["cache_max_entries"])
+    cleaner = AddressCleaner(settings, cache=cache, store=store)
+    if "stream" in manifest:
+        return run_streaming_job(manifest["stream"], config, cleaner, base_dir)
+
+    dataset_cache = DatasetCache(settings["dataset_cache_dir"]) if settings.get("dataset_cache_dir") else None
+    result = pipeline.run_pipeline(config, cleaner=cleaner, dataset_cache=dataset_cache)
+    dedup_columns = [config.dedup_column] if isinstance(config.dedup_column, str) else list(config.dedup_column)
+    exports = dict(manifest.get("exports", {"final": "final_data.xlsx"}))
+    if "dropped" not in exports:
+        exports["dropped"] = dropped_report_path(exports.get("final", next(iter(exports.values()), "final_data.xlsx")))
+    export_reports = export_results(result, exports, base_dir, [config.cleaned_join_column] + dedup_columns)
+
+    print(f"Loaded {len(result.datasets)} dataset(s), {len(result.combined_data):,} combined rows, "
+          f"{len(result.final_data):,} rows after deduplication ({result.dedup.describe().lower()})")
+    if result.clients is not None:
+        print(f"Duplicate clients: {result.clients.describe()}")
+    print(f"Left join: {result.join.report.describe()}")
+    print("File load times:")
+    for load in result.file_loads:
+        print(f"  {os.path.basename(load.file_path):<30} {load.seconds:8.2f}s  {len(load.data):,} rows"
+              + ("  (cached)" if load.cached else ""))
+    print("Stage timings:")
+    for stage, seconds in result.timings.items():
+        print(f"  {stage:<16} {seconds:8.2f}s")
+    for path, report in export_reports.items():
+        print(f"  {'export':<16} {report.seconds:8.2f}s  {path} ({report.rows_per_second:,.0f} rows/s"
+              + (f", {len(report.parts)} sheets)" if len(report.parts) > 1 else ")"))
+    export_seconds = sum(report.seconds for report in export_reports.values())
+    print(f"  {'total':<16} {sum(result.timings.values()) + export_seconds:8.2f}s")
+    return result
+
+
+def run_streaming_job(stream, config, cleaner, base_dir):
+    """Stream the datasets chunk by chunk into one output CSV, printing per-stage timings"""
+    if "output" not in stream:
+        raise pipeline.PipelineError("stream is missing 'output'")
+    output_path = os.path.join(base_dir, stream["output"])
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    result = pipeline.stream_pipeline(config, output_path, int(stream.get("chunk_rows", 100000)), cleaner)
+
+    print(f"Streamed {len(config.datasets)} dataset(s), {result.rows_written:,} joined rows written to {output_path}")
+    print("Stage timings:")
+    for stage, seconds in result.timings.items():
+        print(f"  {stage:<16} {seconds:8.2f}s")
+    print(f"  {'total':<16} {sum(result.timings.values()):8.2f}s")
+    return result
+
+
+def main(argv=None):
+    """Run a batch job from the command line"""
+    parser = argparse.ArgumentParser(description="Run the Data Joiner workflow from a job manifest.")
+    parser.add_argument("manifest", help="JSON or YAML job manifest")
+    parser.add_argument("--settings", default="settings.json", help="Cleaning settings file (default: settings.json)")
+    args = parser.parse_args(argv)
+
+    try:
+        run_job(args.manifest, args.settings)
+    except Exception as e:
+        print(f"Batch job failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Data Joiner processing engines.
+Run `python benchmarks.py --help` to list the available benchmarks.
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from address_cleaner import AddressCleaner
+from data_grid import DEFAULT_VISIBLE_ROWS, filter_mask, format_rows
+from default_settings import DefaultSettings
+from stage_store import StageSnapshotStore
+from step_graph import StepGraph
+
+
+def legacy_clean_address_column(address_series, settings):
+    """The original per-row cleaning loop, kept as the reference implementation"""
+    cleaned_addresses = []
+    auto_cleaned_flags = []
+    may_have_word_flags = []
+
+    for address in address_series:
+        if pd.isna(address):
+            cleaned_addresses.append("")
+            auto_cleaned_flags.append("No")
+            may_have_word_flags.append("No")
+            continue
+
+        address_str = str(address).strip()
+        if not address_str:
+            cleaned_addresses.append("")
+            auto_cleaned_flags.append("No")
+            may_have_word_flags.append("No")
+            continue
+
+        address_upper = address_str.upper()
+
+        earliest_pos = len(address_str)
+        found_apt_word = False
+        for word in settings["apartment_words"]:
+            pattern = r'\b' + re.escape(word.upper()) + r'\b'
+            match = re.search(pattern, address_upper)
+            if match and match.start() < earliest_pos:
+                earliest_pos = match.start()
+                found_apt_word = True
+
+        if found_apt_word:
+            cleaned_addresses.append(address_str[:earliest_pos].strip())
+            auto_cleaned_flags.append("Yes")
+            may_have_word_flags.append("No")
+            continue
+
+        flag_for_review = False
+        if '#' in address_str:
+            flag_for_review = True
+
+        if not flag_for_review:
+            for po_box in settings["po_box_words"]:
+                if po_box.upper() in address_upper:
+                    flag_for_review = True
+                    break
+
+        if not flag_for_review:
+            for pattern in settings["number_patterns"]:
+                if re.search(pattern, address_upper):
+                    flag_for_review = True
+                    break
+
+        cleaned_addresses.append(address_str)
+        auto_cleaned_flags.append("No")
+        may_have_word_flags.append("Yes" if flag_for_review else "No")
+
+    return pd.Series(cleaned_addresses), pd.Series(auto_cleaned_flags), pd.Series(may_have_word_flags)
+
+
+def legacy_detect_and_skip_dummy_rows(df):
+    """The original per-cell dummy-row check, kept as the reference implementation"""
+    for i in range(min(10, len(df))):  # Check first 10 rows
+        row = df.iloc[i]
+        nan_count = row.isna().sum()
+        non_numeric_count = 0
+
+        for val in row:
+            try:
+                if pd.notna(val):
+                    try:
+                        float(str(val))
+                    except (ValueError, TypeError):
+                        non_numeric_count += 1
+            except (TypeError, ValueError):
+                non_numeric_count += 1
+
+        # If more than 70% of values are NaN or non-numeric, consider it a dummy row
+        if (nan_count + non_numeric_count) / len(row) > 0.7:
+            continue
+        else:
+            # Found the header row, return data starting from here
+            return df.iloc[i:].reset_index(drop=True)
+
+    return df
+
+
+def legacy_combine_datasets(datasets, dataset_info):
+    """The original combine step (copy, reindex and concat every dataset), kept as the reference implementation"""
+    first_dataset_name = next(iter(datasets))
+    ordered_columns = list(datasets[first_dataset_name].columns)
+    all_columns_set = set(ordered_columns)
+    for name, df in datasets.items():
+        for col in df.columns:
+            if col not in all_columns_set:
+                ordered_columns.append(col)
+                all_columns_set.add(col)
+
+    combined_dfs = []
+    for name, df in datasets.items():
+        info = dataset_info.get(name, {'month': 'Unknown', 'year': 0, 'service': 'Unknown'})
+        df_copy = df.copy()
+        df_copy = df_copy.reindex(columns=ordered_columns, fill_value="")
+        df_copy['Month'] = str(info.get('month', 'Unknown'))
+        df_copy['Year'] = info.get('year', 0)
+        df_copy['Service'] = str(info.get('service', 'Unknown'))
+        df_copy['Dataset_Name'] = str(name)
+        combined_dfs.append(df_copy)
+
+    combined = pd.concat(combined_dfs, ignore_index=True, sort=False)
+    for col in combined.columns:
+        if combined[col].dtype == 'object':
+            combined[col] = combined[col].replace('nan', pd.NA)
+    return combined
+
+
+def legacy_deduplicate_by_date(df, group_by_col):
+    """Original Step 8: sort the whole table by Year and Month, then drop duplicates"""
+    df = df.copy()
+    df['Month_Num'] = df['Month'].map(pipeline.MONTH_NUMBERS).astype('float64').fillna(0)
+    df_sorted = df.sort_values(by=['Year', 'Month_Num'], ascending=[False, False])
+    return df_sorted.drop_duplicates(subset=[group_by_col], keep='first').drop(columns=['Month_Num'])
+
+
+def legacy_preview_rows(dataframe, preview_rows=200):
+    """Original preview: format the first rows with iterrows (every one of them went into the tree)"""
+    rows = []
+    for i, row in dataframe.head(preview_rows).iterrows():
+        values = []
+        for val in row:
+            try:
+                if pd.notna(val):
+                    values.append(str(val))
+                else:
+                    values.append("")
+            except (TypeError, ValueError):
+                values.append("")
+        rows.append(values)
+    return rows
+
+
+def make_synthetic_addresses(rows, distinct=None, seed=0):
+    """
+    Create a Series of realistic-looking addresses with a mix of unit styles.
+    Like a monthly client roll-up, rows are drawn from a pool of `distinct` client
+    addresses (default: one fifth of the rows) so the same address repeats.
+    """
+    rng = np.random.default_rng(seed)
+    distinct = distinct or max(1, rows // 5)
+    streets = np.array(["Main St", "Oak Ave", "Pine Street", "Elm Dr", "Maple Ln", "Cedar Ct",
+                        "N Washington Blvd", "Lakeview Rd", "Unity Way", "Lotus Pl"])
+    suffixes = np.array(["", "", "", " Apt 4B", " Unit 12", " #5", " Suite 100", " apt 2",
+                         " PO Box 77", " Lot 3", " 2nd Floor", " Bldg C", " 12A"])
+    numbers = rng.integers(1, 20000, size=distinct).astype(str)
+    pool = pd.Series(numbers).str.cat(
+        [pd.Series(" " + streets[rng.integers(0, len(streets), size=distinct)]),
+         pd.Series(suffixes[rng.integers(0, len(suffixes), size=distinct)])]
+    ).to_numpy(dtype=object)
+    addresses = pd.Series(pool[rng.integers(0, distinct, size=rows)], dtype=object)
+    # Sprinkle in missing and blank values like real exports have
+    addresses[rng.random(rows) < 0.01] = None
+    addresses[rng.random(rows) < 0.01] = "   "
+    return addresses
+
+
+def make_synthetic_client_data(rows, seed=0):
+    """Create a client export with an ID, an address and a numeric column"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Client_ID": pd.Series(rng.integers(0, max(1, rows // 3), size=rows)).map("C{:07d}".format),
+        "Address": make_synthetic_addresses(rows, seed=seed),
+        "Visits": rng.integers(0, 12, size=rows),
+    })
+
+
+def make_wide_report(rows, columns=250, banner_rows=6, seed=0):
+    """Create a wide export: title rows above a mix of numeric and text columns (a third are text)"""
+    rng = np.random.default_rng(seed)
+    statuses = np.array(["Active", "Closed", "Pending", "Referred"], dtype=object)
+    data = {}
+    for i in range(columns):
+        if i % 3 == 2:
+            data[f"Status_{i}"] = statuses[rng.integers(0, len(statuses), size=rows)]
+        else:
+            data[f"Metric_{i}"] = rng.integers(0, 1000, size=rows).astype(object)
+    data["Address"] = make_synthetic_addresses(rows, seed=seed).to_numpy(dtype=object)
+    banner = pd.DataFrame([{"Metric_0": f"REPORT LINE {i}", "Metric_1": "Generated 2024-01-31"}
+                           for i in range(banner_rows)], columns=list(data))
+    return pd.concat([banner, pd.DataFrame(data)], ignore_index=True).astype(object)
+
+
+def time_call(func, *args, **kwargs):
+    """Run func once and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_address_cleaning(rows):
+    """Compare the vectorized AddressCleaner against the legacy per-row loop"""
+    settings = DefaultSettings.get_defaults()
+    addresses = make_synthetic_addresses(rows)
+
+    legacy, legacy_seconds = time_call(legacy_clean_address_column, addresses, settings)
+    vectorized, vectorized_seconds = time_call(AddressCleaner(settings).clean, addresses)
+
+    for expected, actual in zip(legacy, vectorized):
+        pd.testing.assert_series_equal(expected, actual)
+
+    print(f"Address cleaning on {rows:,} rows ({addresses.nunique():,} distinct addresses)")
+    print(f"  legacy loop:       {legacy_seconds:8.2f} s")
+    print(f"  AddressCleaner:    {vectorized_seconds:8.2f} s")
+    print(f"  speedup:           {legacy_seconds / vectorized_seconds:8.1f}x (outputs identical)")
+
+
+def benchmark_parallel_address_cleaning(rows):
+    """Compare in-process cleaning against the process pool on all-distinct addresses"""
+    settings = DefaultSettings.get_defaults()
+    addresses = make_synthetic_addresses(rows, distinct=rows)
+    parallel = AddressCleaner(dict(settings, parallel_min_rows=0))
+
+    in_process, in_process_seconds = time_call(AddressCleaner(dict(settings, parallel_workers=1)).clean, addresses)
+    pooled, pooled_seconds = time_call(parallel.clean, addresses)
+
+    for expected, actual in zip(in_process, pooled):
+        pd.testing.assert_series_equal(expected, actual)
+
+    print(f"Parallel address cleaning on {rows:,} distinct rows")
+    print(f"  in-process:        {in_process_seconds:8.2f} s")
+    print(f"  {parallel.worker_count()} worker(s):       {pooled_seconds:8.2f} s")
+    print(f"  speedup:           {in_process_seconds / pooled_seconds:8.1f}x (outputs identical)")
+
+
+def benchmark_dummy_rows(rows, repeats=200):
+    """Compare the vectorized dummy-row check against the original per-cell loop on a wide export"""
+    report = make_wide_report(min(rows, 1000))
+
+    legacy, legacy_seconds = time_call(lambda: [legacy_detect_and_skip_dummy_rows(report) for _ in range(repeats)])
+    vectorized, vectorized_seconds = time_call(lambda: [pipeline.detect_and_skip_dummy_rows(report) for _ in range(repeats)])
+    pd.testing.assert_frame_equal(legacy[0], vectorized[0])
+
+    print(f"Dummy-row detection on a {report.shape[1]}-column export, {repeats} files")
+    print(f"  legacy loop:       {legacy_seconds:8.2f} s")
+    print(f"  vectorized:        {vectorized_seconds:8.2f} s")
+    print(f"  speedup:           {legacy_seconds / vectorized_seconds:8.1f}x (outputs identical)")
+
+
+def benchmark_combine(rows, months=12):
+    """Compare the peak memory of the original combine step against the column-by-column one"""
+    clients = make_synthetic_client_data(rows)
+    # Monthly files have the same columns, except that a Notes column appears halfway through the year
+    bounds = np.linspace(0, rows, months + 1).astype(int)
+    datasets, info = {}, {}
+    for i, month in enumerate(list(pipeline.MONTH_NUMBERS)[:months]):
+        df = clients.iloc[bounds[i]:bounds[i + 1]].reset_index(drop=True)
+        if i >= months // 2:
+            df = df.assign(Notes="Follow up")
+        datasets[f"clients_{month.lower()}"] = df
+        info[f"clients_{month.lower()}"] = {"month": month, "year": 2024, "service": "Outreach"}
+    del clients
+
+    runs = [
+        ("copy and concat", lambda: legacy_combine_datasets(datasets, info)),
+        ("column by column", lambda: pipeline.combine_datasets(datasets, info)),
+    ]
+    results = {}
+    for name, run in runs:
+        combined, seconds = time_call(run)
+        size = combined.memory_usage(deep=True).sum()
+        del combined
+        # Tracing slows pandas down a lot, so memory is measured on a separate run
+        tracemalloc.start()
+        run()
+        results[name] = (tracemalloc.get_traced_memory()[1], size, seconds)
+        tracemalloc.stop()
+
+    print(f"Combining {months} monthly datasets, {rows:,} rows in total")
+    for name, (peak, size, seconds) in results.items():
+        print(f"  {name + ':':<19}{peak / (1024 * 1024):8.0f} MB peak, {size / (1024 * 1024):8.0f} MB result, {seconds:6.2f} s")
+
+
+def benchmark_categorical_dtypes(rows, months=12):
+    """Compare the memory use, sorting and grouping of the cleaned table stored as text and as categoricals"""
+    rng = np.random.default_rng(0)
+    statuses = np.array(["Active", "Closed", "Pending", "Referred"], dtype=object)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        datasets, info = {}, {}
+        for i, month in enumerate(list(pipeline.MONTH_NUMBERS)[:months]):
+            # Round trip through CSV so every cell is its own string, as in loaded files
+            path = os.path.join(temp_dir, f"clients_{month.lower()}.csv")
+            clients = make_synthetic_client_data(rows // months, seed=i)
+            clients["Status"] = statuses[rng.integers(0, len(statuses), size=len(clients))]
+            clients.to_csv(path, index=False)
+            datasets[f"clients_{month.lower()}"] = pipeline.read_dataset(path)
+            info[f"clients_{month.lower()}"] = {"month": month, "year": 2024, "service": "Outreach"}
+
+    combined = pipeline.combine_datasets(datasets, info)
+    cleaned = pipeline.clean_address_data(combined, "Address", AddressCleaner(DefaultSettings.get_defaults()))
+    optimized = pipeline.clean_address_data(pipeline.optimize_dtypes(combined), "Address",
+                                            AddressCleaner(DefaultSettings.get_defaults()))
+    # The same table as the original steps stored it: every text column as strings
+    text = cleaned.astype({col: str for col in cleaned.columns if isinstance(cleaned[col].dtype, pd.CategoricalDtype)})
+
+    group_columns = ["Status", "Address_may_have_word"]
+    print(f"Cleaned table of {len(text):,} rows ({', '.join(col for col in optimized.columns if isinstance(optimized[col].dtype, pd.CategoricalDtype))} categorical)")
+    for name, df in [("text", text), ("categorical", optimized)]:
+        _, sort_seconds = time_call(df.sort_values, group_columns + ["Month"])
+        _, group_seconds = time_call(lambda: df.groupby(group_columns, observed=True)["Visits"].sum())
+        print(f"  {name + ':':<19}{df.memory_usage(deep=True).sum() / (1024 * 1024):8.0f} MB, "
+              f"sort {sort_seconds:6.2f} s, group {group_seconds:6.2f} s")
+
+
+def benchmark_stage_snapshots(rows, months=12):
+    """Compare the memory held by keeping every stage as its own table against the stage snapshot store"""
+    clients = make_synthetic_client_data(rows)
+    bounds = np.linspace(0, rows, months + 1).astype(int)
+    datasets = {f"clients_{i + 1:02d}": clients.iloc[bounds[i]:bounds[i + 1]].reset_index(drop=True) for i in range(months)}
+    info = {name: {"month": month, "year": 2024, "service": "Outreach"}
+            for name, month in zip(datasets, pipeline.MONTH_NUMBERS)}
+    summary = pipeline.summarize_additional_data(clients[["Client_ID"]].sample(frac=0.2, random_state=0), "Client_ID")
+    cleaner = AddressCleaner(DefaultSettings.get_defaults())
+    del clients
+
+    def separate_copies():
+        # The way the tables used to be kept: each step's output, plus a full backup before cleaning
+        combined = pipeline.combine_datasets(datasets, info)
+        pre_cleaned = combined.copy()
+        cleaned = pipeline.clean_address_data(combined, "Address", cleaner).copy()
+        joined = pipeline.join_additional_dataset(cleaned, summary, "Client_ID", "Client_ID")
+        return [combined, pre_cleaned, cleaned, joined, pipeline.deduplicate_by_date(joined, "Client_ID")]
+
+    def snapshots():
+        store = StageSnapshotStore()
+        store.put("combined", pipeline.combine_datasets(datasets, info))
+        store.put("pre_cleaned", store.get("combined"), base="combined")
+        store.put("cleaned", pipeline.clean_address_data(store.get("combined"), "Address", cleaner), base="combined")
+        store.put("joined", pipeline.join_additional_dataset(store.get("cleaned"), summary, "Client_ID", "Client_ID"),
+                  base="cleaned")
+        store.put("final", pipeline.deduplicate_by_date(store.get("joined"), "Client_ID"), base="joined")
+        return store
+
+    print(f"Memory held after steps 3-8 on {rows:,} rows")
+    for name, run in [("separate tables", separate_copies), ("stage snapshots", snapshots)]:
+        tracemalloc.start()
+        kept = run()
+        held, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+        print(f"  {name + ':':<19}{held / (1024 * 1024):8.0f} MB held, {peak / (1024 * 1024):8.0f} MB peak")
+
+
+def benchmark_incremental(rows, months=12):
+    """Compare a full re-run against an incremental one after one dataset changes"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        specs = []
+        for i, month in enumerate(list(pipeline.MONTH_NUMBERS)[:months]):
+            path = os.path.join(temp_dir, f"clients_{month.lower()}.csv")
+            make_synthetic_client_data(rows // months, seed=i).to_csv(path, index=False)
+            specs.append({"path": path, "month": month, "year": 2024, "service": "Outreach"})
+        visits_path = os.path.join(temp_dir, "visits.csv")
+        make_synthetic_client_data(rows // 10, seed=99)[["Client_ID"]].to_csv(visits_path, index=False)
+
+        config = pipeline.PipelineConfig(
+            datasets=specs,
+            address_column="Address",
+            additional_dataset={"path": visits_path},
+            summarize_column="Client_ID",
+            cleaned_join_column="Client_ID",
+            additional_join_column="Client_ID",
+            dedup_column="Client_ID",
+        )
+        graph = StepGraph()
+        _, first_seconds = time_call(pipeline.run_pipeline, config, graph=graph)
+
+        changes = [
+            ("one month's metadata", lambda: specs[0].update(service="Housing")),
+            ("one file's addresses", lambda: make_synthetic_client_data(rows // months, seed=months).to_csv(
+                specs[-1]["path"], index=False)),
+        ]
+        print(f"Re-running steps 1-8 on {months} files, {rows:,} rows (first run {first_seconds:.2f} s)")
+        for name, change in changes:
+            change()
+            incremental, incremental_seconds = time_call(pipeline.run_pipeline, config, graph=graph)
+            full, full_seconds = time_call(pipeline.run_pipeline, config)
+            pd.testing.assert_frame_equal(incremental.final_data, full.final_data)
+            print(f"  after changing {name}:")
+            print(f"    full re-run:     {full_seconds:8.2f} s")
+            print(f"    incremental:     {incremental_seconds:8.2f} s ({len(incremental.reused)} steps reused, outputs identical)")
+
+
+def benchmark_dedup(rows, keys_per_row=0.2):
+    """Compare the sort-based Step 8 against the grouped dedup, for time and peak memory"""
+    rng = np.random.default_rng(0)
+    months = np.array(list(pipeline.MONTH_NUMBERS)[:12])
+    client_ids = pd.Series(rng.integers(0, int(rows * keys_per_row), rows)).map("C{:07d}".format).astype("str")
+    df = pd.DataFrame({
+        "Client_ID": client_ids,
+        "Month": pd.Categorical(months[rng.integers(0, 12, rows)]),
+        "Year": rng.integers(2020, 2025, rows),
+        "Visits": rng.integers(0, 50, rows),
+        "Service": pd.Categorical(np.array(["Housing", "Outreach", "Food"])[rng.integers(0, 3, rows)]),
+    })
+
+    runs = [
+        ("sort + drop", lambda: legacy_deduplicate_by_date(df, "Client_ID")),
+        ("grouped idxmax", lambda: pipeline.deduplicate_by_date(df, "Client_ID")),
+    ]
+    results = {}
+    outputs = []
+    for name, run in runs:
+        output, seconds = time_call(run)
+        outputs.append(output)
+        tracemalloc.start()
+        run()
+        results[name] = (tracemalloc.get_traced_memory()[1], seconds)
+        tracemalloc.stop()
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
+    # Adding a key column and tie-breaks adds a hash of each column and a grouped pass per tie-break
+    composite, composite_seconds = time_call(lambda: pipeline.deduplicate_records(
+        df, ["Client_ID", "Service"], [("Service", ["Housing", "Outreach"]), ("Visits", "descending")]))
+
+    print(f"Deduplication of {rows:,} rows into {len(outputs[0]):,} clients")
+    for name, (peak, seconds) in results.items():
+        print(f"  {name + ':':<19}{seconds:8.2f} s, {peak / (1024 * 1024):6.0f} MB peak")
+    print(f"  speedup:           {results['sort + drop'][1] / results['grouped idxmax'][1]:8.1f}x (outputs identical)")
+    print(f"  2 keys, 2 ties:    {composite_seconds:8.2f} s ({len(composite.data):,} rows kept, {composite.rows_dropped:,} dropped)")
+
+
+def benchmark_join(rows, summary_fraction=0.2):
+    """Compare the merge-based Step 7 against the indexed join, and a re-join reusing the index"""
+    rng = np.random.default_rng(0)
+    cleaned = pd.DataFrame({
+        "Client_ID": pd.Series(rng.integers(0, rows // 3, rows)).map("C{:07d}".format).astype("str"),
+        "new_Address": pd.Categorical(np.array(["1 Main St", "2 Oak Ave", "3 Pine St"])[rng.integers(0, 3, rows)]),
+        "Visits": rng.integers(0, 12, rows),
+    })
+    visits = cleaned[["Client_ID"]].sample(frac=summary_fraction, random_state=0)
+    summary = pipeline.summarize_additional_data(visits, "Client_ID")
+    changed = cleaned.assign(Visits=cleaned["Visits"] + 1)
+
+    def legacy():
+        return cleaned.merge(summary, left_on="Client_ID", right_on="Client_ID", how="left", suffixes=("", "_additional"))
+
+    index = pipeline.JoinIndex(summary, "Client_ID")
+    expected, legacy_seconds = time_call(legacy)
+    first, first_seconds = time_call(lambda: index.join(cleaned, "Client_ID"))
+    again, again_seconds = time_call(lambda: index.join(changed, "Client_ID"))
+    pd.testing.assert_frame_equal(first.data, expected)
+
+    print(f"Left join of {rows:,} rows onto {len(summary):,} summarized keys")
+    print(f"  merge:             {legacy_seconds:8.2f} s")
+    print(f"  indexed join:      {first_seconds:8.2f} s (builds the index)")
+    print(f"  re-join:           {again_seconds:8.2f} s (reuses the index)")
+    print(f"  {first.report.describe()}")
+
+
+def benchmark_address_join(rows, distinct_fraction=0.2):
+    """Time the approximate address join: the index on the summary, the first join and a re-join"""
+    rng = np.random.default_rng(0)
+    distinct = max(1, int(rows * distinct_fraction))
+    letters = np.array(list("ABCDEFGHIJKLMNOPRSTUVWY"))
+    names = pd.Series(["".join(rng.choice(letters, 6)) for _ in range(3000)]).str.capitalize().to_numpy()
+    suffixes = np.array([("Street", "St"), ("Avenue", "Ave"), ("Road", "Rd"), ("Drive", "Dr"), ("Lane", "Ln")])
+    directions = np.array([("", ""), ("", ""), ("North ", "N "), ("West ", "W ")])
+    numbers = pd.Series(rng.integers(1, 5000, distinct)).astype(str)
+    street = pd.Series(names[rng.integers(0, len(names), distinct)])
+    suffix = rng.integers(0, len(suffixes), distinct)
+    direction = rng.integers(0, len(directions), distinct)
+    zip_codes = pd.Series(rng.integers(10000, 10100, distinct)).astype(str)
+
+    # The summary spells the address out; the clients abbreviate it, and one in ten misspells it
+    summary = pd.DataFrame({"Location": numbers + " " + pd.Series(directions[direction, 0]) + street + " "
+                            + pd.Series(suffixes[suffix, 0]) + " " + zip_codes})
+    summary = summary.drop_duplicates(ignore_index=True).assign(Count=1)
+    misspelled = street.str[:2] + street.str[3] + street.str[2] + street.str[4:]
+    street = street.where(rng.random(distinct) > 0.1, misspelled)
+    client_pool = (numbers + " " + pd.Series(directions[direction, 1]) + street + " "
+                   + pd.Series(suffixes[suffix, 1])).to_numpy(dtype=object)
+    cleaned = pd.DataFrame({"new_Address": pd.Series(client_pool[rng.integers(0, distinct, rows)], dtype="str")})
+
+    index, build_seconds = time_call(lambda: pipeline.AddressJoinIndex(summary, "Location", 0.85))
+    first, first_seconds = time_call(lambda: index.join(cleaned, "new_Address"))
+    again, again_seconds = time_call(lambda: index.join(cleaned, "new_Address"))
+
+    print(f"Address join of {rows:,} rows ({distinct:,} addresses) onto {len(summary):,} summarized addresses")
+    print(f"  index:             {build_seconds:8.2f} s (normalizes the summary once)")
+    print(f"  first join:        {first_seconds:8.2f} s")
+    print(f"  re-join:           {again_seconds:8.2f} s (reuses the index)")
+    print(f"  {first.report.describe()}")
+
+
+def benchmark_duplicate_clients(rows, clients_fraction=0.2):
+    """Time duplicate-client detection and compare its pairs with comparing every pair of spellings"""
+    rng = np.random.default_rng(0)
+    clients = max(2, int(rows * clients_fraction))
+    letters = np.array(list("ABCDEFGHIJKLMNOPRSTUVWY"))
+    first_names = pd.Series(["".join(rng.choice(letters, 5)) for _ in range(2000)]).str.capitalize().to_numpy()
+    last_names = pd.Series(["".join(rng.choice(letters, 7)) for _ in range(20000)]).str.capitalize().to_numpy()
+    first = pd.Series(first_names[rng.integers(0, len(first_names), clients)])
+    last = pd.Series(last_names[rng.integers(0, len(last_names), clients)])
+    streets = pd.Series(last_names[rng.integers(0, len(last_names), clients)])
+    addresses = pd.Series(rng.integers(1, 5000, clients)).astype(str) + " " + streets + " St"
+
+    # Each row is a visit by one client; one in ten swaps two letters of the last name
+    picks = rng.integers(0, clients, rows)
+    last_name = last[picks].reset_index(drop=True)
+    swapped = last_name.str[:2] + last_name.str[3] + last_name.str[2] + last_name.str[4:]
+    df = pd.DataFrame({
+        "First_Name": first[picks].to_numpy(),
+        "Last_Name": last_name.where(rng.random(rows) > 0.1, swapped),
+        "new_Address": addresses[picks].to_numpy(),
+    })
+
+    result, seconds = time_call(lambda: pipeline.resolve_clients(df, ["First_Name", "Last_Name"], "new_Address"))
+    spellings = len(df.drop_duplicates())
+    found = result.data["Client_Cluster"].nunique()
+    print(f"Duplicate clients in {rows:,} rows ({clients:,} clients, {spellings:,} distinct spellings)")
+    print(f"  blocked:           {seconds:8.2f} s, {result.pairs_compared:,} pairs compared")
+    print(f"  every pair:        {spellings * (spellings - 1) // 2:,} pairs")
+    print(f"  clusters found:    {found:,} (clients drawn: {len(np.unique(picks)):,})")
+    print(f"  {result.describe()}")
+
+
+def benchmark_preview(rows, columns=300):
+    """Compare the rows the original preview built for a wide table against one screen of the virtual grid"""
+    df = make_wide_report(rows, columns=columns, banner_rows=0)
+
+    legacy, legacy_seconds = time_call(legacy_preview_rows, df)
+    first, first_seconds = time_call(format_rows, df, 0, DEFAULT_VISIBLE_ROWS)
+    middle, middle_seconds = time_call(format_rows, df, rows // 2, rows // 2 + DEFAULT_VISIBLE_ROWS)
+    assert first == legacy[:DEFAULT_VISIBLE_ROWS]
+
+    print(f"Preview of a {df.shape[1]}-column table of {rows:,} rows (Python side only; Tk not timed)")
+    print(f"  original:          {legacy_seconds * 1000:8.1f} ms, {len(legacy) * df.shape[1]:,} cells for the first {len(legacy)} rows")
+    print(f"  virtual grid:      {first_seconds * 1000:8.1f} ms, {len(first) * df.shape[1]:,} cells for one screen")
+    print(f"  scroll to middle:  {middle_seconds * 1000:8.1f} ms (row {rows // 2:,}, unreachable before)")
+    print(f"  speedup:           {legacy_seconds / first_seconds:8.1f}x")
+
+
+def benchmark_filter(rows):
+    """Time preview filters on a cleaned-size table (the first query on a text column also prepares it)"""
+    df = make_synthetic_client_data(rows)
+    cleaner = AddressCleaner(DefaultSettings.get_defaults())
+    df = df.assign(**pipeline.cleaned_address_columns(df["Address"], cleaner))
+    client_id = df["Client_ID"].iloc[rows // 2]
+
+    lowered = {}
+    print(f"Preview filters on {rows:,} rows")
+    for query in [f"Client_ID = {client_id}", "Address_may_have_word = Yes", "Address ~ apt",
+                  "Address ~ po box", "main st", "oak ave"]:
+        mask, seconds = time_call(filter_mask, df, query, lowered)
+        print(f"  {query:<30} {mask.sum():>9,} rows {seconds * 1000:8.1f} ms")
+
+
+def benchmark_excel_export(rows):
+    """Compare pandas' to_excel against the streaming write-only export, for time and peak memory"""
+    cleaner = AddressCleaner(DefaultSettings.get_defaults())
+    df = make_synthetic_client_data(rows)
+    df = df.assign(**pipeline.cleaned_address_columns(df["Address"], cleaner))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "export.xlsx")
+        runs = [
+            ("to_excel", lambda: df.to_excel(path, index=False)),
+            ("write-only", lambda: pipeline.export_dataset(df, path)),
+        ]
+        results = {}
+        for name, run in runs:
+            _, seconds = time_call(run)
+            # Tracing slows openpyxl down a lot, so memory is measured on a separate run
+            tracemalloc.start()
+            run()
+            results[name] = (tracemalloc.get_traced_memory()[1], seconds)
+            tracemalloc.stop()
+        pd.testing.assert_frame_equal(pd.read_excel(path).fillna(""), df.astype(object).fillna(""), check_dtype=False)
+
+    print(f"Excel export of {rows:,} rows x {df.shape[1]} columns")
+    for name, (peak, seconds) in results.items():
+        print(f"  {name + ':':<19}{seconds:8.2f} s, {rows / seconds:8,.0f} rows/s, {peak / (1024 * 1024):6.0f} MB peak")
+
+
+def benchmark_export_formats(rows):
+    """Time each export format and compare file sizes (Parquet and zstd only when installed)"""
+    cleaner = AddressCleaner(DefaultSettings.get_defaults())
+    df = make_synthetic_client_data(rows)
+    df = df.assign(**pipeline.cleaned_address_columns(df["Address"], cleaner))
+    extensions = [".csv", ".csv.gz", ".sqlite"]
+    extensions += [".csv.zst"] if pipeline.ZSTD_AVAILABLE else []
+    extensions += [".parquet"] if pipeline.PARQUET_AVAILABLE else []
+
+    print(f"Export of {rows:,} rows x {df.shape[1]} columns")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for extension in extensions:
+            path = os.path.join(temp_dir, f"export{extension}")
+            report = pipeline.export_dataset(df, path, index_columns=["Client_ID"])
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"  {extension + ':':<19}{report.seconds:8.2f} s, {report.rows_per_second:9,.0f} rows/s, {size_mb:7.1f} MB")
+
+
+def benchmark_parallel_loading(rows, files=8):
+    """Compare loading monthly workbooks one at a time against one worker process per file"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = []
+        for month in range(files):
+            path = os.path.join(temp_dir, f"clients_{month + 1:02d}.xlsx")
+            make_synthetic_client_data(rows // files, seed=month).to_excel(path, index=False)
+            paths.append((path, None))
+
+        sequential, sequential_seconds = time_call(pipeline.load_files, paths, 1)
+        parallel, parallel_seconds = time_call(pipeline.load_files, paths, 0)
+
+    for expected, actual in zip(sequential, parallel):
+        pd.testing.assert_frame_equal(expected.data, actual.data)
+
+    print(f"Loading {files} workbooks of {rows // files:,} rows each")
+    print(f"  one at a time:     {sequential_seconds:8.2f} s")
+    print(f"  {min(os.cpu_count() or 1, files)} worker(s):       {parallel_seconds:8.2f} s "
+          f"(slowest file {max(load.seconds for load in parallel):.2f} s)")
+    print(f"  speedup:           {sequential_seconds / parallel_seconds:8.1f}x (outputs identical)")
+
+
+def benchmark_excel_loading(rows):
+    """Compare the original two-pass Excel load against opening each workbook once"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "clients.xlsx")
+        with pd.ExcelWriter(path) as writer:
+            make_synthetic_client_data(rows).to_excel(writer, sheet_name="Clients", index=False)
+            make_synthetic_client_data(100, seed=1).to_excel(writer, sheet_name="Notes", index=False)
+        file_mb = os.path.getsize(path) / (1024 * 1024)
+
+        def legacy_load():
+            # Sheet names from one open, then a second open to read the data
+            with pd.ExcelFile(path) as excel_file:
+                sheet_name = excel_file.sheet_names[0]
+            return pipeline.detect_and_skip_dummy_rows(pd.read_excel(path, sheet_name=sheet_name))
+
+        legacy, legacy_seconds = time_call(legacy_load)
+        _, legacy_names_seconds = time_call(lambda: pd.ExcelFile(path).close())
+        names, names_seconds = time_call(pipeline.get_sheet_names, path)
+        loaded, loaded_seconds = time_call(pipeline.read_dataset, path)
+
+    # Other engines may infer some dtypes differently, so only compare like with like
+    if pipeline.EXCEL_ENGINE is None:
+        pd.testing.assert_frame_equal(legacy, loaded)
+    assert names == ["Clients", "Notes"]
+
+    print(f"Excel loading of a {file_mb:.1f} MB workbook ({rows:,} rows, engine: {pipeline.EXCEL_ENGINE or 'openpyxl'})")
+    print(f"  two opens:         {legacy_seconds:8.2f} s ({legacy_seconds / file_mb:.2f} s/MB)")
+    print(f"  one open:          {loaded_seconds:8.2f} s ({loaded_seconds / file_mb:.2f} s/MB)")
+    print(f"  sheet names:       {legacy_names_seconds:8.3f} s opening the workbook, {names_seconds:.3f} s from its index")
+    print(f"  speedup:           {legacy_seconds / loaded_seconds:8.1f}x")
+
+
+def benchmark_streaming(rows, chunk_rows=100000):
+    """Compare the peak memory of the in-memory run against streaming the CSV in chunks"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        clients_path = os.path.join(temp_dir, "clients.csv")
+        visits_path = os.path.join(temp_dir, "visits.csv")
+        clients = make_synthetic_client_data(rows)
+        clients.to_csv(clients_path, index=False)
+        clients[["Client_ID"]].sample(frac=0.2, random_state=0).to_csv(visits_path, index=False)
+        del clients
+
+        config = pipeline.PipelineConfig(
+            datasets=[{"path": clients_path, "month": "January", "year": 2024, "service": "Outreach"}],
+            address_column="Address",
+            additional_dataset={"path": visits_path},
+            summarize_column="Client_ID",
+            cleaned_join_column="Client_ID",
+            additional_join_column="Client_ID",
+            dedup_column="Client_ID",
+        )
+
+        output_path = os.path.join(temp_dir, "joined.csv")
+        runs = [
+            ("in memory", lambda: pipeline.export_dataset(
+                pipeline.run_pipeline(config).joined_additional_data, output_path)),
+            ("streaming", lambda: pipeline.stream_pipeline(config, output_path, chunk_rows)),
+        ]
+        peaks = {}
+        for name, run in runs:
+            _, seconds = time_call(run)
+            # Tracing slows pandas down a lot, so memory is measured on a separate run
+            tracemalloc.start()
+            run()
+            peaks[name] = (tracemalloc.get_traced_memory()[1], seconds)
+            tracemalloc.stop()
+        file_mb = os.path.getsize(clients_path) / (1024 * 1024)
+
+    print(f"Steps 1-7 on a {file_mb:.0f} MB CSV of {rows:,} rows ({chunk_rows:,}-row chunks)")
+    for name, (peak, seconds) in peaks.items():
+        print(f"  {name + ':':<19}{peak / (1024 * 1024):8.0f} MB peak, {seconds:6.2f} s")
+
+
+BENCHMARKS = {
+    "address-cleaning": benchmark_address_cleaning,
+    "parallel-cleaning": benchmark_parallel_address_cleaning,
+    "dummy-rows": benchmark_dummy_rows,
+    "combine": benchmark_combine,
+    "categorical-dtypes": benchmark_categorical_dtypes,
+    "stage-snapshots": benchmark_stage_snapshots,
+    "incremental": benchmark_incremental,
+    "dedup": benchmark_dedup,
+    "join": benchmark_join,
+    "address-join": benchmark_address_join,
+    "duplicate-clients": benchmark_duplicate_clients,
+    "preview": benchmark_preview,
+    "filter": benchmark_filter,
+    "excel-export": benchmark_excel_export,
+    "export-formats": benchmark_export_formats,
+    "parallel-loading": benchmark_parallel_loading,
+    "excel-loading": benchmark_excel_loading,
+    "streaming": benchmark_streaming,
+}
+
+
+def main():
+    """Run the selected benchmarks"""
+    parser = argparse.ArgumentParser(description="Benchmark the Data Joiner processing engines.")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help=f"Benchmarks to run (default: all). Choices: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic rows")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.benchmarks or list(BENCHMARKS):
+        BENCHMARKS[name](args.rows)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Defines the virtualized data grid used for the previews of the Data Joiner application.
+A ttk.Treeview only ever holds the rows that fit in its window. Scrolling (with the
+scrollbar, the mouse wheel or Page Up/Down) refills those rows from the DataFrame, so
+showing a table costs the same for a hundred rows as for millions, and every row can
+be reached. A filter picks out the matching rows of the whole DataFrame with
+vectorized comparisons; the grid then scrolls through just those rows.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Rows shown before the tree has been drawn and its height is known
+DEFAULT_VISIBLE_ROWS = 25
+
+# Height of a tree row and of the heading row, in pixels (ttk's defaults)
+ROW_HEIGHT = 20
+HEADING_HEIGHT = 25
+
+# Rows moved by one step of the mouse wheel
+WHEEL_ROWS = 3
+
+# One filter condition: "<column> = <value>", "<column> != <value>" or "<column> ~ <text>"
+CONDITION = re.compile(r"^(.*?)\s*(!=|=|~)\s*(.*)$")
+
+
+def format_rows(df, start, stop, rows=None):
+    """
+    Return rows start..stop of df as lists of display strings (missing values become
+    empty strings). If rows holds row positions, rows[start:stop] of df are returned.
+    """
+    block = df.iloc[start:stop] if rows is None else df.take(rows[start:stop])
+    cells = block.to_numpy(dtype=object)
+    missing = pd.isna(cells)
+    return [["" if is_missing else str(value) for value, is_missing in zip(row, row_missing)]
+            for row, row_missing in zip(cells, missing)]
+
+
+def _find_column(df, name):
+    if name in df.columns:
+        return name
+    matches = [col for col in df.columns if str(col).lower() == name.lower()]
+    if not matches:
+        raise ValueError(f"No column named '{name}'")
+    return matches[0]
+
+
+def _lowered_text(column, name, lowered):
+    """
+    A column as lower-case text to match, kept in lowered: (None, the rows) for text
+    stored by pyarrow, which is lower-cased and searched in compiled code, otherwise
+    (each row's position in the distinct values, the distinct values with '' last for
+    missing values), so Python-level strings are only handled once per distinct value
+    """
+    if name not in lowered:
+        if getattr(column.dtype, "storage", None) == "pyarrow":
+            lowered[name] = (None, column.str.lower().fillna(""))
+        else:
+            codes, uniques = pd.factorize(column)
+            distinct = pd.Series(uniques).astype("str").str.lower()
+            lowered[name] = (codes, pd.concat([distinct, pd.Series([""], dtype="str")], ignore_index=True))
+    return lowered[name]
+
+
+def _text_mask(values, op, value):
+    """Match a Series of lower-case text against value"""
+    needle = value.lower()
+    if op == "~":
+        return values.str.contains(needle, regex=False).to_numpy(dtype=bool)
+    equal = (values == needle).to_numpy(dtype=bool)
+    return equal if op == "=" else ~equal
+
+
+def _is_number_column(column):
+    return pd.api.types.is_numeric_dtype(column.dtype) and not pd.api.types.is_bool_dtype(column.dtype)
+
+
+def _column_mask(column, name, op, value, lowered):
+    """Match one column against value, ignoring case; missing values match as empty text"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Compare the categories once and pick the rows by their codes (-1, missing, is the last entry)
+        categories = pd.Series(list(column.cat.categories) + [""]).astype("str").str.lower()
+        return _text_mask(categories, op, value)[column.cat.codes.to_numpy()]
+    if _is_number_column(column) and op != "~":
+        try:
+            equal = (column == float(value)).to_numpy(dtype=bool)
+        except ValueError:
+            equal = np.zeros(len(column), dtype=bool)
+        return equal if op == "=" else ~equal
+    if op != "~" and isinstance(column.dtype, pd.StringDtype) and value and value.lower() == value.upper():
+        # A value without letters (such as an ID) needs no lower-casing
+        equal = (column == value).to_numpy(dtype=bool, na_value=False)
+        return equal if op == "=" else ~equal
+    codes, values = _lowered_text(column, name, lowered)
+    matched = _text_mask(values, op, value)
+    # Rows pick up the result of their distinct value (-1, missing, is the last entry, '')
+    return matched if codes is None else matched[codes]
+
+
+def filter_mask(df, query, lowered=None):
+    """
+    Return a boolean array marking the rows of df that match query. Conditions are
+    separated by ';' and must all match:
+      <column> = <value>    the value, ignoring case (numbers compare as numbers)
+      <column> != <value>   anything but the value
+      <column> ~ <text>     the text anywhere in the value
+      <text>                the text anywhere in a text column, or equal to a number column
+    lowered (a dict) keeps the lower-cased text columns between calls on the same df.
+    Raises ValueError for a column df does not have.
+    """
+    lowered = {} if lowered is None else lowered
+    mask = np.ones(len(df), dtype=bool)
+    for condition in (part.strip() for part in query.split(";")):
+        if not condition:
+            continue
+        match = CONDITION.match(condition)
+        if match:
+            name, op, value = match.groups()
+            col = _find_column(df, name.strip())
+            mask &= _column_mask(df[col], col, op, value, lowered)
+        else:
+            found = np.zeros(len(df), dtype=bool)
+            for col in df.columns:
+                op = "=" if _is_number_column(df[col]) else "~"
+                found |= _column_mask(df[col], col, op, condition, lowered)
+            mask &= found
+    return mask
+
+
+class VirtualDataGrid:
+    """Shows a DataFrame in a Treeview, keeping only the visible rows in the tree."""
+
+    def __init__(self, tree, scroll_y):
+        self.tree = tree
+        self.scroll_y = scroll_y
+        self.df = None
+        self.offset = 0
+        self.query = ""
+        self.rows = None            # positions of the rows matching the filter, or None for all rows
+        self.filter_error = None
+        self._lowered = {}          # lower-cased text columns of df, kept for the next filter
+        self.on_change = None       # called with the grid after the shown rows change
+        self._columns = None
+        self._items = []
+
+        # The scrollbar moves through the DataFrame rather than through the tree's items
+        tree.configure(yscrollcommand="")
+        scroll_y.config(command=self.yview)
+        tree.bind("<Configure>", lambda event: self.refresh(), add="+")
+        tree.bind("<MouseWheel>", self._on_mouse_wheel, add="+")
+        tree.bind("<Button-4>", lambda event: self.scroll_rows(-WHEEL_ROWS), add="+")
+        tree.bind("<Button-5>", lambda event: self.scroll_rows(WHEEL_ROWS), add="+")
+        tree.bind("<Prior>", lambda event: self.yview("scroll", -1, "pages"), add="+")
+        tree.bind("<Next>", lambda event: self.yview("scroll", 1, "pages"), add="+")
+        tree.bind("<Control-Home>", lambda event: self.yview("moveto", 0), add="+")
+        tree.bind("<Control-End>", lambda event: self.yview("moveto", 1), add="+")
+
+    def show(self, df):
+        """Show df from its first row, keeping the current filter (None or an empty frame clears the rows)"""
+        self.df = df if df is not None and not df.empty else None
+        self.offset = 0
+        self._lowered = {}
+        self._apply_filter()
+        if self.df is not None:
+            columns = list(self.df.columns)
+            # Headings are only set up again when the columns change
+            if columns != self._columns:
+                self.tree["columns"] = columns
+                self.tree["show"] = "headings"
+                for col in columns:
+                    self.tree.heading(col, text=col)
+                    self.tree.column(col, width=100, minwidth=50)
+                self._columns = columns
+        self.refresh()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def set_filter(self, query):
+        """Show only the rows matching query (see filter_mask); an empty query shows every row"""
+        self.query = query.strip()
+        self.offset = 0
+        self._apply_filter()
+        self.refresh()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def _apply_filter(self):
+        self.rows = None
+        self.filter_error = None
+        if self.df is None or not self.query:
+            return
+        try:
+            self.rows = np.flatnonzero(filter_mask(self.df, self.query, self._lowered))
+        except ValueError as e:
+            # An unusable filter shows every row, with the reason in summary()
+            self.filter_error = str(e)
+
+    def row_count(self):
+        """Number of rows the grid scrolls through"""
+        if self.df is None:
+            return 0
+        return len(self.df) if self.rows is None else len(self.rows)
+
+    def summary(self):
+        """Describe the shown rows, e.g. '1,234 of 1,000,000 rows match'"""
+        if self.df is None:
+            return ""
+        if self.filter_error:
+            return self.filter_error
+        if self.rows is None:
+            return f"{len(self.df):,} rows"
+        return f"{len(self.rows):,} of {len(self.df):,} rows match"
+
+    def visible_rows(self):
+        """How many rows fit in the tree's window"""
+        height = self.tree.winfo_height()
+        if height <= HEADING_HEIGHT + ROW_HEIGHT:
+            # Not drawn yet
+            return DEFAULT_VISIBLE_ROWS
+        return max(1, (height - HEADING_HEIGHT) // ROW_HEIGHT)
+
+    def refresh(self):
+        """Fill the tree's rows from the DataFrame at the current offset"""
+        total = self.row_count()
+        count = min(self.visible_rows(), total)
+        self.offset = max(0, min(self.offset, total - count))
+
+        # Reuse the existing tree items, adding or removing only the difference
+        while len(self._items) > count:
+            self.tree.delete(self._items.pop())
+        rows = format_rows(self.df, self.offset, self.offset + count, self.rows) if count else []
+        for i, values in enumerate(rows):
+            if i < len(self._items):
+                self.tree.item(self._items[i], values=values)
+            else:
+                self._items.append(self.tree.insert("", "end", values=values))
+        if self.tree.selection():
+            self.tree.selection_remove(self.tree.selection())
+
+        if total:
+            self.scroll_y.set(self.offset / total, (self.offset + count) / total)
+        else:
+            self.scroll_y.set(0, 1)
+
+    def scroll_rows(self, rows):
+        """Move the view by a number of rows (negative moves up)"""
+        self.offset += rows
+        self.refresh()
+
+    def yview(self, *args):
+        """Scrollbar command: ("moveto", fraction) or ("scroll", n, "units" | "pages")"""
+        if self.df is None or not args:
+            return
+        if args[0] == "moveto":
+            self.offset = int(float(args[1]) * self.row_count())
+            self.refresh()
+        elif args[0] == "scroll":
+            step = self.visible_rows() if args[2] == "pages" else 1
+            self.scroll_rows(int(args[1]) * step)
+
+    def _on_mouse_wheel(self, event):
+        # Windows and macOS report the wheel as a delta (positive is up)
+        self.scroll_rows(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)
@@ -1,14 +1,22 @@
 import customtkinter as ctk
-import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
 import sys
 from datetime import datetime
 import json
-import re
+import multiprocessing
 from default_settings import DefaultSettings
 from colors import Colors
+from address_cleaner import AddressCleaner, AddressCleaningCache
+from address_cache_store import PersistentAddressCache
+from data_grid import VirtualDataGrid
+from dataset_cache import DatasetCache
+from entity_resolution import CLUSTER_COLUMN
+import pipeline
+from stage_store import StageSnapshotStore, stage_property
+from step_graph import StepGraph
+from task_runner import TaskRunner
 
 def resource_path(relative_path):
     """ Get absolute path to resource, works for dev and for PyInstaller """
@@ -21,6 +29,13 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 class DataJoinerApp:
+    # The table after each step is kept in self.stages, sharing unchanged columns between steps
+    combined_data = stage_property("combined")
+    pre_cleaned_data = stage_property("pre_cleaned", base="combined")
+    cleaned_data = stage_property("cleaned", base="combined")
+    joined_additional_data = stage_property("joined", base="cleaned")
+    final_data = stage_property("final", base="joined")
+    
     def __init__(self):
         # Set appearance mode and color theme
         ctk.set_appearance_mode("light") # Keep light mode
@@ -43,6 +58,8 @@ class DataJoinerApp:
         self.column_rename_history = {}
         
         # Initialize data storage
+        self.stages = StageSnapshotStore()
+        self.step_graph = StepGraph()  # Cleaned addresses per dataset, reused while unchanged
         self.datasets = {}  # Store loaded datasets
         self.dataset_info = {}  # Store time period and service info for each dataset
         self.combined_data = None
@@ -52,6 +69,8 @@ class DataJoinerApp:
         self.final_data = None
         self.additional_dataset = None
         self.summarized_additional_data = None
+        self.join_index = None  # Hash index on the summarized join keys, reused while they are unchanged
+        self.dedup_result = None  # The last deduplication, with the rows it dropped for each key
         
         # Status tracking
         self.datasets_joined = False
@@ -69,8 +88,21 @@ class DataJoinerApp:
         self.settings_file = "settings.json"
         self.load_settings()
         
-        # Create the GUI
+        # Cache of cleaning results for addresses seen earlier in this session,
+        # backed by an on-disk store shared across sessions (disabled if no cache file is set)
+        self.address_cache = AddressCleaningCache(self.settings["cache_max_entries"])
+        self.address_store = PersistentAddressCache(self.settings["cache_file"]) if self.settings["cache_file"] else None
+        
+        # Loaded datasets are cached on disk so unchanged files are not parsed again
+        self.dataset_cache = DatasetCache(self.settings["dataset_cache_dir"]) if self.settings["dataset_cache_dir"] else None
+        
+        # Create the GUI (each preview tree gets a grid that only fills its visible rows)
+        self.data_grids = {}
         self.create_widgets()
+        
+        # Heavy steps run one at a time on a background thread so the window stays responsive
+        self.task_runner = TaskRunner(self.root, on_progress=self.on_task_progress,
+                                      on_state_change=self.on_task_state_change)
     
     def load_settings(self):
         """Load settings from file or create default settings"""
@@ -79,7 +111,8 @@ class DataJoinerApp:
         try:
             if os.path.exists(self.settings_file):
                 with open(self.settings_file, 'r') as f:
-                    self.settings = json.load(f)
+                    # Start from the defaults so settings added in newer versions are always present
+                    self.settings = {**default_settings, **json.load(f)}
             else:
                 self.settings = default_settings
                 self.save_settings()
@@ -173,6 +206,57 @@ class DataJoinerApp:
         )
         settings_btn.pack(side="right", padx=10, pady=10)
         
+        # Status bar showing the progress of the running step, with a button to cancel it
+        status_frame = ctk.CTkFrame(main_frame, fg_color="transparent")
+        status_frame.pack(side="left", fill="x", expand=True, padx=10, pady=10)
+        
+        self.task_status_label = ctk.CTkLabel(status_frame, text="Ready", text_color=Colors.TEXT_SECONDARY)
+        self.task_status_label.pack(side="left", padx=(0, 10))
+        
+        self.task_progress_bar = ctk.CTkProgressBar(status_frame, width=300, progress_color=Colors.ACTION_BLUE)
+        self.task_progress_bar.set(0)
+        self.task_progress_bar.pack(side="left", padx=(0, 10))
+        
+        self.cancel_task_btn = ctk.CTkButton(
+            status_frame,
+            text="Cancel",
+            command=self.cancel_task,
+            width=80,
+            height=30,
+            state="disabled",
+            fg_color=Colors.DESTRUCTIVE_RED,
+            hover_color=Colors.DESTRUCTIVE_RED_HOVER
+        )
+        self.cancel_task_btn.pack(side="left")
+        
+    def run_task(self, name, work, on_success, error_title="Error", cancel_message="No changes were made."):
+        """Run work(progress) in the background, then on_success(result) on the main thread"""
+        started = self.task_runner.start(
+            name,
+            work,
+            on_success,
+            on_error=lambda e: messagebox.showerror("Error", f"{error_title}: {str(e)}"),
+            on_cancel=lambda: messagebox.showinfo("Cancelled", f"{name} was cancelled. {cancel_message}")
+        )
+        if not started:
+            messagebox.showwarning("Warning", f"Please wait for '{self.task_runner.task_name}' to finish or cancel it first.")
+    
+    def on_task_progress(self, name, done, total):
+        """Show the progress reported by the running task"""
+        self.task_progress_bar.set(done / total if total else 1)
+        self.task_status_label.configure(text=f"{name}: {done:,} of {total:,}")
+    
+    def on_task_state_change(self, busy, name):
+        """Reset the status bar when a task starts or finishes"""
+        self.task_progress_bar.set(0)
+        self.task_status_label.configure(text=f"{name}..." if busy else "Ready")
+        self.cancel_task_btn.configure(state="normal" if busy else "disabled")
+    
+    def cancel_task(self):
+        """Ask the running task to stop"""
+        self.task_runner.cancel()
+        self.task_status_label.configure(text=f"Cancelling {self.task_runner.task_name}...")
+        
     def create_load_tab(self):
         # Load datasets section
         load_frame = ctk.CTkFrame(self.load_tab)
@@ -337,8 +421,9 @@ class DataJoinerApp:
         self.join_tree = ttk.Treeview(self.join_tree_frame, yscrollcommand=self.join_tree_scroll_y.set, xscrollcommand=self.join_tree_scroll_x.set)
         self.join_tree.pack(side="left", fill="both", expand=True)
         
-        self.join_tree_scroll_y.config(command=self.join_tree.yview)
+        self.data_grids[self.join_tree] = VirtualDataGrid(self.join_tree, self.join_tree_scroll_y)
         self.join_tree_scroll_x.config(command=self.join_tree.xview)
+        self.create_filter_bar(self.join_preview_frame, self.join_tree, self.join_tree_frame)
     
     def create_deduplicate_tab(self):
         """Create the deduplicate by date tab"""
@@ -359,6 +444,19 @@ class DataJoinerApp:
         ctk.CTkLabel(column_frame, text="Select Column to Group By:", font=ctk.CTkFont(size=12, weight="bold")).pack(side="left", padx=10, pady=10)
         self.deduplicate_column_selector = ctk.CTkComboBox(column_frame, values=[])
         self.deduplicate_column_selector.pack(side="left", padx=10, pady=10)
+        ctk.CTkLabel(column_frame, text="Also Match On:", font=ctk.CTkFont(size=12, weight="bold")).pack(side="left", padx=10, pady=10)
+        self.dedup_extra_keys_entry = ctk.CTkEntry(column_frame, placeholder_text="e.g., new_Address (comma-separated)", width=260)
+        self.dedup_extra_keys_entry.pack(side="left", padx=10, pady=10)
+
+        # Tie-breaks for records from the same month
+        tie_break_frame = ctk.CTkFrame(dedup_frame)
+        tie_break_frame.pack(fill="x", pady=(0, 10))
+        ctk.CTkLabel(tie_break_frame, text="Break Ties By:", font=ctk.CTkFont(size=12, weight="bold")).pack(side="left", padx=10, pady=10)
+        self.dedup_tie_break_entry = ctk.CTkEntry(
+            tie_break_frame,
+            placeholder_text="e.g., Service: Housing > Outreach, Dataset_Name: file order, Visits: descending",
+            width=560)
+        self.dedup_tie_break_entry.pack(side="left", padx=10, pady=10)
 
         # Deduplicate button
         dedup_btn = ctk.CTkButton(
@@ -370,6 +468,15 @@ class DataJoinerApp:
             hover_color=Colors.ACTION_BLUE_HOVER)
         dedup_btn.pack(pady=10)
 
+        # The rows dropped for each key, for checking what deduplication removed
+        dropped_report_btn = ctk.CTkButton(
+            dedup_frame,
+            text="Export Dropped Report",
+            command=self.export_dropped_report,
+            fg_color=Colors.ACTION_BLUE,
+            hover_color=Colors.ACTION_BLUE_HOVER)
+        dropped_report_btn.pack(pady=(0, 10))
+
         # Results preview
         self.dedup_preview_frame = ctk.CTkFrame(dedup_frame)
         self.dedup_preview_frame.pack(fill="both", expand=True, pady=10)
@@ -381,8 +488,9 @@ class DataJoinerApp:
         self.dedup_tree_scroll_x.pack(side="bottom", fill="x")
         self.dedup_tree = ttk.Treeview(self.dedup_tree_frame, yscrollcommand=self.dedup_tree_scroll_y.set, xscrollcommand=self.dedup_tree_scroll_x.set)
         self.dedup_tree.pack(side="left", fill="both", expand=True)
-        self.dedup_tree_scroll_y.config(command=self.dedup_tree.yview)
+        self.data_grids[self.dedup_tree] = VirtualDataGrid(self.dedup_tree, self.dedup_tree_scroll_y)
         self.dedup_tree_scroll_x.config(command=self.dedup_tree.xview)
+        self.create_filter_bar(self.dedup_preview_frame, self.dedup_tree, self.dedup_tree_frame)
 
     def create_clean_tab(self):
         """Create the address cleaning tab"""
@@ -436,6 +544,23 @@ class DataJoinerApp:
             hover_color=Colors.GO_GREEN_HOVER)
         save_cleaned_xlsx_btn.pack(side="left", padx=5)
 
+        # Duplicate clients across datasets
+        clients_frame = ctk.CTkFrame(clean_frame)
+        clients_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(clients_frame, text="Name Columns:", font=ctk.CTkFont(size=12, weight="bold")).pack(side="left", padx=10, pady=10)
+        self.client_name_columns_entry = ctk.CTkEntry(clients_frame, placeholder_text="e.g., First_Name, Last_Name (comma-separated)", width=300)
+        self.client_name_columns_entry.pack(side="left", padx=10, pady=10)
+        
+        find_clients_btn = ctk.CTkButton(
+            clients_frame,
+            text="Find Duplicate Clients",
+            command=self.find_duplicate_clients,
+            fg_color=Colors.ACTION_BLUE,
+            hover_color=Colors.ACTION_BLUE_HOVER
+        )
+        find_clients_btn.pack(side="left", padx=10, pady=10)
+
         # Results preview
         self.clean_preview_frame = ctk.CTkFrame(clean_frame)
         self.clean_preview_frame.pack(fill="both", expand=True, pady=10)
@@ -455,8 +580,9 @@ class DataJoinerApp:
         self.clean_tree = ttk.Treeview(self.clean_tree_frame, yscrollcommand=self.clean_tree_scroll_y.set, xscrollcommand=self.clean_tree_scroll_x.set)
         self.clean_tree.pack(side="left", fill="both", expand=True)
         
-        self.clean_tree_scroll_y.config(command=self.clean_tree.yview)
+        self.data_grids[self.clean_tree] = VirtualDataGrid(self.clean_tree, self.clean_tree_scroll_y)
         self.clean_tree_scroll_x.config(command=self.clean_tree.xview)
+        self.create_filter_bar(self.clean_preview_frame, self.clean_tree, self.clean_tree_frame)
     
     def create_additional_tab(self):
         """Create the additional dataset tab"""
@@ -503,7 +629,7 @@ class DataJoinerApp:
         self.additional_tree = ttk.Treeview(self.additional_tree_frame, yscrollcommand=self.additional_tree_scroll_y.set, xscrollcommand=self.additional_tree_scroll_x.set)
         self.additional_tree.pack(side="left", fill="both", expand=True)
         
-        self.additional_tree_scroll_y.config(command=self.additional_tree.yview)
+        self.data_grids[self.additional_tree] = VirtualDataGrid(self.additional_tree, self.additional_tree_scroll_y)
         self.additional_tree_scroll_x.config(command=self.additional_tree.xview)
     
     def create_summarize_tab(self):
@@ -547,7 +673,7 @@ class DataJoinerApp:
         self.summarize_tree_scroll_x.pack(side="bottom", fill="x")
         self.summarize_tree = ttk.Treeview(self.summarize_tree_frame, yscrollcommand=self.summarize_tree_scroll_y.set, xscrollcommand=self.summarize_tree_scroll_x.set)
         self.summarize_tree.pack(side="left", fill="both", expand=True)
-        self.summarize_tree_scroll_y.config(command=self.summarize_tree.yview)
+        self.data_grids[self.summarize_tree] = VirtualDataGrid(self.summarize_tree, self.summarize_tree_scroll_y)
         self.summarize_tree_scroll_x.config(command=self.summarize_tree.xview)
 
     def create_final_tab(self):
@@ -558,7 +684,7 @@ class DataJoinerApp:
         # Instructions
         instructions = ctk.CTkLabel(
             final_frame,
-            text="Step 7: Join the cleaned data with the summarized additional data.\n• This performs a left join, keeping all rows from your main dataset.",
+            text="Step 7: Join the cleaned data with the summarized additional data.\n• This performs a left join, keeping all rows from your main dataset.\n• To join on addresses, pick the cleaned address column (new_...) and tick 'Match addresses approximately'.",
             font=ctk.CTkFont(size=12),
             justify="left"
         )
@@ -576,6 +702,22 @@ class DataJoinerApp:
         self.additional_join_column = ctk.CTkComboBox(join_vars_frame, values=[])
         self.additional_join_column.pack(side="left", padx=10, pady=10)
         
+        # Approximate address matching
+        address_match_frame = ctk.CTkFrame(final_frame)
+        address_match_frame.pack(fill="x", pady=10)
+        
+        self.match_addresses_var = tk.BooleanVar(value=False)
+        ctk.CTkCheckBox(
+            address_match_frame,
+            text="Match addresses approximately (e.g. '123 N Main St' with '123 North Main Street')",
+            variable=self.match_addresses_var
+        ).pack(side="left", padx=10, pady=10)
+        
+        ctk.CTkLabel(address_match_frame, text="Min. Similarity (0-1):").pack(side="left", padx=(20, 5), pady=10)
+        self.match_threshold_entry = ctk.CTkEntry(address_match_frame, width=80)
+        self.match_threshold_entry.pack(side="left", padx=5, pady=10)
+        self.match_threshold_entry.insert(0, str(self.settings["address_match_threshold"]))
+        
         # Join button
         join_additional_btn = ctk.CTkButton(
             final_frame,
@@ -619,8 +761,9 @@ class DataJoinerApp:
         self.final_tree = ttk.Treeview(self.final_tree_frame, yscrollcommand=self.final_tree_scroll_y.set, xscrollcommand=self.final_tree_scroll_x.set)
         self.final_tree.pack(side="left", fill="both", expand=True)
         
-        self.final_tree_scroll_y.config(command=self.final_tree.yview)
+        self.data_grids[self.final_tree] = VirtualDataGrid(self.final_tree, self.final_tree_scroll_y)
         self.final_tree_scroll_x.config(command=self.final_tree.xview)
+        self.create_filter_bar(self.final_preview_frame, self.final_tree, self.final_tree_frame)
         
     def create_review_tab(self):
         """Create the review and rename columns tab"""
@@ -664,7 +807,7 @@ class DataJoinerApp:
         self.tree = ttk.Treeview(self.tree_frame, yscrollcommand=self.tree_scroll_y.set, xscrollcommand=self.tree_scroll_x.set)
         self.tree.pack(side="left", fill="both", expand=True)
         
-        self.tree_scroll_y.config(command=self.tree.yview)
+        self.data_grids[self.tree] = VirtualDataGrid(self.tree, self.tree_scroll_y)
         self.tree_scroll_x.config(command=self.tree.xview)
         
         # Column editing frame
@@ -751,6 +894,17 @@ class DataJoinerApp:
             hover_color=Colors.GO_GREEN_HOVER
         )
         export_excel_pre_btn.pack(side="left", padx=10, pady=10)
+
+        export_other_pre_btn = ctk.CTkButton(
+            pre_dedup_frame,
+            text="Parquet / SQLite / CSV.gz (with duplicates)",
+            command=lambda: self.export_other_format(pre_deduplication=True),
+            height=40,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color=Colors.ACTION_BLUE,
+            hover_color=Colors.ACTION_BLUE_HOVER
+        )
+        export_other_pre_btn.pack(side="left", padx=10, pady=10)
         
         # Frame for post-deduplication export
         post_dedup_frame = ctk.CTkFrame(export_buttons_frame)
@@ -767,6 +921,17 @@ class DataJoinerApp:
             hover_color=Colors.GO_GREEN_HOVER
         )
         export_excel_post_btn.pack(side="left", padx=10, pady=10)
+
+        export_other_post_btn = ctk.CTkButton(
+            post_dedup_frame,
+            text="Parquet / SQLite / CSV.gz (deduplicated)",
+            command=lambda: self.export_other_format(pre_deduplication=False),
+            height=40,
+            font=ctk.CTkFont(size=14, weight="bold"),
+            fg_color=Colors.ACTION_BLUE,
+            hover_color=Colors.ACTION_BLUE_HOVER
+        )
+        export_other_post_btn.pack(side="left", padx=10, pady=10)
         
         export_csv_post_btn = ctk.CTkButton(
             export_buttons_frame,
@@ -789,68 +954,83 @@ class DataJoinerApp:
             ]
         )
         
-        if file_paths:
-            loaded_count = 0
-            error_count = 0
-            error_messages = []
-            
-            for file_path in file_paths:
+        if not file_paths:
+            return
+        
+        # Ask for every sheet choice up front so the loading workers never need the GUI
+        files = []
+        error_messages = []
+        for file_path in file_paths:
+            sheet_name = None
+            if file_path.endswith(('.xlsx', '.xls')):
                 try:
-                    # Read the file
-                    if file_path.endswith(('.xlsx', '.xls')):
-                        # Try to read Excel file, handling multiple sheets
-                        excel_file = pd.ExcelFile(file_path)
-                        if len(excel_file.sheet_names) > 1:
-                            # Show sheet selection dialog
-                            sheet_name = self.select_sheet(excel_file.sheet_names)
-                            if sheet_name is None:
-                                continue  # Skip this file if no sheet selected
-                        else:
-                            sheet_name = excel_file.sheet_names[0]
-                        
-                        df = pd.read_excel(file_path, sheet_name=sheet_name)
-                    else:
-                        df = pd.read_csv(file_path)
-                    
-                    # Try to detect and skip dummy rows
-                    df = self.detect_and_skip_dummy_rows(df)
-                    
-                    # Generate unique dataset name
-                    base_name = os.path.splitext(os.path.basename(file_path))[0]
-                    counter = 1
-                    dataset_name = base_name
-                    while dataset_name in self.datasets:
-                        dataset_name = f"{base_name}_{counter}"
-                        counter += 1
-                    
-                    # Store dataset
-                    self.datasets[dataset_name] = df
-                    loaded_count += 1
-                    
+                    sheet_names = pipeline.get_sheet_names(file_path)
                 except Exception as e:
-                    error_count += 1
                     error_messages.append(f"Failed to load {os.path.basename(file_path)}: {str(e)}")
+                    continue
+                if len(sheet_names) > 1:
+                    # Show sheet selection dialog
+                    sheet_name = self.select_sheet(sheet_names, os.path.basename(file_path))
+                    if sheet_name is None:
+                        continue  # Skip this file if no sheet selected
+            files.append((file_path, sheet_name))
+        
+        if not files:
+            if error_messages:
+                messagebox.showerror("Import Failed", "\n".join(error_messages))
+            return
+        
+        # Each file is parsed in its own worker process
+        workers = int(self.settings.get("parallel_workers", 0))
+        options = pipeline.load_options(self.settings)
+        self.run_task(
+            "Loading files",
+            lambda progress: pipeline.load_files(files, workers, progress, self.dataset_cache, options),
+            lambda loads: self.on_files_loaded(loads, error_messages),
+            error_title="Failed to load files"
+        )
+    
+    def on_files_loaded(self, loads, error_messages):
+        """Store the loaded datasets and summarize how each file went"""
+        loaded_lines = []
+        for load in loads:
+            if not load.ok:
+                error_messages.append(f"Failed to load {os.path.basename(load.file_path)}: {load.error}")
+                continue
             
-            # Update UI after all files are processed
-            self.update_dataset_list()
-            self.update_dataset_selector()
+            # Generate unique dataset name
+            dataset_name = pipeline.unique_dataset_name(load.file_path, self.datasets)
             
-            # Show summary message
-            if loaded_count > 0:
-                success_msg = f"Successfully loaded {loaded_count} dataset{'s' if loaded_count != 1 else ''}"
-                if error_count > 0:
-                    success_msg += f"\n\nWarning: {error_count} file{'s' if error_count != 1 else ''} failed to load:"
-                    success_msg += "\n" + "\n".join(error_messages)
-                messagebox.showinfo("Import Complete", success_msg)
-            elif error_count > 0:
-                error_msg = f"Failed to load {error_count} file{'s' if error_count != 1 else ''}:\n\n"
-                error_msg += "\n".join(error_messages)
-                messagebox.showerror("Import Failed", error_msg)
+            # Store dataset
+            self.datasets[dataset_name] = load.data
+            source = "from cache" if load.cached else "parsed"
+            loaded_lines.append(f" - {dataset_name}: {len(load.data):,} rows in {load.seconds:.1f}s ({source})")
+        
+        loaded_count = len(loaded_lines)
+        error_count = len(error_messages)
+        print("\n".join(loaded_lines + error_messages))  # Debug output
+        
+        # Update UI after all files are processed
+        self.update_dataset_list()
+        self.update_dataset_selector()
+        
+        # Show summary message
+        if loaded_count > 0:
+            success_msg = f"Successfully loaded {loaded_count} dataset{'s' if loaded_count != 1 else ''}"
+            success_msg += "\n" + "\n".join(loaded_lines)
+            if error_count > 0:
+                success_msg += f"\n\nWarning: {error_count} file{'s' if error_count != 1 else ''} failed to load:"
+                success_msg += "\n" + "\n".join(error_messages)
+            messagebox.showinfo("Import Complete", success_msg)
+        elif error_count > 0:
+            error_msg = f"Failed to load {error_count} file{'s' if error_count != 1 else ''}:\n\n"
+            error_msg += "\n".join(error_messages)
+            messagebox.showerror("Import Failed", error_msg)
     
-    def select_sheet(self, sheet_names):
+    def select_sheet(self, sheet_names, file_name=None):
         # Create a simple dialog to select sheet
         dialog = ctk.CTkToplevel(self.root)
-        dialog.title("Select Sheet")
+        dialog.title(f"Select Sheet - {file_name}" if file_name else "Select Sheet")
         dialog.geometry("300x200")
         dialog.transient(self.root)
         dialog.grab_set()
@@ -877,31 +1057,8 @@ class DataJoinerApp:
         return result[0]
     
     def detect_and_skip_dummy_rows(self, df):
-        # Simple heuristic to detect dummy rows
-        # Look for rows where most values are NaN or non-numeric
-        for i in range(min(10, len(df))):  # Check first 10 rows
-            row = df.iloc[i]
-            nan_count = row.isna().sum()
-            non_numeric_count = 0
-            
-            for val in row:
-                try:
-                    if pd.notna(val):
-                        try:
-                            float(str(val))
-                        except (ValueError, TypeError):
-                            non_numeric_count += 1
-                except (TypeError, ValueError):
-                    non_numeric_count += 1
-            
-            # If more than 70% of values are NaN or non-numeric, consider it a dummy row
-            if (nan_count + non_numeric_count) / len(row) > 0.7:
-                continue
-            else:
-                # Found the header row, return data starting from here
-                return df.iloc[i:].reset_index(drop=True)
-        
-        return df
+        """Skip leading rows that look like report titles rather than data"""
+        return pipeline.detect_and_skip_dummy_rows(df)
     
     def update_dataset_list(self):
         self.dataset_listbox.delete(0, tk.END)
@@ -980,32 +1137,7 @@ class DataJoinerApp:
             self.update_column_selector(df)
     
     def display_dataframe(self, df):
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Set up columns
-        columns = list(df.columns)
-        self.tree["columns"] = columns
-        self.tree["show"] = "headings"
-        
-        # Configure column headings
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100, minwidth=50)
-        
-        # Insert data (limit to first 100 rows for performance)
-        for i, row in df.head(100).iterrows():
-            values = []
-            for val in row:
-                try:
-                    if pd.notna(val):
-                        values.append(str(val))
-                    else:
-                        values.append("")
-                except (TypeError, ValueError):
-                    values.append("")
-            self.tree.insert("", "end", values=values)
+        self.data_grids[self.tree].show(df)
     
     def update_column_selector(self, df):
         columns = list(df.columns)
@@ -1028,7 +1160,11 @@ class DataJoinerApp:
             return
 
         if dataset_name in self.datasets:
-            self.datasets[dataset_name] = self.datasets[dataset_name].rename(columns={old_name: new_name})
+            try:
+                self.datasets[dataset_name] = pipeline.rename_columns(self.datasets[dataset_name], {old_name: new_name})
+            except pipeline.PipelineError as e:
+                messagebox.showerror("Error", str(e))
+                return
             self.display_dataframe(self.datasets[dataset_name])
             self.update_column_selector(self.datasets[dataset_name])
             messagebox.showinfo("Success", f"Column '{old_name}' renamed to '{new_name}'!")
@@ -1037,63 +1173,9 @@ class DataJoinerApp:
     def combine_datasets(self):
         """Combine datasets with robust error handling"""
         try:
-            # Establish a stable and predictable column order.
-            # Start with the columns from the first loaded dataset, then append new ones.
             if not self.datasets:
                 return None
-
-            # Get columns from the first dataset in order
-            first_dataset_name = next(iter(self.datasets))
-            ordered_columns = list(self.datasets[first_dataset_name].columns)
-            
-            # Discover new columns from other datasets
-            all_columns_set = set(ordered_columns)
-            for name, df in self.datasets.items():
-                for col in df.columns:
-                    if col not in all_columns_set:
-                        ordered_columns.append(col)
-                        all_columns_set.add(col)
-
-            combined_dfs = []
-            
-            for name, df in self.datasets.items():
-                # If dataset_info missing, supply default metadata but record a warning
-                if name not in self.dataset_info:
-                    print(f"Warning: No info found for dataset '{name}', using default metadata")
-                    info = {'month': 'Unknown', 'year': 0, 'service': 'Unknown'}
-                else:
-                    info = self.dataset_info[name]
-                
-                # Create a copy of the dataframe
-                df_copy = df.copy()
-
-                # Reindex to ensure all dataframes have the same columns, filling missing with empty string
-                df_copy = df_copy.reindex(columns=ordered_columns, fill_value="")
-                
-                # Add metadata columns
-                # Use .get() with a default value for safety, although the check above should handle it.
-                df_copy['Month'] = str(info.get('month', 'Unknown'))
-                df_copy['Year'] = info.get('year', 0)
-                df_copy['Service'] = str(info.get('service', 'Unknown'))
-                df_copy['Dataset_Name'] = str(name)
-                
-                combined_dfs.append(df_copy)
-            
-            if not combined_dfs:
-                print("Error: No valid datasets to combine")
-                return None
-            
-            # Combine all dataframes using concatenation (stacking)
-            # This is the default behavior for the new workflow
-            combined = pd.concat(combined_dfs, ignore_index=True, sort=False)
-            
-            # Ensure all columns are properly typed
-            for col in combined.columns:
-                if combined[col].dtype == 'object':
-                    # Replace 'nan' strings with actual NaN values
-                    combined[col] = combined[col].replace('nan', pd.NA)
-            
-            return combined
+            return pipeline.combine_datasets(self.datasets, self.dataset_info)
             
         except Exception as e:
             print(f"Error in combine_datasets: {e}")
@@ -1104,62 +1186,46 @@ class DataJoinerApp:
     def display_combined_data(self):
         if self.combined_data is None:
             return
-        
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Set up columns
-        columns = list(self.combined_data.columns)
-        self.tree["columns"] = columns
-        self.tree["show"] = "headings"
-        
-        # Configure column headings
-        for col in columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=100, minwidth=50)
-        
-        # Insert data (limit to first 100 rows for performance)
-        for i, row in self.combined_data.head(100).iterrows():
-            values = []
-            for val in row:
-                try:
-                    if pd.notna(val):
-                        values.append(str(val))
-                    else:
-                        values.append("")
-                except (TypeError, ValueError):
-                    values.append("")
-            self.tree.insert("", "end", values=values)
+        self.data_grids[self.tree].show(self.combined_data)
 
     def export_excel(self, pre_deduplication=False):
-        if pre_deduplication:
-            data_to_export = self.joined_additional_data
-            if data_to_export is None:
-                messagebox.showwarning("Warning", "Please complete the workflow up to Step 7 (Left Join) first!")
-                return
-        else:
-            data_to_export = self.final_data
-            if data_to_export is None:
-                messagebox.showwarning("Warning", "Please complete the workflow up to Step 8 (Deduplication) first!")
-                return
-        
+        self.export_data(pre_deduplication, "Save Excel File", ".xlsx", [("Excel files", "*.xlsx")])
+
+    def export_csv(self, pre_deduplication=False):
+        self.export_data(pre_deduplication, "Save CSV File", ".csv", [("CSV files", "*.csv")])
+
+    def export_other_format(self, pre_deduplication=False):
+        """Export to Parquet, compressed CSV or a SQLite table, chosen by the file type"""
+        self.export_data(pre_deduplication, "Save Export File", ".sqlite", [
+            ("SQLite database", "*.sqlite"),
+            ("Parquet files", "*.parquet"),
+            ("CSV, gzip-compressed", "*.csv.gz"),
+            ("CSV, zstd-compressed", "*.csv.zst"),
+        ])
+
+    def export_dropped_report(self):
+        """Export how many rows deduplication dropped for each key, most first"""
+        if self.dedup_result is None or self.final_data is None:
+            messagebox.showwarning("Warning", "Please complete Step 8 (Deduplication) first!")
+            return
         file_path = filedialog.asksaveasfilename(
-            title="Save Excel File",
-            initialfile=f"export_{'with_duplicates' if pre_deduplication else 'deduplicated'}_{datetime.now().strftime('%Y%m%d')}.xlsx",
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
+            title="Save Dropped Report",
+            initialfile=f"dropped_report_{datetime.now().strftime('%Y%m%d')}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("All files", "*.*")]
         )
-        
         if file_path:
-            try:
-                self.final_data.to_excel(file_path, index=False)
-                data_to_export.to_excel(file_path, index=False)
-                messagebox.showinfo("Success", f"Data exported to {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export: {str(e)}")
+            dropped = self.dedup_result.dropped
+            self.run_task(
+                "Exporting",
+                lambda progress: pipeline.export_dataset(dropped, file_path, progress),
+                lambda report: messagebox.showinfo("Success", f"Dropped report exported to {file_path}\n"
+                                                              f"{self.dedup_result.describe()}"),
+                error_title="Failed to export",
+                cancel_message="Nothing was written; any existing file was left as it was."
+            )
 
-    def export_csv(self, pre_deduplication=False):
+    def export_data(self, pre_deduplication, title, extension, filetypes):
         if pre_deduplication:
             data_to_export = self.joined_additional_data
             if data_to_export is None:
@@ -1172,19 +1238,23 @@ class DataJoinerApp:
                 return
         
         file_path = filedialog.asksaveasfilename(
-            title="Save CSV File",
-            initialfile=f"export_{'with_duplicates' if pre_deduplication else 'deduplicated'}_{datetime.now().strftime('%Y%m%d')}.csv",
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            title=title,
+            initialfile=f"export_{'with_duplicates' if pre_deduplication else 'deduplicated'}_{datetime.now().strftime('%Y%m%d')}{extension}",
+            defaultextension=extension,
+            filetypes=filetypes + [("All files", "*.*")]
         )
         
         if file_path:
-            try:
-                self.final_data.to_csv(file_path, index=False)
-                data_to_export.to_csv(file_path, index=False)
-                messagebox.showinfo("Success", f"Data exported to {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export: {str(e)}")
+            # SQLite exports index the join and dedup keys
+            index_columns = [self.cleaned_join_column.get(), self.deduplicate_column_selector.get()]
+            index_columns += [col.strip() for col in self.dedup_extra_keys_entry.get().split(',') if col.strip()]
+            self.run_task(
+                "Exporting",
+                lambda progress: pipeline.export_dataset(data_to_export, file_path, progress, index_columns),
+                lambda report: messagebox.showinfo("Success", f"Data exported to {file_path}\n{report.describe()}"),
+                error_title="Failed to export",
+                cancel_message="Nothing was written; any existing file was left as it was."
+            )
     
     def join_datasets(self):
         """Join all datasets and show preview"""
@@ -1192,66 +1262,68 @@ class DataJoinerApp:
             messagebox.showwarning("Warning", "No datasets loaded!")
             return
         
+        # Check if all datasets have required info
+        missing_info = [name for name in self.datasets.keys() if name not in self.dataset_info]
+        if missing_info:
+            # Warn the user but proceed using default metadata for missing datasets
+            messagebox.showwarning("Warning", f"Using default metadata for: {', '.join(missing_info)}")
+        
+        # Combine snapshots so loading or removing datasets meanwhile cannot disturb the join
+        datasets = dict(self.datasets)
+        dataset_info = dict(self.dataset_info)
+        optimize = self.settings.get("optimize_dtypes", True)
+        
+        def combine(progress):
+            combined = pipeline.combine_datasets(datasets, dataset_info, progress)
+            # Repeated text (statuses, program names) is stored as categories to save memory
+            return pipeline.optimize_dtypes(combined) if optimize else combined
+        
+        self.run_task(
+            "Joining datasets",
+            combine,
+            lambda combined: self.on_datasets_joined(combined, datasets),
+            error_title="Failed to join datasets"
+        )
+    
+    def on_datasets_joined(self, combined, datasets):
+        """Show the combined data once the join has finished"""
+        self.combined_data = combined
+        
+        # Display preview with complete dataset
+        self.display_dataframe_in_tree(self.join_tree, self.combined_data)
+        
+        # Debug info: rows per dataset and combined shape
         try:
-            # Check if all datasets have required info
-            missing_info = [name for name in self.datasets.keys() if name not in self.dataset_info]
-            if missing_info:
-                # Warn the user but proceed using default metadata for missing datasets
-                messagebox.showwarning("Warning", f"Using default metadata for: {', '.join(missing_info)}")
-            
-            # Combine datasets
-            self.combined_data = self.combine_datasets()
-            
-            if self.combined_data is None:
-                messagebox.showerror("Error", "Failed to combine datasets. Check the console for details.")
-                return
-            
-            # Display preview with complete dataset
-            if self.combined_data is not None:
-                self.display_dataframe_in_tree(self.join_tree, self.combined_data)
-                
-                # Debug info: rows per dataset and combined shape
-                try:
-                    per_ds = {name: len(df) for name, df in self.datasets.items()}
-                    combined_shape = self.combined_data.shape
-                    summary_lines = [f"Datasets included: {len(self.datasets)}"]
-                    total_input_rows = 0
-                    for k,v in per_ds.items():
-                        total_input_rows += v
-                        summary_lines.append(f" - {k}: {v} rows")
-                    summary_lines.append(f"Combined shape: {combined_shape[0]} rows x {combined_shape[1]} cols")
-                    if total_input_rows != combined_shape[0]:
-                        summary_lines.append(f"WARNING: Input rows ({total_input_rows}) != Combined rows ({combined_shape[0]})")
-                    summary_text = "\n".join(summary_lines)
-                    print(summary_text)  # Debug output
-                    self.join_summary_label.configure(text=summary_text)
-                except Exception as e:
-                    print(f"Error updating join summary: {e}")
-                    pass
-            #except Exception as e:
-            #    print(f"Error building join summary: {e}")
-            # Mark datasets joined
-            self.datasets_joined = True
-            # Ensure address selector updated
-            column_list = list(self.combined_data.columns) if self.combined_data is not None else []
-            # Update column selector for the next step (Address Cleaning)
-            try:
-                self.address_column_selector.configure(values=column_list)
-                if column_list:
-                    self.address_column_selector.set(column_list[0])
-            except Exception:
-                pass # Ignore if widget doesn't exist yet
-            
-            total_rows = len(self.combined_data)
-            preview_rows = min(200, total_rows)
-            messagebox.showinfo("Success", f"Datasets joined successfully!\n\nTotal rows: {total_rows}\nPreview showing: {preview_rows} rows\n\nYou can now proceed to address cleaning.")
-            
+            per_ds = {name: len(df) for name, df in datasets.items()}
+            combined_shape = self.combined_data.shape
+            summary_lines = [f"Datasets included: {len(datasets)}"]
+            total_input_rows = 0
+            for k,v in per_ds.items():
+                total_input_rows += v
+                summary_lines.append(f" - {k}: {v} rows")
+            summary_lines.append(f"Combined shape: {combined_shape[0]} rows x {combined_shape[1]} cols")
+            if total_input_rows != combined_shape[0]:
+                summary_lines.append(f"WARNING: Input rows ({total_input_rows}) != Combined rows ({combined_shape[0]})")
+            summary_text = "\n".join(summary_lines)
+            print(summary_text)  # Debug output
+            self.join_summary_label.configure(text=summary_text)
         except Exception as e:
-            error_msg = f"Failed to join datasets: {str(e)}"
-            print(f"Join error: {error_msg}")
-            import traceback
-            traceback.print_exc()
-            messagebox.showerror("Error", error_msg)
+            print(f"Error updating join summary: {e}")
+            pass
+        # Mark datasets joined
+        self.datasets_joined = True
+        # Ensure address selector updated
+        column_list = list(self.combined_data.columns)
+        # Update column selector for the next step (Address Cleaning)
+        try:
+            self.address_column_selector.configure(values=column_list)
+            if column_list:
+                self.address_column_selector.set(column_list[0])
+        except Exception:
+            pass # Ignore if widget doesn't exist yet
+        
+        total_rows = len(self.combined_data)
+        messagebox.showinfo("Success", f"Datasets joined successfully!\n\nTotal rows: {total_rows:,}\n\nYou can now proceed to address cleaning.")
     
     def deduplicate_by_date_action(self):
         """Groups by a column and keeps the most recent entry based on Year and Month."""
@@ -1264,37 +1336,29 @@ class DataJoinerApp:
             messagebox.showwarning("Warning", "Please select a column to group by.")
             return
         
+        key_columns = [group_by_col] + [col.strip() for col in self.dedup_extra_keys_entry.get().split(',') if col.strip()]
+        
         try:
-            df = self.joined_additional_data.copy()
-
-            # Map month names to numbers for sorting. 'NA' becomes 0 (oldest).
-            month_map = {
-                "January": 1, "February": 2, "March": 3, "April": 4, "May": 5, "June": 6,
-                "July": 7, "August": 8, "September": 9, "October": 10, "November": 11, "December": 12,
-                "NA": 0
-            }
-            # Ensure 'Month' column exists before mapping
-            if 'Month' in df.columns:
-                df['Month_Num'] = df['Month'].map(month_map).fillna(0)
-            else:
-                messagebox.showerror("Error", "The 'Month' column is required for deduplication but was not found.")
-                return
-
-            # Sort by Year and Month_Num descending to bring the most recent to the top of each group
-            df_sorted = df.sort_values(by=['Year', 'Month_Num'], ascending=[False, False])
-
-            # Drop duplicates on the selected column, keeping the first (most recent) entry
-            self.final_data = df_sorted.drop_duplicates(subset=[group_by_col], keep='first')
-
-            # Clean up the temporary Month_Num column
-            self.final_data = self.final_data.drop(columns=['Month_Num'])
+            tie_breakers = pipeline.parse_tie_breakers(self.dedup_tie_break_entry.get())
+            result = pipeline.deduplicate_records(self.joined_additional_data, key_columns, tie_breakers,
+                                                  file_order=list(self.datasets))
+            self.final_data = result.data
+            self.dedup_result = result
             self.data_deduplicated = True
 
             # Update UI
             self.display_dataframe_in_tree(self.dedup_tree, self.final_data)
 
-            messagebox.showinfo("Success", f"Deduplication complete. Kept the most recent record for each unique '{group_by_col}'.")
+            message = f"Deduplication complete. Kept the most recent record for each unique '{' + '.join(key_columns)}'.\n{result.describe()}."
+            if len(result.dropped):
+                top = result.dropped.iloc[0]
+                key_text = ", ".join(str(top[col]) for col in key_columns)
+                message += f"\nMost duplicated: {key_text} ({top['Rows_Dropped']:,} rows dropped)"
+                message += "\nUse 'Export Dropped Report' for the rows dropped for every key."
+            messagebox.showinfo("Success", message)
 
+        except pipeline.PipelineError as e:
+            messagebox.showerror("Error", str(e))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to deduplicate data: {str(e)}")
 
@@ -1329,7 +1393,7 @@ class DataJoinerApp:
                 return
             # Ensure it's a DataFrame
             if hasattr(self.combined_data, 'to_excel'):
-                self.combined_data.to_excel(save_path, index=False)
+                pipeline.export_dataset(self.combined_data, save_path)
                 messagebox.showinfo("Saved", f"Combined XLSX saved to:\n{save_path}")
             else:
                 messagebox.showerror("Error", "Combined data is not a valid DataFrame.")
@@ -1365,7 +1429,7 @@ class DataJoinerApp:
             if not save_path:
                 return
             if hasattr(self.cleaned_data, 'to_excel'):
-                self.cleaned_data.to_excel(save_path, index=False)
+                pipeline.export_dataset(self.cleaned_data, save_path)
                 messagebox.showinfo("Saved", f"Cleaned XLSX saved to:\n{save_path}")
             else:
                 messagebox.showerror("Error", "Cleaned data is not a valid DataFrame.")
@@ -1391,51 +1455,82 @@ class DataJoinerApp:
             messagebox.showerror("Error", f"Column '{address_column}' not found in data!")
             return
             
-        try:
-            # Store original data before cleaning
-            self.pre_cleaned_data = self.combined_data.copy()
-            
-            # Create a copy of the combined data
-            self.cleaned_data = self.combined_data.copy()
-            
-            print(f"Processing {len(self.cleaned_data)} rows from combined data...")  # Debug print
-            
-            # Clean the address column and get results
-            cleaned_addresses, auto_cleaned_flags, may_have_word_flags = self.clean_address_column(self.cleaned_data[address_column])
-            
-            # Verify the lengths match
-            if not (len(cleaned_addresses) == len(self.cleaned_data) and len(auto_cleaned_flags) == len(self.cleaned_data) and len(may_have_word_flags) == len(self.cleaned_data)):
-                raise ValueError(f"Mismatch in processed data lengths after cleaning.")
-            
-            # CRITICAL FIX: Ensure the index of the new Series matches the DataFrame's index to prevent misalignment.
-            cleaned_addresses.index = self.cleaned_data.index
-            auto_cleaned_flags.index = self.cleaned_data.index
-            may_have_word_flags.index = self.cleaned_data.index
-
-            # Add new columns
-            new_address_name = f"new_{address_column}"
-            auto_cleaned_col_name = f"{address_column}_auto_cleaned"
-            may_have_word_col_name = f"{address_column}_may_have_word"
-
-            self.cleaned_data[new_address_name] = cleaned_addresses
-            self.cleaned_data[auto_cleaned_col_name] = auto_cleaned_flags
-            self.cleaned_data[may_have_word_col_name] = may_have_word_flags
-            
-            print(f"Processed {len(self.cleaned_data)} rows successfully")  # Debug print
-            
-            # Set cleaning status
-            self.address_cleaning_done = True
-            
-            # Display preview
-            self.display_dataframe_in_tree(self.clean_tree, self.cleaned_data)
-            
-            # Update column selectors for additional dataset join
-            self.update_join_column_selectors()
-            
-            messagebox.showinfo("Success", f"Address cleaning completed! Created columns:\n- {new_address_name}\n- {auto_cleaned_col_name}\n- {may_have_word_col_name}")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to clean address data: {str(e)}")
+        combined = self.combined_data
+        cleaner = self.create_address_cleaner()
+        graph = self.step_graph
+        print(f"Processing {len(combined)} rows from combined data...")  # Debug print
+        
+        def clean(progress):
+            # Each dataset's rows are cleaned separately, so datasets whose addresses have not
+            # changed since the last cleaning (e.g. only their metadata was edited) are reused
+            graph.start()
+            cleaned = pipeline.clean_address_partitions(combined, address_column, cleaner, graph, progress)
+            graph.finish()
+            if graph.reused:
+                print(f"Reused cleaned addresses for: {', '.join(name.split(':', 1)[1] for name in graph.reused)}")  # Debug print
+            return cleaned
+        
+        self.run_task(
+            "Cleaning addresses",
+            clean,
+            lambda cleaned: self.on_addresses_cleaned(combined, cleaned, address_column),
+            error_title="Failed to clean address data"
+        )
+    
+    def on_addresses_cleaned(self, combined, cleaned, address_column):
+        """Show the cleaned data once address cleaning has finished"""
+        # Store original data before cleaning (it shares every column with the combined stage)
+        self.pre_cleaned_data = combined
+        self.cleaned_data = cleaned
+        
+        new_address_name = f"new_{address_column}"
+        auto_cleaned_col_name = f"{address_column}_auto_cleaned"
+        may_have_word_col_name = f"{address_column}_may_have_word"
+        
+        print(f"Processed {len(self.cleaned_data)} rows successfully")  # Debug print
+        print(f"Address cache: {self.address_cache.stats()}")  # Debug print
+        
+        # Set cleaning status
+        self.address_cleaning_done = True
+        
+        # Display preview
+        self.display_dataframe_in_tree(self.clean_tree, self.cleaned_data)
+        
+        # Update column selectors for additional dataset join
+        self.update_join_column_selectors()
+        
+        messagebox.showinfo("Success", f"Address cleaning completed! Created columns:\n- {new_address_name}\n- {auto_cleaned_col_name}\n- {may_have_word_col_name}\n\nAddress cache: {self.address_cache.stats()}")
+    
+    def find_duplicate_clients(self):
+        """Give rows that are the same client spelled differently the same Client_Cluster"""
+        if not self.address_cleaning_done or self.cleaned_data is None:
+            messagebox.showwarning("Warning", "Please clean address data first!")
+            return
+        
+        name_columns = [col.strip() for col in self.client_name_columns_entry.get().split(',') if col.strip()]
+        if not name_columns:
+            messagebox.showwarning("Warning", "Please enter the name columns (e.g., First_Name, Last_Name)!")
+            return
+        
+        cleaned = self.cleaned_data
+        address_column = f"new_{self.address_column_selector.get()}"
+        threshold = self.settings["client_match_threshold"]
+        window = self.settings["client_match_window"]
+        self.run_task(
+            "Finding duplicate clients",
+            lambda progress: pipeline.resolve_clients(cleaned, name_columns, address_column, threshold, window, progress),
+            self.on_duplicate_clients_found,
+            error_title="Failed to find duplicate clients"
+        )
+    
+    def on_duplicate_clients_found(self, result):
+        """Show the cleaned data with its Client_Cluster column"""
+        self.cleaned_data = result.data
+        self.display_dataframe_in_tree(self.clean_tree, self.cleaned_data)
+        self.update_join_column_selectors()
+        
+        messagebox.showinfo("Success", f"{result.describe()}.\n\nJoin in Step 7, then deduplicate on "
+                                       f"'{CLUSTER_COLUMN}' in Step 8 to keep one row per client.")
     
     def clean_address_column(self, address_series):
         """
@@ -1444,76 +1539,11 @@ class DataJoinerApp:
         2. Flags addresses with ambiguous patterns ('#', PO Box, number patterns) for manual review.
         Returns three Series: cleaned_addresses, auto_cleaned_flags, may_have_word_flags.
         """
-        cleaned_addresses = []
-        auto_cleaned_flags = []
-        may_have_word_flags = []
-        
-        for address in address_series:
-            # First, check for pandas NA/NaN values. This is the most reliable check for missing data.
-            if pd.isna(address):
-                cleaned_addresses.append("")
-                auto_cleaned_flags.append("No")
-                may_have_word_flags.append("No")
-                continue
-
-            # If not NA, convert to string and check if it's empty after stripping whitespace.
-            address_str = str(address).strip()
-            if not address_str:
-                cleaned_addresses.append("")
-                auto_cleaned_flags.append("No")
-                may_have_word_flags.append("No")
-                continue
-
-            address_upper = address_str.upper()
-            
-            # --- 1. High-Confidence Auto-Cleaning ---
-            earliest_pos = len(address_str)
-            found_apt_word = False
-            for word in self.settings["apartment_words"]:
-                pattern = r'\b' + re.escape(word.upper()) + r'\b'
-                match = re.search(pattern, address_upper)
-                if match and match.start() < earliest_pos:
-                    earliest_pos = match.start()
-                    found_apt_word = True
-            
-            if found_apt_word:
-                cleaned_addresses.append(address_str[:earliest_pos].strip())
-                auto_cleaned_flags.append("Yes")
-                may_have_word_flags.append("No") # If auto-cleaned, no need for manual review flag
-                continue
-
-            # --- 2. Flag for Manual Review (No Auto-Cleaning) ---
-            flag_for_review = False
-            # Check for '#' symbol
-            if '#' in address_str:
-                flag_for_review = True
-            
-            # Check for PO Box words
-            if not flag_for_review:
-                for po_box in self.settings["po_box_words"]:
-                    if po_box.upper() in address_upper:
-                        flag_for_review = True
-                        break
-            
-            # Check for number patterns
-            if not flag_for_review:
-                for pattern in self.settings["number_patterns"]:
-                    if re.search(pattern, address_upper):
-                        flag_for_review = True
-                        break
-            
-            # --- 3. Final Assignment ---
-            if flag_for_review:
-                cleaned_addresses.append(address_str) # Keep original address
-                auto_cleaned_flags.append("No")
-                may_have_word_flags.append("Yes")
-            else:
-                # No indicators found
-                cleaned_addresses.append(address_str)
-                auto_cleaned_flags.append("No")
-                may_have_word_flags.append("No")
-
-        return pd.Series(cleaned_addresses), pd.Series(auto_cleaned_flags), pd.Series(may_have_word_flags)
+        return self.create_address_cleaner().clean(address_series)
+    
+    def create_address_cleaner(self):
+        """Build an AddressCleaner for the current settings, sharing the session caches"""
+        return AddressCleaner(self.settings, cache=self.address_cache, store=self.address_store)
     
     def load_additional_dataset(self):
         """Load additional dataset for left join"""
@@ -1528,22 +1558,17 @@ class DataJoinerApp:
         
         if file_path:
             try:
-                # Read the file
+                # Read the file, handling Excel files with multiple sheets
+                sheet_name = None
                 if file_path.endswith(('.xlsx', '.xls')):
-                    excel_file = pd.ExcelFile(file_path)
-                    if len(excel_file.sheet_names) > 1:
-                        sheet_name = self.select_sheet(excel_file.sheet_names)
+                    sheet_names = pipeline.get_sheet_names(file_path)
+                    if len(sheet_names) > 1:
+                        sheet_name = self.select_sheet(sheet_names)
                         if sheet_name is None:
                             return
-                    else:
-                        sheet_name = excel_file.sheet_names[0]
-                    
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
-                else:
-                    df = pd.read_csv(file_path)
                 
-                # Try to detect and skip dummy rows
-                df = self.detect_and_skip_dummy_rows(df)
+                # Read the data and skip dummy rows
+                df = pipeline.read_dataset(file_path, sheet_name, **pipeline.load_options(self.settings))
                 
                 # Store additional dataset
                 self.additional_dataset = df
@@ -1579,30 +1604,53 @@ class DataJoinerApp:
             messagebox.showwarning("Warning", "Please select join columns!")
             return
         
-        try:
-            # Perform left join
-            self.joined_additional_data = self.cleaned_data.merge(
-                self.summarized_additional_data,
-                left_on=cleaned_column,
-                right_on=additional_column,
-                how='left',
-                suffixes=('', '_additional')
-            )
-            self.additional_join_done = True
+        match_addresses = self.match_addresses_var.get()
+        threshold = None
+        if match_addresses:
+            try:
+                threshold = float(self.match_threshold_entry.get().strip())
+            except ValueError:
+                messagebox.showwarning("Warning", "Min. Similarity must be a number between 0 and 1.")
+                return
+        
+        cleaned = self.cleaned_data
+        summarized = self.summarized_additional_data
+        join_index = self.join_index
 
-            # Display preview
-            self.display_dataframe_in_tree(self.final_tree, self.joined_additional_data)
+        def join(progress):
+            # Joining again onto the same summary, the same way, reuses its index
+            index = join_index
+            if match_addresses:
+                reusable = isinstance(index, pipeline.AddressJoinIndex) and index.matches(summarized, additional_column, threshold)
+            else:
+                reusable = isinstance(index, pipeline.JoinIndex) and index.matches(summarized, additional_column)
+            if not reusable:
+                index = pipeline.build_join_index(summarized, additional_column, match_addresses, threshold)
+            return index, index.join(cleaned, cleaned_column, progress)
 
-            # Update column selector for the next step (Deduplication)
-            if self.joined_additional_data is not None:
-                self.deduplicate_column_selector.configure(values=list(self.joined_additional_data.columns))
-                if not self.joined_additional_data.columns.empty:
-                    self.deduplicate_column_selector.set(self.joined_additional_data.columns[0])
-            
-            messagebox.showinfo("Success", "Additional dataset joined successfully! You can now proceed to Step 8 to deduplicate.")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to join additional dataset: {str(e)}")
+        self.run_task(
+            "Joining additional data",
+            join,
+            self.on_additional_dataset_joined,
+            error_title="Failed to join additional dataset"
+        )
+    
+    def on_additional_dataset_joined(self, joined):
+        """Show the joined data once the left join has finished"""
+        self.join_index, result = joined
+        self.joined_additional_data = result.data
+        self.additional_join_done = True
+
+        # Display preview
+        self.display_dataframe_in_tree(self.final_tree, self.joined_additional_data)
+
+        # Update column selector for the next step (Deduplication)
+        self.deduplicate_column_selector.configure(values=list(self.joined_additional_data.columns))
+        if not self.joined_additional_data.columns.empty:
+            self.deduplicate_column_selector.set(self.joined_additional_data.columns[0])
+        
+        messagebox.showinfo("Success", f"Additional dataset joined successfully!\n{result.report.describe()}\n\n"
+                                       "You can now proceed to Step 8 to deduplicate.")
     
     def refresh_final_preview(self):
         """Refresh the final preview"""
@@ -1631,10 +1679,7 @@ class DataJoinerApp:
 
         try:
             # Perform value_counts
-            summary = self.additional_dataset[summarize_col].value_counts().reset_index()
-            summary.columns = [summarize_col, 'Count']
-
-            self.summarized_additional_data = summary
+            self.summarized_additional_data = pipeline.summarize_additional_data(self.additional_dataset, summarize_col)
             self.additional_data_summarized = True
 
             # Display preview
@@ -1653,38 +1698,40 @@ class DataJoinerApp:
             self.additional_data_summarized = False
             messagebox.showerror("Error", f"Failed to summarize data: {str(e)}")
     
+    def create_filter_bar(self, preview_frame, tree_widget, tree_frame):
+        """Add a bar above a preview that filters its rows across the whole table"""
+        grid = self.data_grids[tree_widget]
+        filter_frame = ctk.CTkFrame(preview_frame)
+        filter_frame.pack(fill="x", padx=10, pady=(10, 0), before=tree_frame)
+
+        ctk.CTkLabel(filter_frame, text="Filter:", font=ctk.CTkFont(size=12, weight="bold")).pack(side="left", padx=10, pady=5)
+        filter_entry = ctk.CTkEntry(
+            filter_frame,
+            placeholder_text="e.g., Address_may_have_word = Yes; Client_ID = 1234 (or any text)",
+            width=420)
+        filter_entry.pack(side="left", padx=5, pady=5)
+        filter_entry.bind("<Return>", lambda event: grid.set_filter(filter_entry.get()))
+
+        def clear_filter():
+            filter_entry.delete(0, "end")
+            grid.set_filter("")
+
+        ctk.CTkButton(filter_frame, text="Apply", width=70, command=lambda: grid.set_filter(filter_entry.get()),
+            fg_color=Colors.ACTION_BLUE,
+            hover_color=Colors.ACTION_BLUE_HOVER).pack(side="left", padx=5, pady=5)
+        ctk.CTkButton(filter_frame, text="Clear", width=70, command=clear_filter,
+            fg_color=Colors.DESTRUCTIVE_RED,
+            hover_color=Colors.DESTRUCTIVE_RED_HOVER).pack(side="left", padx=5, pady=5)
+
+        filter_status = ctk.CTkLabel(filter_frame, text="", text_color=Colors.TEXT_SECONDARY)
+        filter_status.pack(side="left", padx=10, pady=5)
+        grid.on_change = lambda grid: filter_status.configure(
+            text=grid.summary(),
+            text_color=Colors.WARNING_ORANGE if grid.filter_error else Colors.TEXT_SECONDARY)
+
     def display_dataframe_in_tree(self, tree_widget, dataframe):
-        """Display dataframe in tree widget"""
-        # Clear existing items
-        for item in tree_widget.get_children():
-            tree_widget.delete(item)
-        
-        if dataframe is None or dataframe.empty:
-            return
-        
-        # Set up columns
-        columns = list(dataframe.columns)
-        tree_widget["columns"] = columns
-        tree_widget["show"] = "headings"
-        
-        # Configure column headings
-        for col in columns:
-            tree_widget.heading(col, text=col)
-            tree_widget.column(col, width=100, minwidth=50)
-        
-        # Insert data (limit to first 200 rows for performance)
-        preview_rows = min(200, len(dataframe))
-        for i, row in dataframe.head(preview_rows).iterrows():
-            values = []
-            for val in row:
-                try:
-                    if pd.notna(val):
-                        values.append(str(val))
-                    else:
-                        values.append("")
-                except (TypeError, ValueError):
-                    values.append("")
-            tree_widget.insert("", "end", values=values)
+        """Display dataframe in tree widget (every row can be scrolled to; only the visible ones are filled)"""
+        self.data_grids[tree_widget].show(dataframe)
     
     def open_settings(self):
         """Open settings window"""
@@ -1732,6 +1779,91 @@ class DataJoinerApp:
         self.num_patterns_text.pack(fill="x", padx=10, pady=(0, 10))
         self.num_patterns_text.insert("1.0", "\n".join(self.settings["number_patterns"]))
         
+        # Parallel cleaning
+        parallel_frame = ctk.CTkFrame(scrollable_frame)
+        parallel_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(parallel_frame, text="Parallel Cleaning (0 workers = one per CPU):", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        
+        ctk.CTkLabel(parallel_frame, text="Workers:").pack(side="left", padx=(10, 5), pady=(0, 10))
+        self.parallel_workers_entry = ctk.CTkEntry(parallel_frame, width=80)
+        self.parallel_workers_entry.pack(side="left", padx=5, pady=(0, 10))
+        self.parallel_workers_entry.insert(0, str(self.settings["parallel_workers"]))
+        
+        ctk.CTkLabel(parallel_frame, text="Chunk Size:").pack(side="left", padx=(20, 5), pady=(0, 10))
+        self.parallel_chunk_entry = ctk.CTkEntry(parallel_frame, width=100)
+        self.parallel_chunk_entry.pack(side="left", padx=5, pady=(0, 10))
+        self.parallel_chunk_entry.insert(0, str(self.settings["parallel_chunk_size"]))
+        
+        # Header detection
+        header_frame = ctk.CTkFrame(scrollable_frame)
+        header_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(header_frame, text="Header Detection (title rows at the top of files):", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        
+        ctk.CTkLabel(header_frame, text="Rows to Check:").pack(side="left", padx=(10, 5), pady=(0, 10))
+        self.header_scan_rows_entry = ctk.CTkEntry(header_frame, width=80)
+        self.header_scan_rows_entry.pack(side="left", padx=5, pady=(0, 10))
+        self.header_scan_rows_entry.insert(0, str(self.settings["header_scan_rows"]))
+        
+        self.scan_raw_headers_var = tk.BooleanVar(value=self.settings["scan_raw_headers"])
+        ctk.CTkCheckBox(
+            header_frame,
+            text="Find the header row below title banners",
+            variable=self.scan_raw_headers_var
+        ).pack(side="left", padx=(20, 5), pady=(0, 10))
+        
+        # Memory use
+        memory_frame = ctk.CTkFrame(scrollable_frame)
+        memory_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(memory_frame, text="Memory Use:", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        
+        self.optimize_dtypes_var = tk.BooleanVar(value=self.settings["optimize_dtypes"])
+        ctk.CTkCheckBox(
+            memory_frame,
+            text="Store columns with few distinct values as categories",
+            variable=self.optimize_dtypes_var
+        ).pack(anchor="w", padx=10, pady=(0, 10))
+        
+        # Saved address cache
+        cache_frame = ctk.CTkFrame(scrollable_frame)
+        cache_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(cache_frame, text="Saved Address Cache:", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        
+        cache_size_btn = ctk.CTkButton(cache_frame, text="Show Cache Size", command=self.show_address_cache_size)
+        cache_size_btn.pack(side="left", padx=10, pady=(0, 10))
+        
+        clear_cache_btn = ctk.CTkButton(
+            cache_frame,
+            text="Clear Cache",
+            command=self.clear_address_cache,
+            fg_color=Colors.DESTRUCTIVE_RED,
+            hover_color=Colors.DESTRUCTIVE_RED_HOVER,
+            text_color=Colors.TEXT_PRIMARY
+        )
+        clear_cache_btn.pack(side="left", padx=10, pady=(0, 10))
+        
+        # Dataset cache management
+        dataset_cache_frame = ctk.CTkFrame(scrollable_frame)
+        dataset_cache_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(dataset_cache_frame, text="Saved Dataset Cache:", font=ctk.CTkFont(size=12, weight="bold")).pack(anchor="w", padx=10, pady=(10, 5))
+        
+        dataset_cache_size_btn = ctk.CTkButton(dataset_cache_frame, text="Show Cache Size", command=self.show_dataset_cache_size)
+        dataset_cache_size_btn.pack(side="left", padx=10, pady=(0, 10))
+        
+        clear_dataset_cache_btn = ctk.CTkButton(
+            dataset_cache_frame,
+            text="Clear Cache",
+            command=self.clear_dataset_cache,
+            fg_color=Colors.DESTRUCTIVE_RED,
+            hover_color=Colors.DESTRUCTIVE_RED_HOVER,
+            text_color=Colors.TEXT_PRIMARY
+        )
+        clear_dataset_cache_btn.pack(side="left", padx=10, pady=(0, 10))
+        
         # Buttons
         button_frame = ctk.CTkFrame(scrollable_frame)
         button_frame.pack(fill="x", pady=20)
@@ -1745,6 +1877,46 @@ class DataJoinerApp:
         cancel_btn = ctk.CTkButton(button_frame, text="Cancel", command=settings_window.destroy)
         cancel_btn.pack(side="right", padx=10, pady=10)
     
+    def show_address_cache_size(self):
+        """Show the size of the in-memory and on-disk address caches"""
+        message = f"In memory: {self.address_cache.stats()}"
+        if self.address_store is not None:
+            message += f"\n\nOn disk: {self.address_store.describe()}"
+        else:
+            message += "\n\nOn disk: disabled (no cache_file in settings.json)"
+        messagebox.showinfo("Address Cache", message)
+    
+    def clear_address_cache(self):
+        """Clear the in-memory and on-disk address caches"""
+        if not messagebox.askyesno("Confirm", "Clear all saved address cleaning results?"):
+            return
+        try:
+            self.address_cache.clear()
+            if self.address_store is not None:
+                self.address_store.clear()
+            messagebox.showinfo("Success", "Address cache cleared!")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to clear address cache: {str(e)}")
+    
+    def show_dataset_cache_size(self):
+        """Show the size of the on-disk dataset cache"""
+        if self.dataset_cache is None:
+            messagebox.showinfo("Dataset Cache", "Disabled (no dataset_cache_dir in settings.json)")
+            return
+        messagebox.showinfo("Dataset Cache", self.dataset_cache.describe())
+    
+    def clear_dataset_cache(self):
+        """Delete the cached copies of loaded files"""
+        if self.dataset_cache is None:
+            return
+        if not messagebox.askyesno("Confirm", "Clear all cached datasets? Files will be parsed again the next time they are loaded."):
+            return
+        try:
+            self.dataset_cache.clear()
+            messagebox.showinfo("Success", "Dataset cache cleared!")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to clear dataset cache: {str(e)}")
+    
     def save_settings_from_window(self, window):
         """Save settings from settings window"""
         try:
@@ -1757,14 +1929,31 @@ class DataJoinerApp:
             # Get number patterns
             num_patterns = [pattern.strip() for pattern in self.num_patterns_text.get("1.0", "end-1c").split("\n") if pattern.strip()]
             
+            # Get parallel cleaning options
+            try:
+                parallel_workers = int(self.parallel_workers_entry.get().strip())
+                parallel_chunk_size = int(self.parallel_chunk_entry.get().strip())
+                header_scan_rows = int(self.header_scan_rows_entry.get().strip())
+            except ValueError:
+                messagebox.showwarning("Warning", "Workers, Chunk Size and Rows to Check must be whole numbers.")
+                return
+            
             # Update settings
             self.settings["apartment_words"] = apt_words
             self.settings["po_box_words"] = po_words
             self.settings["number_patterns"] = num_patterns
+            self.settings["parallel_workers"] = parallel_workers
+            self.settings["parallel_chunk_size"] = parallel_chunk_size
+            self.settings["header_scan_rows"] = max(1, header_scan_rows)
+            self.settings["scan_raw_headers"] = self.scan_raw_headers_var.get()
+            self.settings["optimize_dtypes"] = self.optimize_dtypes_var.get()
             
             # Save to file
             self.save_settings()
             
+            # Cached results were produced with the old rules
+            self.address_cache.clear()
+            
             messagebox.showinfo("Success", "Settings saved successfully!")
             window.destroy()
             
@@ -1776,6 +1965,9 @@ class DataJoinerApp:
         default_settings = DefaultSettings.get_defaults()
         self.settings = default_settings
         
+        # Cached results were produced with the old rules
+        self.address_cache.clear()
+        
         # Update text widgets
         self.apt_words_text.delete("1.0", "end")
         self.apt_words_text.insert("1.0", "\n".join(self.settings["apartment_words"]))
@@ -1785,10 +1977,23 @@ class DataJoinerApp:
         
         self.num_patterns_text.delete("1.0", "end")
         self.num_patterns_text.insert("1.0", "\n".join(self.settings["number_patterns"]))
+        
+        self.parallel_workers_entry.delete(0, "end")
+        self.parallel_workers_entry.insert(0, str(self.settings["parallel_workers"]))
+        
+        self.parallel_chunk_entry.delete(0, "end")
+        self.parallel_chunk_entry.insert(0, str(self.settings["parallel_chunk_size"]))
+        
+        self.header_scan_rows_entry.delete(0, "end")
+        self.header_scan_rows_entry.insert(0, str(self.settings["header_scan_rows"]))
+        self.scan_raw_headers_var.set(self.settings["scan_raw_headers"])
+        self.optimize_dtypes_var.set(self.settings["optimize_dtypes"])
     
     def run(self):
         self.root.mainloop()
 
 if __name__ == "__main__":
+    # Required for the address cleaning process pool in the frozen (PyInstaller) build
+    multiprocessing.freeze_support()
     app = DataJoinerApp()
     app.run()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Defines the on-disk cache of ingested datasets for the Data Joiner application.
+Each loaded file (after dummy rows are skipped) is saved in a binary format keyed on
+the file path, modification time, size and sheet, so unchanged files reload without
+being parsed again. Parquet is used when pyarrow is installed, pickle otherwise.
+
+Usage:
+    python dataset_cache.py size     # show how many datasets are cached
+    python dataset_cache.py clear    # delete all cached datasets
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+
+import pandas as pd
+
+
+# Bump when the loading steps change, so datasets cached by older versions are not reused
+CACHE_VERSION = 2
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _write_atomic(path, write):
+    """Call write(temp_path) and move the result into place, so readers never see half a file"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class DatasetCache:
+    """A directory of ingested datasets, one file per source file and sheet."""
+
+    def __init__(self, directory="dataset_cache"):
+        self.directory = directory
+
+    def key(self, file_path, sheet_name=None, options=None):
+        """
+        Return the cache key for a file as it is on disk right now. The first half only
+        depends on the path and sheet, so older copies of the same source can be found.
+        """
+        stat = os.stat(file_path)
+        source = [os.path.abspath(file_path), sheet_name]
+        version = [CACHE_VERSION, stat.st_mtime_ns, stat.st_size, options]
+        return f"{_digest(source)}_{_digest(version)}"
+
+    def _paths(self, key):
+        return [os.path.join(self.directory, key + extension) for extension in (".parquet", ".pkl")]
+
+    def load(self, file_path, sheet_name=None, options=None):
+        """Return the cached dataset for an unchanged file, or None"""
+        try:
+            parquet_path, pickle_path = self._paths(self.key(file_path, sheet_name, options))
+        except OSError:
+            # A missing file is reported by the loader, not the cache
+            return None
+        try:
+            if HAS_PYARROW and os.path.exists(parquet_path):
+                return pd.read_parquet(parquet_path)
+            if os.path.exists(pickle_path):
+                return pd.read_pickle(pickle_path)
+        except Exception as e:
+            # A damaged entry is simply parsed again
+            print(f"Warning: Could not read cached copy of {os.path.basename(file_path)}: {e}")
+        return None
+
+    def save(self, file_path, df, sheet_name=None, options=None):
+        """Store a dataset under the key of its source file, replacing older copies of it"""
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key(file_path, sheet_name, options)
+        prefix = key.split("_")[0] + "_"
+        for path in self._entries():
+            if os.path.basename(path).startswith(prefix):
+                os.remove(path)
+
+        parquet_path, pickle_path = self._paths(key)
+        if HAS_PYARROW:
+            try:
+                _write_atomic(parquet_path, lambda temp_path: df.to_parquet(temp_path, index=False))
+                return
+            except Exception:
+                # Columns mixing numbers and text cannot be written to Parquet
+                pass
+        _write_atomic(pickle_path, df.to_pickle)
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith((".parquet", ".pkl"))]
+
+    def info(self):
+        """Return a dict with the number of cached datasets and their total size"""
+        entries = self._entries()
+        return {"entries": len(entries), "file_bytes": sum(os.path.getsize(path) for path in entries)}
+
+    def describe(self):
+        """Return a short human-readable summary of the cache"""
+        info = self.info()
+        return (f"{info['entries']:,} cached datasets, "
+                f"{info['file_bytes'] / (1024 * 1024):.1f} MB ({self.directory})")
+
+    def clear(self):
+        """Delete all cached datasets"""
+        for path in self._entries():
+            os.remove(path)
+
+
+def main():
+    """Show the size of, or clear, the on-disk dataset cache"""
+    parser = argparse.ArgumentParser(description="Manage the on-disk cache of loaded datasets.")
+    parser.add_argument("command", choices=["size", "clear"], help="'size' to show the cache size, 'clear' to empty it")
+    parser.add_argument("--path", default="dataset_cache", help="Cache directory (default: dataset_cache)")
+    args = parser.parse_args()
+
+    cache = DatasetCache(args.path)
+    if args.command == "clear":
+        cache.clear()
+        print(f"Cleared dataset cache: {args.path}")
+    else:
+        print(cache.describe())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
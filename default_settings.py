@@ -19,5 +19,17 @@ class DefaultSettings:
                 "PO BOX", "P.O. BOX", "POBOX", "P.O.BOX"
             ],
             "number_patterns": [r'\d+$', r'#\d+', r'\d+[A-Z]?$'],
-            "case_sensitive": False
+            "case_sensitive": False,
+            "parallel_workers": 0,
+            "parallel_chunk_size": 100000,
+            "parallel_min_rows": 200000,
+            "cache_max_entries": 1000000,
+            "cache_file": "address_cache.sqlite",
+            "dataset_cache_dir": "dataset_cache",
+            "header_scan_rows": 10,
+            "scan_raw_headers": False,
+            "optimize_dtypes": True,
+            "address_match_threshold": 0.85,
+            "client_match_threshold": 0.8,
+            "client_match_window": 10
         }
\ No newline at end of file
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Defines the duplicate-client detection of the Data Joiner application. The same
+person often appears in several datasets under slightly different spellings
+("Jon Smyth" at "12 Oak Street", "John Smith" at "12 Oak St"). Records are only
+compared within blocks that share a key: the normalized address with the initials
+of the name, or a Soundex key of the name with the house number. Within a block, each
+record is compared with its nearest neighbours in name order, so the number of
+comparisons grows with the number of records rather than with its square. Records
+whose names and addresses are both alike enough are linked, and linked records
+(directly or through others) share a cluster ID.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from address_matching import address_parts, normalize_addresses, similarity_scores
+
+
+# The column holding each row's cluster ID
+CLUSTER_COLUMN = "Client_Cluster"
+
+# Soundex digits for each consonant; vowels, H, W and Y have none
+SOUNDEX_DIGITS = {
+    **dict.fromkeys("BFPV", "1"), **dict.fromkeys("CGJKQSXZ", "2"), **dict.fromkeys("DT", "3"),
+    "L": "4", **dict.fromkeys("MN", "5"), "R": "6",
+}
+
+# Anything but letters and spaces is dropped from names
+NAME_PUNCTUATION_REGEX = re.compile(r"[^A-Z ]+")
+
+
+def soundex(word):
+    """Return the American Soundex code of a word ('ROBERT' -> 'R163'), or '' for no letters"""
+    letters = [char for char in word.upper() if "A" <= char <= "Z"]
+    if not letters:
+        return ""
+    code = letters[0]
+    last = SOUNDEX_DIGITS.get(letters[0], "")
+    for char in letters[1:]:
+        digit = SOUNDEX_DIGITS.get(char, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if char not in "HW":
+            # A vowel separates two equal digits; H and W do not
+            last = digit
+    return code.ljust(4, "0")
+
+
+def normalize_names(names):
+    """
+    Return names (a Series) as upper-case words in alphabetical order, without
+    punctuation or single letters, so "Smith, John A." and "John Smith" are equal.
+    Missing or empty names become missing.
+    """
+    text = names.astype(str).where(names.notna()).str.upper()
+    text = text.str.replace(NAME_PUNCTUATION_REGEX, " ", regex=True)
+    words = text.str.split().map(lambda parts: " ".join(sorted(w for w in parts if len(w) > 1))
+                                 if isinstance(parts, list) else parts)
+    return words.where(words != "")
+
+
+def phonetic_keys(names):
+    """Return the Soundex codes of the words of normalized names, in order ('JOHN SMITH' -> 'J500 S530')"""
+    # Each distinct word is coded once
+    codes = {word: soundex(word) for word in names.str.split().explode().dropna().unique()}
+    return names.map(lambda name: " ".join(codes[word] for word in name.split()), na_action="ignore")
+
+
+def _find(parents, i):
+    while parents[i] != i:
+        parents[i] = parents[parents[i]]     # path halving
+        i = parents[i]
+    return i
+
+
+def cluster_pairs(count, first, second):
+    """Return a root record for each of count records, linking each pair (first[k], second[k]) (union-find)"""
+    parents = list(range(count))
+    for a, b in zip(first.tolist(), second.tolist()):
+        root_a, root_b = _find(parents, a), _find(parents, b)
+        if root_a != root_b:
+            # The smaller record number becomes the root, so roots do not depend on the pair order
+            parents[max(root_a, root_b)] = min(root_a, root_b)
+    return np.array([_find(parents, i) for i in range(count)], dtype=np.int64)
+
+
+def candidate_pairs(block_keys, sort_keys, window):
+    """
+    Return (first, second) record numbers of every pair with the same block key that
+    are at most window - 1 apart once sorted by block key and sort key. Blocks of up to
+    window records are compared in full; larger blocks by sorted neighbourhood.
+    Records with a missing block key are left out.
+    """
+    valid = np.flatnonzero(block_keys.notna().to_numpy())
+    blocks = pd.factorize(block_keys.iloc[valid])[0]
+    sort_codes = pd.factorize(sort_keys.iloc[valid], sort=True)[0]
+    order = np.lexsort((sort_codes, blocks))
+    records, blocks = valid[order], blocks[order]
+    first, second = [], []
+    for distance in range(1, window):
+        same = np.flatnonzero(blocks[:-distance] == blocks[distance:])
+        first.append(records[same])
+        second.append(records[same + distance])
+    return np.concatenate(first or [[]]).astype(np.int64), np.concatenate(second or [[]]).astype(np.int64)
+
+
+class ClusterResult:
+    """The table with its cluster ID column, and how many records were compared and linked."""
+
+    def __init__(self, data, pairs_compared, pairs_linked, rows_clustered, clusters_merged):
+        self.data = data
+        self.pairs_compared = pairs_compared
+        self.pairs_linked = pairs_linked
+        self.rows_clustered = rows_clustered      # rows whose cluster has more than one spelling
+        self.clusters_merged = clusters_merged    # clusters of more than one spelling
+
+    def describe(self):
+        """Return e.g. 'Found 120 clients spelled more than one way (410 rows); 9,000 pairs compared'"""
+        return (f"Found {self.clusters_merged:,} clients spelled more than one way ({self.rows_clustered:,} rows); "
+                f"{self.pairs_compared:,} pairs compared, {self.pairs_linked:,} linked")
+
+
+def find_duplicate_clients(df, name_columns, address_column, threshold=0.8, window=10, progress=None):
+    """
+    Return a ClusterResult whose data is df with a CLUSTER_COLUMN (numbered from 1 in
+    order of first appearance). Two records are linked when their names and their
+    addresses are each at least threshold (0-1) alike; name_columns are read as one name
+    in any word order. Rows without a name each get their own cluster.
+    Raises ValueError for a column df does not have or a threshold outside 0-1.
+    """
+    name_columns = [name_columns] if isinstance(name_columns, str) else list(name_columns)
+    missing = [col for col in name_columns + [address_column] if col not in df.columns]
+    if missing or not name_columns:
+        raise ValueError(f"Column(s) not found: {', '.join(missing) or 'no name column given'}")
+    if not 0 < threshold <= 1:
+        raise ValueError(f"The match threshold must be above 0 and at most 1, not {threshold}")
+
+    # Rows with the same name and address text are normalized once
+    raw = df[name_columns + [address_column]]
+    raw_codes = raw.groupby(name_columns + [address_column], dropna=False, sort=False).ngroup().to_numpy()
+    distinct_raw = raw[~raw.duplicated()]
+    full_names = distinct_raw[name_columns[0]].astype(str).where(distinct_raw[name_columns[0]].notna(), "")
+    for col in name_columns[1:]:
+        full_names = full_names + " " + distinct_raw[col].astype(str).where(distinct_raw[col].notna(), "")
+    raw_names = normalize_names(full_names)
+    raw_addresses = normalize_addresses(distinct_raw[address_column]).fillna("")
+
+    # Each distinct normalized name and address is one record
+    raw_records, distinct = pd.factorize(pd.MultiIndex.from_arrays([raw_names.fillna(""), raw_addresses]))
+    codes = raw_records[raw_codes]
+    names = raw_names.to_numpy(dtype=object)[raw_codes]
+    record_names = pd.Series(distinct.get_level_values(0)).replace("", np.nan)
+    record_addresses = pd.Series(distinct.get_level_values(1))
+    if progress is not None:
+        progress(0, 3)
+
+    # Blocks: the same address and name initials, or the same sounding name and house number
+    phonetic = phonetic_keys(record_names)
+    initials = phonetic.str.replace(r"(\w)\d+", r"\1", regex=True)
+    houses = address_parts(record_addresses.replace("", np.nan))["House"]
+    passes = [(record_addresses.replace("", np.nan) + "|" + initials), (phonetic + "|" + houses)]
+    first, second = [], []
+    for block_keys in passes:
+        a, b = candidate_pairs(block_keys, record_names, window)
+        first.append(a)
+        second.append(b)
+    first, second = np.concatenate(first), np.concatenate(second)
+    pair_codes = np.unique(np.minimum(first, second) * len(distinct) + np.maximum(first, second))
+    first, second = pair_codes // max(len(distinct), 1), pair_codes % max(len(distinct), 1)
+    if progress is not None:
+        progress(1, 3)
+
+    name_text = record_names.fillna("").to_numpy(dtype=object)
+    address_text = record_addresses.to_numpy(dtype=object)
+    name_scores = similarity_scores(name_text[first], name_text[second], threshold)
+    linked = name_scores >= threshold
+    address_scores = similarity_scores(address_text[first[linked]], address_text[second[linked]], threshold)
+    linked[linked] = address_scores >= threshold
+    if progress is not None:
+        progress(2, 3)
+
+    roots = cluster_pairs(len(distinct), first[linked], second[linked])
+    row_roots = roots[codes]
+    # Rows without a name are never linked: each gets a cluster of its own
+    unnamed = pd.isna(names)
+    row_roots[unnamed] = len(distinct) + np.flatnonzero(unnamed)
+    clusters = pd.factorize(row_roots)[0] + 1
+
+    spellings = pd.Series(np.arange(len(distinct))).groupby(roots).size()
+    merged_roots = spellings.index[spellings.to_numpy() > 1]
+    in_merged = np.isin(row_roots, merged_roots)
+    data = df.assign(**{CLUSTER_COLUMN: clusters})
+    if progress is not None:
+        progress(3, 3)
+    return ClusterResult(data, len(first), int(linked.sum()), int(in_merged.sum()), len(merged_roots))
@@ -0,0 +1,1465 @@
+#!/usr/bin/env python3
+"""
+Defines the GUI-free processing pipeline for the Data Joiner application.
+Each of the nine workflow steps is a plain function on DataFrames, so the same steps
+can be driven by the desktop app, by a batch job, or timed one stage at a time.
+"""
+
+import csv
+import gzip
+import importlib.util
+import os
+import sqlite3
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing, contextmanager
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from address_cleaner import AddressCleaner, AddressCleaningCache
+from address_matching import AddressMatcher
+from default_settings import DefaultSettings
+import entity_resolution
+from stage_store import StageSnapshotStore, stage_property
+from step_graph import fingerprint
+
+
+# Month names map to numbers for ordering. 'NA' becomes 0 (oldest).
+MONTH_NUMBERS = {
+    "January": 1, "February": 2, "March": 3, "April": 4, "May": 5, "June": 6,
+    "July": 7, "August": 8, "September": 9, "October": 10, "November": 11, "December": 12,
+    "NA": 0
+}
+
+
+# Rows at the top of a file checked for report titles and blank lines
+DUMMY_ROW_WINDOW = 10
+
+# Text that float() reads as NaN
+NAN_TEXT = {"nan", "+nan", "-nan"}
+
+# Calamine (pip install python-calamine) reads workbooks several times faster than openpyxl
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Parquet export needs pyarrow or fastparquet (pip install pyarrow); zstd CSV needs zstandard
+PARQUET_AVAILABLE = any(importlib.util.find_spec(name) for name in ("pyarrow", "fastparquet"))
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+
+
+# The categories of the cleaning flag columns
+YES_NO = ["No", "Yes"]
+
+# Text columns with at most this many distinct values per row are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.1
+CATEGORY_SAMPLE_ROWS = 10000
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline step cannot run with the given data or options."""
+
+
+class PipelineConfig:
+    """
+    Options for a full pipeline run.
+
+    datasets: list of dicts with 'path' and optional 'sheet', 'month', 'year', 'service'
+        and 'renames' ({old column name: new column name}).
+    additional_dataset: dict with 'path' and optional 'sheet' for the enrichment dataset.
+    dedup_column: a column name or a list of them (a composite key).
+    dedup_tie_breakers: columns or (column, order) pairs for rows of the same period
+        (see tie_break_ranks); "file order" follows the order of datasets.
+    match_addresses: join on addresses that are alike rather than equal (see
+        AddressJoinIndex), at least match_threshold alike (default: the
+        address_match_threshold setting).
+    client_name_columns: name columns; when given, rows that are the same client spelled
+        differently get the same Client_Cluster after cleaning (see resolve_clients).
+    """
+
+    def __init__(self, datasets, address_column, additional_dataset, summarize_column,
+                 cleaned_join_column, additional_join_column, dedup_column, settings=None,
+                 dedup_tie_breakers=(), match_addresses=False, match_threshold=None, client_name_columns=()):
+        self.datasets = datasets
+        self.address_column = address_column
+        self.additional_dataset = additional_dataset
+        self.summarize_column = summarize_column
+        self.cleaned_join_column = cleaned_join_column
+        self.additional_join_column = additional_join_column
+        self.dedup_column = dedup_column
+        self.dedup_tie_breakers = list(dedup_tie_breakers)
+        self.settings = settings if settings is not None else DefaultSettings.get_defaults()
+        self.match_addresses = match_addresses
+        if match_threshold is None:
+            match_threshold = self.settings.get("address_match_threshold",
+                                                DefaultSettings.get_defaults()["address_match_threshold"])
+        self.match_threshold = float(match_threshold)
+        self.client_name_columns = ([client_name_columns] if isinstance(client_name_columns, str)
+                                    else list(client_name_columns))
+
+
+class PipelineResult:
+    """
+    The output of every stage of a pipeline run, plus how long each stage took.
+    The main tables are kept in a StageSnapshotStore, so columns a step did not change
+    are shared with the stage before it.
+    """
+
+    combined_data = stage_property("combined")
+    cleaned_data = stage_property("cleaned", base="combined")
+    joined_additional_data = stage_property("joined", base="cleaned")
+    final_data = stage_property("final", base="joined")
+
+    def __init__(self):
+        self.stages = StageSnapshotStore()
+        self.datasets = OrderedDict()
+        self.dataset_info = {}
+        self.file_loads = []
+        self.additional_dataset = None
+        self.summarized_additional_data = None
+        self.clients = None
+        self.join = None
+        self.dedup = None
+        self.rows_written = 0
+        self.timings = OrderedDict()
+        self.reused = []
+
+    @property
+    def dropped_report(self):
+        """The rows dedup dropped for each key (DedupResult.dropped), or None before deduplication"""
+        return self.dedup.dropped if self.dedup is not None else None
+
+
+# --- Step 1: Load Data ---
+
+def open_excel(file_path):
+    """Open a workbook with the fastest reader installed (calamine if available, else pandas' default)"""
+    return pd.ExcelFile(file_path, engine=EXCEL_ENGINE)
+
+
+def get_sheet_names(file_path):
+    """Return the sheet names of an Excel file"""
+    if file_path.lower().endswith('.xlsx'):
+        # The names are listed in xl/workbook.xml, so there is no need to parse the workbook
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+            names = [sheet.get('name') for sheet in root.iter() if sheet.tag.endswith('}sheet')]
+            if names:
+                return names
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError):
+            pass
+
+    with open_excel(file_path) as excel_file:
+        return list(excel_file.sheet_names)
+
+
+def read_dataset(file_path, sheet_name=None, header_window=DUMMY_ROW_WINDOW, scan_raw=False):
+    """
+    Read a CSV or Excel file (first sheet unless one is given) and skip dummy rows.
+    header_window: how many leading rows may be report titles rather than data.
+    scan_raw: look at the raw rows before pandas picks a header, so a title banner above
+    the real header row is skipped and that row becomes the header.
+    """
+    if file_path.endswith(('.xlsx', '.xls')):
+        # One open workbook serves sheet discovery, the raw scan and reading
+        with open_excel(file_path) as excel_file:
+            if sheet_name is None:
+                sheet_name = excel_file.sheet_names[0]
+            if not scan_raw:
+                return detect_and_skip_dummy_rows(excel_file.parse(sheet_name), header_window)
+            raw = excel_file.parse(sheet_name, header=None, nrows=header_window + 1)
+            header_row, data_row = find_header_row(raw)
+            df = excel_file.parse(sheet_name, skiprows=header_row)
+    else:
+        if not scan_raw:
+            return detect_and_skip_dummy_rows(pd.read_csv(file_path), header_window)
+        header_row, data_row = find_header_row(read_raw_csv_rows(file_path, header_window + 1))
+        df = pd.read_csv(file_path, skiprows=header_row)
+
+    # Drop any blank or note rows between the header and the first data row
+    if data_row is not None:
+        df = df.iloc[data_row - header_row - 1:].reset_index(drop=True)
+    return df
+
+
+def load_options(settings):
+    """The read_dataset options chosen in the settings"""
+    return {
+        "header_window": int(settings.get("header_scan_rows", DUMMY_ROW_WINDOW)),
+        "scan_raw": bool(settings.get("scan_raw_headers", False)),
+    }
+
+
+def read_raw_csv_rows(file_path, rows):
+    """Read the first rows of a CSV file as raw cells, with empty cells as missing values"""
+    with open(file_path, newline='', encoding='utf-8') as f:
+        raw_rows = [row for _, row in zip(range(rows), csv.reader(f))]
+    return pd.DataFrame([[cell if cell.strip() else None for cell in row] for row in raw_rows])
+
+
+def dummy_row_mask(block, threshold=0.7):
+    """
+    Score a block of rows at once: True where more than `threshold` of a row's cells
+    are missing or not numbers. Text cells are parsed with pd.to_numeric, so the rare
+    spellings only float() accepts (such as '1_000') count as text.
+    """
+    # Work on one object array; per-column pandas operations cost more than the parsing
+    cells = block.to_numpy(dtype=object)
+    numeric = ~pd.isna(cells)
+
+    # Integer and float columns need no parsing; everything else is tested as str(value)
+    kinds = np.array([dtype.kind for dtype in block.dtypes])
+    text_cells = numeric & ~np.isin(kinds, ['i', 'u', 'f'])
+    if text_cells.any():
+        text = np.array([value if isinstance(value, str) else str(value) for value in cells[text_cells]],
+                        dtype=object)
+        parsed = pd.notna(pd.to_numeric(text, errors='coerce'))
+        # pd.to_numeric turns the text 'nan' into a missing value, but float() accepts it
+        parsed[~parsed] = [len(value) < 16 and value.strip().lower() in NAN_TEXT for value in text[~parsed]]
+        numeric[text_cells] = parsed
+
+    return (~numeric).sum(axis=1) / block.shape[1] > threshold
+
+
+def detect_and_skip_dummy_rows(df, window=DUMMY_ROW_WINDOW):
+    """Skip leading rows (within the first `window`) that look like report titles rather than data"""
+    if df.empty or not len(df.columns):
+        return df
+    # If more than 70% of a row's values are NaN or non-numeric, it is considered a dummy row
+    data_rows = np.flatnonzero(~dummy_row_mask(df.iloc[:window]))
+    if not len(data_rows):
+        return df
+    # Found the first data row, return data starting from here
+    return df.iloc[data_rows[0]:].reset_index(drop=True)
+
+
+def find_header_row(raw):
+    """
+    Find the header in raw rows read without a header. Returns (header_row, data_row):
+    the header is the last well-filled row above the first data row (title banners only
+    fill a cell or two). data_row is None when no row looks like data.
+    """
+    if raw.empty or not len(raw.columns):
+        return 0, None
+    filled = raw.notna().sum(axis=1).to_numpy()
+    if not filled.max():
+        return 0, None
+    well_filled = filled >= max(1, filled.max() / 2)
+    data_rows = np.flatnonzero(~dummy_row_mask(raw))
+
+    if len(data_rows) and data_rows[0] > 0:
+        data_row = int(data_rows[0])
+        candidates = np.flatnonzero(well_filled[:data_row])
+        return (int(candidates[-1]) if len(candidates) else data_row - 1), data_row
+    # No data rows (e.g. all-text data) or data on the very first row: use the first full row
+    return int(np.flatnonzero(well_filled)[0]), None
+
+
+class LoadResult:
+    """The outcome of loading one file: its data or the error, and how long it took."""
+
+    def __init__(self, file_path, sheet_name=None, data=None, error=None, seconds=0.0, cached=False):
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        self.data = data
+        self.error = error
+        self.seconds = seconds
+        self.cached = cached
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def load_file(file_path, sheet_name=None, cache=None, options=None):
+    """
+    Read one file into a LoadResult, recording the error instead of raising it.
+    With a DatasetCache, unchanged files are reloaded from it and new ones are added to it.
+    options: keyword arguments for read_dataset (see load_options).
+    """
+    start = time.perf_counter()
+    try:
+        if cache is not None:
+            df = cache.load(file_path, sheet_name, options)
+            if df is not None:
+                return LoadResult(file_path, sheet_name, data=df, seconds=time.perf_counter() - start, cached=True)
+
+        df = read_dataset(file_path, sheet_name, **(options or {}))
+        if cache is not None:
+            try:
+                cache.save(file_path, df, sheet_name, options)
+            except Exception as e:
+                print(f"Warning: Could not cache {os.path.basename(file_path)}: {e}")
+        return LoadResult(file_path, sheet_name, data=df, seconds=time.perf_counter() - start)
+    except Exception as e:
+        return LoadResult(file_path, sheet_name, error=str(e), seconds=time.perf_counter() - start)
+
+
+def load_files(files, workers=0, progress=None, cache=None, options=None):
+    """
+    Read several (file_path, sheet_name) pairs, each in its own worker process, and
+    return their LoadResults in the same order. Parsing is independent per file, so the
+    whole batch takes about as long as the slowest file.
+    workers: number of processes (0 means one per CPU). progress is called with (done, total) files.
+    cache: optional DatasetCache. Unchanged files are reloaded from it before any worker
+    process is started, and the others are added to it.
+    options: keyword arguments for read_dataset (see load_options).
+    """
+    files = list(files)
+    results = [None] * len(files)
+    done = 0
+
+    if cache is not None:
+        for i, (file_path, sheet_name) in enumerate(files):
+            start = time.perf_counter()
+            df = cache.load(file_path, sheet_name, options)
+            if df is not None:
+                results[i] = LoadResult(file_path, sheet_name, data=df, seconds=time.perf_counter() - start, cached=True)
+                done += 1
+                if progress is not None:
+                    progress(done, len(files))
+
+    pending = [i for i in range(len(files)) if results[i] is None]
+    workers = min(workers if workers > 0 else (os.cpu_count() or 1), len(pending))
+
+    if workers <= 1:
+        for i in pending:
+            results[i] = load_file(*files[i], cache=cache, options=options)
+            done += 1
+            if progress is not None:
+                progress(done, len(files))
+        return results
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(load_file, *files[i], cache=cache, options=options): i for i in pending}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # The worker itself failed (e.g. ran out of memory), not just the read
+                results[i] = LoadResult(*files[i], error=f"Worker process failed: {e}")
+            done += 1
+            if progress is not None:
+                progress(done, len(files))
+    finally:
+        # Files not started yet are dropped straight away if a progress report cancelled the load
+        pool.shutdown(cancel_futures=True)
+    return results
+
+
+def unique_dataset_name(file_path, existing_names):
+    """Build a dataset name from the file name that does not clash with existing ones"""
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    counter = 1
+    dataset_name = base_name
+    while dataset_name in existing_names:
+        dataset_name = f"{base_name}_{counter}"
+        counter += 1
+    return dataset_name
+
+
+# --- Step 2: Review & Rename ---
+
+def rename_columns(df, renames):
+    """Return a copy of df with columns renamed using {old name: new name}"""
+    missing = [old_name for old_name in renames if old_name not in df.columns]
+    if missing:
+        raise PipelineError(f"Cannot rename missing column(s): {', '.join(map(str, missing))}")
+    return df.rename(columns=renames)
+
+
+# --- Step 3: Join & Preview ---
+
+def combine_datasets(datasets, dataset_info, progress=None):
+    """
+    Stack the datasets into one table and add Month, Year, Service and Dataset_Name columns.
+    Columns missing from a dataset are filled with "", and Month, Service and Dataset_Name
+    are categorical. progress, if given, is called with (done, total) columns.
+    """
+    # Establish a stable and predictable column order.
+    # Start with the columns from the first loaded dataset, then append new ones.
+    if not datasets:
+        raise PipelineError("No datasets to combine.")
+
+    # Get columns from the first dataset in order
+    first_dataset_name = next(iter(datasets))
+    ordered_columns = list(datasets[first_dataset_name].columns)
+
+    # Discover new columns from other datasets
+    all_columns_set = set(ordered_columns)
+    for name, df in datasets.items():
+        for col in df.columns:
+            if col not in all_columns_set:
+                ordered_columns.append(col)
+                all_columns_set.add(col)
+
+    infos = []
+    for name in datasets:
+        # If dataset_info missing, supply default metadata but record a warning
+        if name not in dataset_info:
+            print(f"Warning: No info found for dataset '{name}', using default metadata")
+            infos.append({'month': 'Unknown', 'year': 0, 'service': 'Unknown'})
+        else:
+            infos.append(dataset_info[name])
+
+    # Each column is stacked straight from the source datasets into one new array, so the
+    # datasets are never copied or reindexed as whole tables first
+    lengths = [len(df) for df in datasets.values()]
+    columns = {}
+    for i, col in enumerate(ordered_columns):
+        parts = [df[col] if col in df.columns else pd.Series("", index=range(len(df)))
+                 for df in datasets.values()]
+        columns[col] = _without_nan_text(pd.concat(parts, ignore_index=True))
+        if progress is not None:
+            progress(i + 1, len(ordered_columns) + 1)
+
+    # The metadata is constant within each dataset, so it is stored once per dataset as a
+    # category (or repeated number) instead of one string per row
+    columns['Month'] = _repeat_category([str(info.get('month', 'Unknown')) for info in infos], lengths)
+    # Years are combined one value per dataset first, so mixed types resolve as in pd.concat
+    years = pd.concat([pd.Series([info.get('year', 0)]) for info in infos], ignore_index=True)
+    columns['Year'] = pd.Series(np.repeat(years.to_numpy(), lengths), dtype=years.dtype)
+    columns['Service'] = _repeat_category([str(info.get('service', 'Unknown')) for info in infos], lengths)
+    columns['Dataset_Name'] = _repeat_category([str(name) for name in datasets], lengths)
+
+    combined = pd.DataFrame(columns, copy=False)
+    if progress is not None:
+        progress(len(ordered_columns) + 1, len(ordered_columns) + 1)
+    return combined
+
+
+def _repeat_category(values, lengths):
+    """A categorical column holding values[i] for lengths[i] rows"""
+    # Sorted categories keep sorting by the column alphabetical, as it is for text
+    categories = sorted(set(values))
+    codes = np.repeat(np.array([categories.index(value) for value in values], dtype=np.int32), lengths)
+    return pd.Series(pd.Categorical.from_codes(codes, categories))
+
+
+def _without_nan_text(column):
+    """Replace the text 'nan' in an object column with a missing value (other columns are returned as they are)"""
+    if column.dtype != 'object':
+        return column
+    is_nan_text = column.to_numpy() == 'nan'
+    return column.mask(is_nan_text, pd.NA) if is_nan_text.any() else column
+
+
+# --- Step 4: Address Cleaning ---
+
+def clean_address_data(df, address_column, cleaner, progress=None):
+    """
+    Return a copy of df with the cleaned address columns added:
+    new_<col>, <col>_auto_cleaned and <col>_may_have_word.
+    progress, if given, is passed on to AddressCleaner.clean.
+    """
+    if address_column not in df.columns:
+        raise PipelineError(f"Column '{address_column}' not found in the joined data!")
+
+    return df.assign(**cleaned_address_columns(df[address_column], cleaner, progress))
+
+
+def cleaned_address_columns(addresses, cleaner, progress=None):
+    """Clean a Series of addresses and return the three new columns, by name, on the same index"""
+    address_column = addresses.name
+    cleaned_addresses, auto_cleaned_flags, may_have_word_flags = cleaner.clean(addresses, progress)
+
+    # Verify the lengths match
+    if not (len(cleaned_addresses) == len(addresses) and len(auto_cleaned_flags) == len(addresses)
+            and len(may_have_word_flags) == len(addresses)):
+        raise PipelineError("Mismatch in processed data lengths after cleaning.")
+
+    # Ensure the index of the new Series matches the DataFrame's index to prevent misalignment.
+    cleaned_addresses.index = addresses.index
+    auto_cleaned_flags.index = addresses.index
+    may_have_word_flags.index = addresses.index
+    return {
+        f"new_{address_column}": cleaned_addresses,
+        f"{address_column}_auto_cleaned": yes_no_category(auto_cleaned_flags),
+        f"{address_column}_may_have_word": yes_no_category(may_have_word_flags),
+    }
+
+
+def clean_address_partitions(df, address_column, cleaner, graph, progress=None):
+    """
+    Like clean_address_data, but the cleaned columns of each dataset (each run of
+    Dataset_Name) are kept in the StepGraph under a fingerprint of its addresses and the
+    cleaning rules. Datasets whose addresses have not changed since the last run are
+    not cleaned again; the others are cleaned together, so an address repeated across
+    them is cleaned once. progress, if given, is called with (done, total) rows.
+    """
+    if address_column not in df.columns:
+        raise PipelineError(f"Column '{address_column}' not found in the joined data!")
+
+    addresses = df[address_column].reset_index(drop=True)
+    names = None
+    bounds = [0, len(df)]
+    if 'Dataset_Name' in df.columns and len(df):
+        codes = pd.factorize(df['Dataset_Name'])[0]
+        names = df['Dataset_Name'].to_numpy()
+        bounds = [0] + (np.flatnonzero(codes[1:] != codes[:-1]) + 1).tolist() + [len(df)]
+
+    # Each distinct address is hashed once; a dataset's fingerprint is taken over its rows' hashes
+    address_codes, uniques = pd.factorize(addresses)
+    distinct_hashes = pd.util.hash_pandas_object(pd.Series(uniques, dtype=addresses.dtype), index=False).to_numpy()
+    missing_hash = pd.util.hash_pandas_object(pd.Series([None], dtype=addresses.dtype), index=False).to_numpy()
+    row_hashes = np.concatenate([distinct_hashes, missing_hash])[address_codes]
+
+    parts = []
+    stale = []
+    seen = {}
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        name = str(names[start]) if names is not None else ''
+        # A dataset split into several runs gets one step per run
+        seen[name] = seen.get(name, 0) + 1
+        step_name = f"clean:{name}" if seen[name] == 1 else f"clean:{name}#{seen[name]}"
+        part_fingerprint = fingerprint(pd.Series(row_hashes[start:stop], name=address_column), cleaner.fingerprint)
+        found, part = graph.lookup(step_name, part_fingerprint)
+        parts.append(part)
+        if not found:
+            stale.append((len(parts) - 1, step_name, part_fingerprint, start, stop))
+
+    if stale:
+        # The same clients appear in most datasets, and the cleaner handles each distinct address once
+        stale_rows = sum(stop - start for *_, start, stop in stale)
+        reused_rows = len(df) - stale_rows
+        stale_progress = None
+        if progress is not None:
+            # The cleaner reports distinct addresses; scale that to the stale datasets' rows
+            stale_progress = lambda done, total: progress(reused_rows + stale_rows * done // max(total, 1), len(df))
+        if reused_rows:
+            positions = np.concatenate([np.arange(start, stop) for *_, start, stop in stale])
+            columns = cleaned_address_columns(addresses.iloc[positions].reset_index(drop=True), cleaner, stale_progress)
+        else:
+            columns = cleaned_address_columns(addresses, cleaner, stale_progress)
+        offset = 0
+        for i, step_name, part_fingerprint, start, stop in stale:
+            part = {col: values.iloc[offset:offset + stop - start].reset_index(drop=True) for col, values in columns.items()}
+            parts[i] = graph.store(step_name, part_fingerprint, part)
+            offset += stop - start
+    if progress is not None:
+        progress(len(df), len(df))
+
+    if len(stale) == len(parts):
+        # Every dataset was cleaned in the one call, whose columns are already in row order
+        return df.assign(**{col: values.set_axis(df.index) for col, values in columns.items()})
+    return df.assign(**{col: pd.concat([part[col] for part in parts], ignore_index=True).set_axis(df.index)
+                        for col in parts[0]})
+
+
+def yes_no_category(flags):
+    """Store a column of Yes/No text as a categorical (one byte per row) that still exports as Yes/No"""
+    codes = (flags.to_numpy(dtype=object) == "Yes").astype(np.int8)
+    return pd.Series(pd.Categorical.from_codes(codes, YES_NO), index=flags.index)
+
+
+def optimize_dtypes(df, exclude=(), max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    Return df with its low-cardinality text columns stored as categoricals, so each row
+    holds a small code instead of a reference to a string. A text column is converted
+    when it has at most max_unique_ratio distinct values per row. Columns in exclude are
+    left as they are. The categories are sorted, so sorting by a column does not change.
+    """
+    converted = {}
+    for col in df.columns:
+        column = df[col]
+        if col in exclude or isinstance(column.dtype, pd.CategoricalDtype):
+            continue
+        if not (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)):
+            continue
+        limit = max(1, int(len(column) * max_unique_ratio))
+        # The first rows rule out most high-cardinality columns without hashing every row
+        if column.iloc[:CATEGORY_SAMPLE_ROWS].nunique() > limit:
+            continue
+        if pd.api.types.infer_dtype(column, skipna=True) != "string":
+            continue
+        codes, categories = pd.factorize(column)
+        if len(categories) > limit:
+            continue
+        # Sort only the categories that are kept, then renumber the codes to match
+        order = np.argsort(categories.to_numpy(dtype=object))
+        ranks = np.empty(len(order) + 1, dtype=codes.dtype)
+        ranks[order] = np.arange(len(order))
+        ranks[-1] = -1
+        converted[col] = pd.Categorical.from_codes(ranks[codes], categories[order])
+    return df.assign(**converted) if converted else df
+
+
+# --- After Step 4: Duplicate Clients ---
+
+def resolve_clients(df, name_columns, address_column, threshold=0.8, window=10, progress=None):
+    """
+    Link rows that are the same client spelled differently (see entity_resolution) and
+    return a ClusterResult whose data has a Client_Cluster column to deduplicate on.
+    address_column is normally the cleaned address column, new_<col>.
+    """
+    try:
+        return entity_resolution.find_duplicate_clients(df, name_columns, address_column, threshold, window, progress)
+    except ValueError as e:
+        raise PipelineError(str(e))
+
+
+# --- Steps 5 and 6: Additional Dataset and Summarize Data ---
+
+def summarize_additional_data(df, summarize_column):
+    """Count the occurrences of each value in summarize_column"""
+    if summarize_column not in df.columns:
+        raise PipelineError(f"Column '{summarize_column}' not found in the additional dataset!")
+
+    summary = df[summarize_column].value_counts().reset_index()
+    summary.columns = [summarize_column, 'Count']
+    return summary
+
+
+# --- Step 7: Left Join ---
+
+class JoinReport:
+    """How a left join matched: rows with and without a match, and keys that were unused or repeated."""
+
+    def __init__(self, rows, matched_rows, right_keys, unused_keys, duplicate_keys, key_kind, approximate_rows=0):
+        self.rows = rows
+        self.matched_rows = matched_rows
+        self.right_keys = right_keys
+        self.unused_keys = unused_keys
+        self.duplicate_keys = duplicate_keys    # right-hand keys equal to an earlier key once normalized
+        self.key_kind = key_kind                # how the keys were compared: "integer", "number", "text" or "address"
+        self.approximate_rows = approximate_rows    # matched rows whose keys were similar rather than equal
+
+    @property
+    def missed_rows(self):
+        return self.rows - self.matched_rows
+
+    def describe(self):
+        """Return e.g. 'Matched 9,000 of 10,000 rows (1,000 without a match); 12 of 500 keys unused'"""
+        text = f"Matched {self.matched_rows:,} of {self.rows:,} rows ({self.missed_rows:,} without a match"
+        if self.approximate_rows:
+            text += f", {self.approximate_rows:,} approximately"
+        text += f"); {self.unused_keys:,} of {self.right_keys:,} keys unused"
+        if self.duplicate_keys:
+            text += f"; {self.duplicate_keys:,} duplicate keys (the first of each was used)"
+        return text + f"; keys compared as {self.key_kind}"
+
+
+class JoinResult:
+    """The joined table and its JoinReport."""
+
+    def __init__(self, data, report):
+        self.data = data
+        self.report = report
+
+
+def join_key_text(keys):
+    """
+    Return join keys as text (missing keys stay missing). Whole-number floats, such as
+    IDs read from a column with blanks, are written without '.0' so 12.0 matches '12'.
+    """
+    if isinstance(keys.dtype, pd.StringDtype):
+        return keys
+    if pd.api.types.is_float_dtype(keys.dtype) and (keys.dropna() % 1 == 0).all():
+        keys = keys.astype("Int64")
+    elif keys.dtype == object:
+        values = keys.to_numpy()
+        whole = np.fromiter((isinstance(value, float) and value.is_integer() for value in values),
+                            dtype=bool, count=len(values))
+        if whole.any():
+            keys = keys.where(~whole, pd.Series([int(value) if is_whole else value
+                                                 for value, is_whole in zip(values, whole)], index=keys.index))
+    return keys.astype(str)
+
+
+def _is_number_keys(keys):
+    return pd.api.types.is_numeric_dtype(keys.dtype) and not pd.api.types.is_bool_dtype(keys.dtype)
+
+
+class JoinIndex:
+    """
+    A hash index on the key column of the summarized additional data. It is built once
+    and reused by every left join onto that data, so a re-join after the cleaned data
+    changed only hashes the left-hand keys. Keys are compared as numbers when both sides
+    hold numbers and as text otherwise, so int IDs on one side match the same IDs read
+    as text on the other instead of failing or silently missing.
+    """
+
+    def __init__(self, summarized_data, column):
+        if column not in summarized_data.columns:
+            raise PipelineError(f"Column '{column}' not found in the summarized data!")
+        self.summarized_data = summarized_data
+        self.column = column
+        self._indexes = {}      # key kind -> (index of unique keys, their rows, duplicate key count)
+
+    def matches(self, summarized_data, column):
+        """Whether this index was built on this table and column"""
+        return summarized_data is self.summarized_data and column == self.column
+
+    def key_kind(self, left_keys):
+        """How keys are compared against left_keys: "integer", "number" or "text" """
+        right_keys = self.summarized_data[self.column]
+        if _is_number_keys(left_keys) and _is_number_keys(right_keys):
+            if (pd.api.types.is_integer_dtype(left_keys.dtype) and pd.api.types.is_integer_dtype(right_keys.dtype)
+                    and not left_keys.hasnans and not right_keys.hasnans):
+                return "integer"
+            return "number"
+        return "text"
+
+    @staticmethod
+    def normalize(keys, kind):
+        """Return keys in the form compared for kind"""
+        if kind == "integer":
+            return keys.to_numpy(dtype=np.int64)
+        if kind == "number":
+            return keys.to_numpy(dtype='float64', na_value=np.nan)
+        return join_key_text(keys)
+
+    def _index(self, kind):
+        if kind not in self._indexes:
+            index = pd.Index(self.normalize(self.summarized_data[self.column], kind))
+            first = ~index.duplicated()
+            self._indexes[kind] = (index[first], np.flatnonzero(first), int((~first).sum()))
+        return self._indexes[kind]
+
+    def join(self, left, left_column, progress=None):
+        """
+        Left join the summarized data onto left by left_column and return a JoinResult.
+        The table is the same as DataFrame.merge(how='left', suffixes=('', '_additional'))
+        gives when the keys have the same dtype and are unique. Summary keys that are equal
+        once normalized (such as "12" and 12.0) are joined by the first of their rows only,
+        where merge would repeat the left row for each, and are counted in
+        JoinReport.duplicate_keys.
+        """
+        if left_column not in left.columns:
+            raise PipelineError(f"Column '{left_column}' not found in the cleaned data!")
+        if progress is not None:
+            progress(0, len(left))
+
+        left_keys = left[left_column]
+        kind = self.key_kind(left_keys)
+        index, rows, duplicate_keys = self._index(kind)
+        matches = index.get_indexer(self.normalize(left_keys, kind))
+        positions = np.where(matches >= 0, rows[np.maximum(matches, 0)] if len(rows) else -1, -1)
+
+        joined = _take_joined(left, left_column, self.summarized_data, self.column, positions,
+                              keep_key=self.column != left_column)
+        report = _join_report(positions, len(self.summarized_data), len(index), duplicate_keys, kind)
+        if progress is not None:
+            progress(len(left), len(left))
+        return JoinResult(joined, report)
+
+
+class AddressJoinIndex:
+    """
+    Joins on addresses that are alike rather than equal, through an AddressMatcher on the
+    summarized address column: "123 North Main Street" finds "123 N Main St", and a
+    misspelled street name finds the closest address at the same house number if it is
+    at least threshold (0-1) alike. The joined table gains a 'Match_Score' column (1 for
+    addresses equal once abbreviated, blank for no match) and keeps the matched
+    summarized address. Has the same interface as JoinIndex.
+    """
+
+    def __init__(self, summarized_data, column, threshold=0.85):
+        if column not in summarized_data.columns:
+            raise PipelineError(f"Column '{column}' not found in the summarized data!")
+        try:
+            self.matcher = AddressMatcher(summarized_data[column], threshold)
+        except ValueError as e:
+            raise PipelineError(str(e))
+        self.summarized_data = summarized_data
+        self.column = column
+        self.threshold = threshold
+
+    def matches(self, summarized_data, column, threshold=None):
+        """Whether this index was built on this table and column (and threshold, if given)"""
+        return (summarized_data is self.summarized_data and column == self.column
+                and (threshold is None or threshold == self.threshold))
+
+    def join(self, left, left_column, progress=None):
+        """Left join the summarized data onto left by the addresses in left_column and return a JoinResult"""
+        if left_column not in left.columns:
+            raise PipelineError(f"Column '{left_column}' not found in the cleaned data!")
+        if progress is not None:
+            progress(0, len(left))
+        positions, scores = self.matcher.match(left[left_column], progress)
+
+        joined = _take_joined(left, left_column, self.summarized_data, self.column, positions, keep_key=True)
+        joined["Match_Score"] = scores.round(3)
+        report = _join_report(positions, len(self.summarized_data), len(self.matcher.index),
+                              self.matcher.duplicate_addresses, "address",
+                              approximate_rows=int((scores < 1).sum()))
+        if progress is not None:
+            progress(len(left), len(left))
+        return JoinResult(joined, report)
+
+
+def _take_joined(left, left_column, right, right_column, positions, keep_key):
+    """
+    Return left with the columns of right taken at positions (-1 for no match) added.
+    Right-hand names already in left get the '_additional' suffix; the right key column
+    is left out unless keep_key is set.
+    """
+    # The left columns are kept as they are; the right-hand columns are taken at the matched rows
+    left = left.reset_index(drop=True)
+    columns = {col: left[col] for col in left.columns}
+    for col in right.columns:
+        if col == right_column and not keep_key:
+            continue    # One key column, holding the left-hand keys, as in a merge
+        name = f"{col}_additional" if col in left.columns else col
+        # take accepts extension arrays and numpy arrays, not the numpy-backed .array of a plain column
+        source = right[col].array if isinstance(right[col].dtype, pd.api.extensions.ExtensionDtype) else right[col].to_numpy()
+        values = pd.api.extensions.take(source, positions, allow_fill=True)
+        columns[name] = pd.Series(values, index=left.index, name=name)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _join_report(positions, right_rows, right_keys, duplicate_keys, kind, approximate_rows=0):
+    matched = positions >= 0
+    used = np.zeros(right_rows, dtype=bool)
+    used[positions[matched]] = True
+    return JoinReport(len(positions), int(matched.sum()), right_keys, int(right_keys - used.sum()),
+                      duplicate_keys, kind, approximate_rows)
+
+
+def build_join_index(summarized_data, column, match_addresses=False, threshold=0.85):
+    """Return the index a left join onto summarized_data uses: an AddressJoinIndex or a JoinIndex"""
+    if match_addresses:
+        return AddressJoinIndex(summarized_data, column, threshold)
+    return JoinIndex(summarized_data, column)
+
+
+def join_additional_dataset(cleaned_data, summarized_data, cleaned_column, additional_column, progress=None):
+    """Left join the summarized additional data onto the cleaned data (see JoinIndex.join)"""
+    if cleaned_column not in cleaned_data.columns:
+        raise PipelineError(f"Column '{cleaned_column}' not found in the cleaned data!")
+    return JoinIndex(summarized_data, additional_column).join(cleaned_data, cleaned_column, progress).data
+
+
+# --- Step 8: Deduplicate by Date ---
+
+# Tie-break orders other than a list of values (best first)
+TIE_BREAK_ORDERS = ("ascending", "descending", "file order")
+
+
+class DedupResult:
+    """The rows kept by a deduplication, and how many rows were dropped for each key."""
+
+    def __init__(self, data, dropped):
+        self.data = data
+        self.dropped = dropped      # the key columns of each key that lost rows, with Rows_Dropped
+
+    @property
+    def rows_dropped(self):
+        return int(self.dropped['Rows_Dropped'].sum())
+
+    def describe(self):
+        """Return e.g. 'Dropped 1,234 duplicate rows from 456 groups'"""
+        return f"Dropped {self.rows_dropped:,} duplicate rows from {len(self.dropped):,} groups"
+
+
+def period_keys(df):
+    """
+    Return Year * 16 + month number for each row as an int64 array, so the most recent
+    row has the largest key. Rows without a year rank below every year, as they sort last
+    in the original sort. A Year column that is not whole numbers (e.g. years typed as
+    text) is ranked by sorting it instead.
+    """
+    # Month may be categorical; astype gives the month numbers rather than category codes
+    months = df['Month'].map(MONTH_NUMBERS).astype('float64').fillna(0).to_numpy()
+    years = df['Year']
+    if pd.api.types.is_numeric_dtype(years.dtype) and not pd.api.types.is_bool_dtype(years.dtype):
+        values = years.to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(values)
+        known = values[~missing]
+        if np.isfinite(known).all() and (known == np.floor(known)).all():
+            values = np.where(missing, (known.min() if len(known) else 0) - 1, values).astype(np.int64)
+            return values * 16 + months.astype(np.int64)
+    return _ranked_period_keys(years, months)
+
+
+def _ranked_period_keys(years, months):
+    """Rank each row's (Year, month) by the original descending sort; equal pairs share a rank"""
+    if len(years) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = pd.DataFrame({'Year': years.to_numpy(), 'Month_Num': months}).sort_values(
+        ['Year', 'Month_Num'], ascending=False)
+    sorted_years = order['Year'].to_numpy(dtype=object)
+    sorted_months = order['Month_Num'].to_numpy()
+    same_year = (sorted_years[1:] == sorted_years[:-1]) | (pd.isna(sorted_years[1:]) & pd.isna(sorted_years[:-1]))
+    new_period = np.concatenate([[True], ~same_year | (sorted_months[1:] != sorted_months[:-1])])
+    keys = np.empty(len(order), dtype=np.int64)
+    keys[order.index.to_numpy()] = -np.cumsum(new_period)
+    return keys
+
+
+def group_keys(df, columns):
+    """
+    Return one int64 group number per row for the combination of columns (missing values
+    form a group of their own). Each column is hashed once and the codes are combined.
+    """
+    combined, groups = np.zeros(len(df), dtype=np.int64), 1
+    for col in columns:
+        codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+        if groups * len(uniques) >= 2 ** 62:
+            # Renumber before the combined codes could overflow
+            combined, uniques_so_far = pd.factorize(combined)
+            groups = len(uniques_so_far)
+        combined = combined * len(uniques) + codes
+        groups *= max(len(uniques), 1)
+    return pd.factorize(combined)[0] if len(columns) > 1 else combined
+
+
+def tie_break_ranks(values, order="ascending", file_order=()):
+    """
+    Rank the values of a tie-break column, 0 being the best. order is "ascending"
+    (smallest first), "descending", "file order" (the values listed in file_order, i.e.
+    the dataset names in the order the files were loaded) or a list of values, best first.
+    Values not in the list, and missing values, rank last.
+    """
+    if isinstance(order, str):
+        if order not in TIE_BREAK_ORDERS:
+            raise PipelineError(f"Unknown tie-break order '{order}'. Use {', '.join(TIE_BREAK_ORDERS)} or a list of values.")
+        if order == "file order":
+            order = list(file_order)
+        else:
+            try:
+                codes, uniques = pd.factorize(values, sort=True)
+            except TypeError:
+                raise PipelineError(f"Column '{values.name}' mixes values that cannot be put in order")
+            ranks = codes if order == "ascending" else len(uniques) - 1 - codes
+            return np.where(codes < 0, len(uniques), ranks).astype(np.int64)
+    if not (pd.api.types.is_string_dtype(values.dtype) or isinstance(values.dtype, pd.CategoricalDtype)):
+        # Priorities typed as text match numbers by their text
+        values, order = values.astype(str), [str(value) for value in order]
+    priority = pd.Index(list(dict.fromkeys(order)))
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Look up each category once; code -1 (missing) takes the last entry
+        codes = np.append(priority.get_indexer(values.cat.categories), -1)[values.cat.codes.to_numpy()]
+    else:
+        codes = priority.get_indexer(values)
+    return np.where(codes < 0, len(priority), codes).astype(np.int64)
+
+
+def parse_tie_breakers(text):
+    """
+    Parse tie-breaks typed as 'Service: Housing > Outreach, Dataset_Name: file order,
+    Visits: descending' into [(column, order), ...]. A column on its own is ascending.
+    """
+    tie_breakers = []
+    for item in (part.strip() for part in text.split(',')):
+        if not item:
+            continue
+        column, _, order = (part.strip() for part in item.partition(':'))
+        if not order or order.lower() in TIE_BREAK_ORDERS:
+            tie_breakers.append((column, order.lower() or "ascending"))
+        else:
+            tie_breakers.append((column, [value.strip() for value in order.split('>')]))
+    return tie_breakers
+
+
+def deduplicate_records(df, key_columns, tie_breakers=(), file_order=()):
+    """
+    Keep only the most recent row (by Year and Month) for each value of the key columns
+    (one column name or a list of them). Rows from the same period are told apart by
+    tie_breakers, a list of columns or (column, order) pairs (see tie_break_ranks), in
+    turn; rows still tied keep the earliest. The kept rows are ordered from most recent
+    to oldest, then by the tie-breaks and original order, as if the table were sorted
+    that way and then deduplicated. Returns a DedupResult.
+    """
+    key_columns = [key_columns] if isinstance(key_columns, str) else list(key_columns)
+    tie_breakers = [(item, "ascending") if isinstance(item, str) else tuple(item) for item in tie_breakers]
+    if 'Month' not in df.columns:
+        raise PipelineError("The 'Month' column is required for deduplication but was not found.")
+    if not key_columns:
+        raise PipelineError("Choose at least one column to deduplicate on.")
+    for col in key_columns + [col for col, _ in tie_breakers]:
+        if col not in df.columns:
+            raise PipelineError(f"Column '{col}' not found in the joined data!")
+
+    periods = period_keys(df)
+    keys = group_keys(df, key_columns)
+    tie_ranks = [tie_break_ranks(df[col], order, file_order) for col, order in tie_breakers]
+
+    # Each key's latest rows, narrowed by each tie-break in turn (larger scores are better)
+    scores = [periods] + [-ranks for ranks in tie_ranks]
+    candidates, candidate_keys = pd.RangeIndex(len(df)), keys
+    for score in scores[:-1]:
+        score = score[candidates]
+        best = pd.Series(score).groupby(candidate_keys, sort=False).transform('max').to_numpy()
+        candidates, candidate_keys = candidates[score == best], candidate_keys[score == best]
+    # The last pass picks the first row with the best score for each key
+    kept = pd.Series(scores[-1][candidates], index=candidates).groupby(
+        candidate_keys, sort=False).idxmax().to_numpy(dtype=np.int64)
+
+    # Only the kept rows are put in order, most recent first (np.lexsort sorts by its last key first)
+    kept = kept[np.lexsort([kept] + [ranks[kept] for ranks in reversed(tie_ranks)] + [-periods[kept]])]
+
+    rows_dropped = np.bincount(keys, minlength=1)[keys[kept]] - 1
+    dropped = df[key_columns].take(kept).assign(Rows_Dropped=rows_dropped)
+    dropped = dropped[rows_dropped > 0].sort_values('Rows_Dropped', ascending=False, kind='stable')
+    return DedupResult(df.take(kept), dropped.reset_index(drop=True))
+
+
+def deduplicate_by_date(df, group_by_col, tie_breakers=(), file_order=()):
+    """Keep only the most recent row for each value of group_by_col (see deduplicate_records)"""
+    return deduplicate_records(df, group_by_col, tie_breakers, file_order).data
+
+
+# --- Step 9: Export ---
+
+# Rows written per block when exporting, between progress reports
+EXPORT_CHUNK_ROWS = 50000
+
+# Rows in an Excel worksheet, including the header row
+EXCEL_MAX_ROWS = 1048576
+
+# Export formats by file extension (compressed CSV is listed before plain CSV)
+EXPORT_EXTENSIONS = [
+    (".csv.gz", "csv.gz"),
+    (".csv.zst", "csv.zst"),
+    (".csv", "csv"),
+    (".parquet", "parquet"),
+    (".sqlite", "sqlite"),
+    (".sqlite3", "sqlite"),
+    (".db", "sqlite"),
+    (".xlsx", "xlsx"),
+]
+
+# Table written to SQLite exports
+SQLITE_TABLE = "export"
+
+
+class ExportReport:
+    """What an export wrote: rows, seconds taken and the sheets (or files) the rows went to."""
+
+    def __init__(self, file_path, rows, seconds, parts):
+        self.file_path = file_path
+        self.rows = rows
+        self.seconds = seconds
+        self.parts = parts
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+    def describe(self):
+        """Return e.g. '1,200,000 rows in 40.0 s (30,000 rows/s), split into 2 sheets'"""
+        text = f"{self.rows:,} rows in {self.seconds:.1f} s ({self.rows_per_second:,.0f} rows/s)"
+        return text + (f", split into {len(self.parts)} sheets" if len(self.parts) > 1 else "")
+
+
+def _excel_rows(block):
+    """The rows of block as tuples of plain values, with None for missing values (empty cells)"""
+    columns = []
+    for col in block.columns:
+        values = block[col].to_numpy(dtype=object)
+        columns.append(np.where(pd.isna(values), None, values).tolist())
+    return zip(*columns)
+
+
+def write_excel(df, file_path, progress=None, max_rows=EXCEL_MAX_ROWS):
+    """
+    Write df to an .xlsx file with a write-only openpyxl workbook, which streams rows to
+    disk instead of holding a cell object for each of them. Rows past Excel's sheet limit
+    (max_rows, including the header) continue on Sheet2, Sheet3, ... with the header
+    repeated. Returns the sheet names. progress is called with (done, total) rows.
+    """
+    from openpyxl import Workbook
+
+    rows_per_sheet = max_rows - 1
+    sheet_starts = range(0, max(len(df), 1), rows_per_sheet)
+    workbook = Workbook(write_only=True)
+    header = [str(col) for col in df.columns]
+    sheet_names = []
+    done = 0
+    for sheet_start in sheet_starts:
+        sheet = workbook.create_sheet(f"Sheet{len(sheet_names) + 1}")
+        sheet_names.append(sheet.title)
+        sheet.append(header)
+        sheet_stop = min(sheet_start + rows_per_sheet, len(df))
+        for start in range(sheet_start, sheet_stop, EXPORT_CHUNK_ROWS):
+            block = df.iloc[start:min(start + EXPORT_CHUNK_ROWS, sheet_stop)]
+            for row in _excel_rows(block):
+                sheet.append(row)
+            done += len(block)
+            if progress is not None:
+                progress(done, len(df))
+    workbook.save(file_path)
+    return sheet_names
+
+
+def _write_csv(df, f, progress=None):
+    """Write df as CSV to an open text file, in blocks when progress is given"""
+    if progress is None:
+        df.to_csv(f, index=False)
+        return
+    # An empty frame still gets its header row
+    for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+        df.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(f, header=start == 0, index=False)
+        progress(min(start + EXPORT_CHUNK_ROWS, len(df)), len(df))
+
+
+def _open_csv_output(file_path, output_format):
+    if output_format == "csv.gz":
+        return gzip.open(file_path, 'wt', newline='', encoding='utf-8', compresslevel=6)
+    if output_format == "csv.zst":
+        if not ZSTD_AVAILABLE:
+            raise PipelineError("Exporting .csv.zst files needs the zstandard package (pip install zstandard)")
+        import zstandard
+        return zstandard.open(file_path, 'wt', newline='', encoding='utf-8')
+    return open(file_path, 'w', newline='', encoding='utf-8')
+
+
+def write_parquet(df, file_path):
+    """Write df to a Parquet file (categorical columns stay categorical)"""
+    if not PARQUET_AVAILABLE:
+        raise PipelineError("Exporting Parquet files needs pyarrow (pip install pyarrow)")
+    df.rename(columns=str).to_parquet(file_path, index=False)
+
+
+def _quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def write_sqlite(df, file_path, table=SQLITE_TABLE, index_columns=(), progress=None):
+    """
+    Write df to table `table` of a SQLite database, replacing a table of that name, and
+    index each of index_columns that df has (e.g. the join and dedup keys) so lookups
+    on them do not scan the table. progress is called with (done, total) rows.
+    The rows go to a new table that only replaces the old one once all are written, so
+    an error or a cancel part way leaves the database as it was.
+    """
+    partial = f"{table}_partial"
+    with closing(sqlite3.connect(file_path)) as connection:
+        connection.execute(f"DROP TABLE IF EXISTS {_quote_identifier(partial)}")
+        try:
+            # An empty frame still creates the table with its columns
+            for start in range(0, max(len(df), 1), EXPORT_CHUNK_ROWS):
+                block = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+                block.to_sql(partial, connection, if_exists='append', index=False)
+                if progress is not None:
+                    progress(start + len(block), len(df))
+        except BaseException:
+            connection.execute(f"DROP TABLE IF EXISTS {_quote_identifier(partial)}")
+            raise
+        with connection:
+            # One transaction, so the old table is only dropped if the new one takes its place
+            connection.execute("BEGIN")
+            connection.execute(f"DROP TABLE IF EXISTS {_quote_identifier(table)}")
+            connection.execute(f"ALTER TABLE {_quote_identifier(partial)} RENAME TO {_quote_identifier(table)}")
+            for col in dict.fromkeys(index_columns):
+                if col in df.columns:
+                    connection.execute(f"CREATE INDEX {_quote_identifier(f'{table}_{col}')} "
+                                       f"ON {_quote_identifier(table)} ({_quote_identifier(col)})")
+
+
+def export_format(file_path):
+    """Return the export format for a file name, from EXPORT_EXTENSIONS (Excel for anything else)"""
+    name = file_path.lower()
+    for extension, output_format in EXPORT_EXTENSIONS:
+        if name.endswith(extension):
+            return output_format
+    return "xlsx"
+
+
+def export_dataset(df, file_path, progress=None, index_columns=()):
+    """
+    Write df in the format given by the file extension (see EXPORT_EXTENSIONS) and
+    return an ExportReport. progress, if given, is called with (done, total) rows as
+    the file is written. index_columns are indexed in SQLite exports.
+    Files are written under a temporary name and only then replace file_path, so an
+    error or a cancel part way leaves no partial file and any existing file unchanged.
+    """
+    start_time = time.perf_counter()
+    output_format = export_format(file_path)
+    parts = [os.path.basename(file_path)]
+    if output_format == "sqlite":
+        # A database may hold other tables, so only the exported table is replaced
+        write_sqlite(df, file_path, index_columns=index_columns, progress=progress)
+        return ExportReport(file_path, len(df), time.perf_counter() - start_time, parts)
+
+    directory, name = os.path.split(os.path.abspath(file_path))
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.partial")
+    try:
+        if output_format.startswith("csv"):
+            with _open_csv_output(temp_path, output_format) as f:
+                _write_csv(df, f, progress)
+        elif output_format == "parquet":
+            write_parquet(df, temp_path)
+            if progress is not None:
+                progress(len(df), len(df))
+        else:
+            parts = write_excel(df, temp_path, progress)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return ExportReport(file_path, len(df), time.perf_counter() - start_time, parts)
+
+
+# --- Streaming large CSV files ---
+
+def iter_csv_chunks(file_handle, chunk_rows=100000, header_window=DUMMY_ROW_WINDOW):
+    """
+    Yield a CSV file in DataFrames of at most chunk_rows rows. Dummy rows are only looked
+    for at the top of the first chunk. Every column is read as text so the values (and
+    dtypes) do not change from one chunk to the next.
+    """
+    # The first chunk must hold every row the dummy-row check looks at
+    with pd.read_csv(file_handle, chunksize=max(chunk_rows, header_window), dtype=str) as reader:
+        for i, chunk in enumerate(reader):
+            yield detect_and_skip_dummy_rows(chunk, header_window) if i == 0 else chunk
+
+
+def text_join_keys(df, column):
+    """Return a copy of df with the join column as text, matching keys read from a CSV as text"""
+    keys = df[column]
+    if pd.api.types.is_float_dtype(keys) and (keys.dropna() % 1 == 0).all():
+        # Whole-number floats (e.g. IDs in a column with blanks) are written without '.0'
+        keys = keys.astype("Int64")
+    return df.assign(**{column: keys.astype("string")})
+
+
+# --- Full run ---
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Add how long the wrapped block takes to timings[stage]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def run_pipeline(config, cleaner=None, dataset_cache=None, graph=None):
+    """
+    Run steps 1-8 for a PipelineConfig and return a PipelineResult.
+    graph: optional StepGraph kept between runs. Steps whose inputs and options have not
+    changed since the last run with it reuse their output, unchanged files are not read
+    again, and only the datasets whose addresses changed are cleaned again.
+    result.reused lists the reused steps.
+    """
+    result = PipelineResult()
+    cleaner = cleaner or AddressCleaner(config.settings)
+    options = load_options(config.settings)
+    if graph is not None:
+        graph.start()
+
+    def step(name, parts, compute):
+        # Returns (output, fingerprint); without a graph every step simply runs
+        if graph is None:
+            return compute(), None
+        step_fingerprint = fingerprint(name, *parts)
+        return graph.run(name, step_fingerprint, compute), step_fingerprint
+
+    with timed_stage(result.timings, "load"):
+        names = []
+        for spec in config.datasets:
+            names.append(unique_dataset_name(spec['path'], names))
+        load_fingerprints = [file_fingerprint(spec['path'], spec.get('sheet'), options) for spec in config.datasets]
+
+        # Files read in an earlier run with the graph, and unchanged since, are not read again
+        loaded = [None] * len(config.datasets)
+        if graph is not None:
+            for i, name in enumerate(names):
+                found, data = graph.lookup(f"load:{name}", load_fingerprints[i])
+                if found:
+                    loaded[i] = LoadResult(config.datasets[i]['path'], config.datasets[i].get('sheet'), data=data, cached=True)
+        pending = [i for i in range(len(loaded)) if loaded[i] is None]
+        workers = int(config.settings.get("parallel_workers", 0))
+        for i, load in zip(pending, load_files([(config.datasets[i]['path'], config.datasets[i].get('sheet')) for i in pending],
+                                               workers, cache=dataset_cache, options=options)):
+            loaded[i] = load
+            if graph is not None and load.ok:
+                graph.store(f"load:{names[i]}", load_fingerprints[i], load.data)
+        result.file_loads = loaded
+        errors = [f"{os.path.basename(load.file_path)}: {load.error}" for load in loaded if not load.ok]
+        if errors:
+            raise PipelineError("Failed to load:\n" + "\n".join(errors))
+
+        for spec, name, load in zip(config.datasets, names, loaded):
+            result.datasets[name] = load.data
+            result.dataset_info[name] = {
+                'month': spec.get('month', 'NA'),
+                'year': int(spec.get('year', 0)),
+                'service': spec.get('service', 'Unknown'),
+            }
+
+    with timed_stage(result.timings, "rename"):
+        for spec, name in zip(config.datasets, list(result.datasets)):
+            if spec.get('renames'):
+                result.datasets[name] = rename_columns(result.datasets[name], spec['renames'])
+
+    with timed_stage(result.timings, "join"):
+        optimize = config.settings.get("optimize_dtypes", True)
+
+        def combine():
+            combined = combine_datasets(result.datasets, result.dataset_info)
+            return optimize_dtypes(combined) if optimize else combined
+
+        dataset_parts = [[name, load_fingerprint, spec.get('renames'), result.dataset_info[name]]
+                         for spec, name, load_fingerprint in zip(config.datasets, names, load_fingerprints)]
+        result.combined_data, combined_fingerprint = step("combine", [dataset_parts, optimize], combine)
+
+    with timed_stage(result.timings, "clean"):
+        if graph is None:
+            result.cleaned_data = clean_address_data(result.combined_data, config.address_column, cleaner)
+        else:
+            # Cleaned per dataset, so only datasets whose addresses changed are cleaned again
+            result.cleaned_data = clean_address_partitions(result.combined_data, config.address_column, cleaner, graph)
+        cleaned_fingerprint = fingerprint(combined_fingerprint, config.address_column, cleaner.fingerprint)
+
+    if config.client_name_columns:
+        with timed_stage(result.timings, "resolve_clients"):
+            defaults = DefaultSettings.get_defaults()
+            threshold = config.settings.get("client_match_threshold", defaults["client_match_threshold"])
+            window = config.settings.get("client_match_window", defaults["client_match_window"])
+            result.clients, cleaned_fingerprint = step(
+                "resolve_clients", [cleaned_fingerprint, config.client_name_columns, threshold, window],
+                lambda: resolve_clients(result.cleaned_data, config.client_name_columns,
+                                        f"new_{config.address_column}", threshold, window))
+            result.cleaned_data = result.clients.data
+
+    with timed_stage(result.timings, "load_additional"):
+        additional = config.additional_dataset
+        result.additional_dataset, additional_fingerprint = step(
+            "load_additional", [file_fingerprint(additional['path'], additional.get('sheet'), options)],
+            lambda: read_dataset(additional['path'], additional.get('sheet'), **options))
+
+    with timed_stage(result.timings, "summarize"):
+        result.summarized_additional_data, summary_fingerprint = step(
+            "summarize", [additional_fingerprint, config.summarize_column],
+            lambda: summarize_additional_data(result.additional_dataset, config.summarize_column))
+
+    with timed_stage(result.timings, "left_join"):
+        # The index on the summarized keys is kept, so re-joining changed cleaned data only hashes its keys
+        join_index, _ = step(
+            "join_index", [summary_fingerprint, config.additional_join_column, config.match_addresses,
+                           config.match_threshold],
+            lambda: build_join_index(result.summarized_additional_data, config.additional_join_column,
+                                     config.match_addresses, config.match_threshold))
+        result.join, joined_fingerprint = step(
+            "left_join", [cleaned_fingerprint, summary_fingerprint, config.cleaned_join_column, config.additional_join_column,
+                          config.match_addresses, config.match_threshold],
+            lambda: join_index.join(result.cleaned_data, config.cleaned_join_column))
+        result.joined_additional_data = result.join.data
+
+    with timed_stage(result.timings, "deduplicate"):
+        result.dedup, _ = step(
+            "deduplicate", [joined_fingerprint, config.dedup_column, config.dedup_tie_breakers, names],
+            lambda: deduplicate_records(result.joined_additional_data, config.dedup_column,
+                                        config.dedup_tie_breakers, file_order=names))
+        result.final_data = result.dedup.data
+
+    if graph is not None:
+        graph.finish()
+        result.reused = list(graph.reused)
+    return result
+
+
+def file_fingerprint(file_path, sheet_name=None, options=None):
+    """Fingerprint a file as it is on disk right now (its path, size and modification time) and how it is read"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        # A missing file never matches, so loading it runs and reports the error
+        return fingerprint("missing", time.time())
+    return fingerprint(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, sheet_name, options)
+
+
+def stream_pipeline(config, output_path, chunk_rows=100000, cleaner=None, progress=None):
+    """
+    Run steps 1-7 for CSV datasets one chunk at a time and append the joined rows to the
+    output CSV, so peak memory depends on chunk_rows rather than on the size of the inputs.
+    Only the (small) additional dataset is held in memory. Deduplication needs every row at
+    once, so it is not part of the stream.
+    progress, if given, is called with (done, total) bytes of the input files.
+    Returns a PipelineResult with the summarized additional data, rows_written and timings.
+    """
+    result = PipelineResult()
+    # Chunks only share cleaning work through the cache, whose size is capped by the settings
+    max_entries = config.settings.get("cache_max_entries", DefaultSettings.get_defaults()["cache_max_entries"])
+    cleaner = cleaner or AddressCleaner(config.settings, cache=AddressCleaningCache(max_entries))
+    if config.client_name_columns:
+        raise PipelineError("Finding duplicate clients needs every row at once, so it cannot be streamed")
+    non_csv = [spec['path'] for spec in config.datasets if not spec['path'].lower().endswith('.csv')]
+    if non_csv:
+        raise PipelineError(f"Streaming only supports CSV files: {', '.join(map(os.path.basename, non_csv))}")
+
+    with timed_stage(result.timings, "load_additional"):
+        additional = config.additional_dataset
+        result.additional_dataset = read_dataset(additional['path'], additional.get('sheet'),
+                                                 **load_options(config.settings))
+
+    with timed_stage(result.timings, "summarize"):
+        result.summarized_additional_data = summarize_additional_data(result.additional_dataset, config.summarize_column)
+        summarized = text_join_keys(result.summarized_additional_data, config.additional_join_column)
+        # Nullable integers keep counts like 2 from turning into 2.0 in chunks with unmatched rows
+        summarized = summarized.astype({column: "Int64" for column in summarized.columns
+                                        if pd.api.types.is_integer_dtype(summarized[column])})
+        join_index = build_join_index(summarized, config.additional_join_column, config.match_addresses,
+                                      config.match_threshold)
+
+    # Work out the combined column order from the headers alone, as combine_datasets does
+    headers = {}
+    for spec in config.datasets:
+        columns = list(pd.read_csv(spec['path'], nrows=0).columns)
+        renames = spec.get('renames') or {}
+        missing = [old_name for old_name in renames if old_name not in columns]
+        if missing:
+            raise PipelineError(f"Cannot rename missing column(s) in {os.path.basename(spec['path'])}: "
+                                f"{', '.join(map(str, missing))}")
+        headers[spec['path']] = [renames.get(column, column) for column in columns]
+    ordered_columns = []
+    for columns in headers.values():
+        ordered_columns += [column for column in columns if column not in ordered_columns]
+
+    # Check the chosen columns now rather than after part of the output is written
+    if config.address_column not in ordered_columns:
+        raise PipelineError(f"Column '{config.address_column}' not found in the joined data!")
+    address_columns = [f"new_{config.address_column}", f"{config.address_column}_auto_cleaned",
+                       f"{config.address_column}_may_have_word"]
+    if config.cleaned_join_column not in ordered_columns + ['Month', 'Year', 'Service', 'Dataset_Name'] + address_columns:
+        raise PipelineError(f"Column '{config.cleaned_join_column}' not found in the cleaned data!")
+
+    total_bytes = sum(os.path.getsize(spec['path']) for spec in config.datasets)
+    done_bytes = 0
+    dataset_names = []
+    header_written = False
+    with open(output_path, 'w', newline='', encoding='utf-8') as output:
+        for spec in config.datasets:
+            name = unique_dataset_name(spec['path'], dataset_names)
+            dataset_names.append(name)
+            with open(spec['path'], 'rb') as source:
+                chunks = iter_csv_chunks(source, chunk_rows, load_options(config.settings)["header_window"])
+                while True:
+                    with timed_stage(result.timings, "load"):
+                        chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+
+                    with timed_stage(result.timings, "join"):
+                        chunk.columns = headers[spec['path']]
+                        chunk = chunk.reindex(columns=ordered_columns, fill_value="")
+                        chunk['Month'] = str(spec.get('month', 'NA'))
+                        chunk['Year'] = int(spec.get('year', 0))
+                        chunk['Service'] = str(spec.get('service', 'Unknown'))
+                        chunk['Dataset_Name'] = name
+
+                    with timed_stage(result.timings, "clean"):
+                        chunk = clean_address_data(chunk, config.address_column, cleaner)
+
+                    with timed_stage(result.timings, "left_join"):
+                        chunk = join_index.join(chunk, config.cleaned_join_column).data
+
+                    with timed_stage(result.timings, "write"):
+                        chunk.to_csv(output, header=not header_written, index=False)
+                    header_written = True
+                    result.rows_written += len(chunk)
+                    if progress is not None:
+                        progress(done_bytes + source.tell(), total_bytes)
+            done_bytes += os.path.getsize(spec['path'])
+
+    return result
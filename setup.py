@@ -41,8 +41,8 @@ def main():
     print("=" * 50)
     
     # Check Python version
-    if sys.version_info < (3, 7):
-        print("✗ Python 3.7 or higher is required!")
+    if sys.version_info < (3, 11):
+        print("✗ Python 3.11 or higher is required!")
         return False
     
     print(f"✓ Python {sys.version.split()[0]} detected")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Defines the stage snapshot store for the Data Joiner application.
+The table after each workflow step (joined, cleaned, left joined, deduplicated) is kept
+so it can be previewed, exported or gone back to. Most steps only add columns to the
+table they start from, or keep some of its rows, so a stage is stored as references to
+the columns of the stage it came from plus what the step added. Unchanged columns are
+held once, however many stages refer to them.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _buffers(column):
+    """
+    The memory (address, size and layout) holding a column's values, or None where it
+    cannot be read without a copy (nullable integers and other extension types).
+    """
+    dtype = column.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        values = column.array.codes
+    elif isinstance(dtype, pd.ArrowDtype) or getattr(dtype, "storage", None) == "pyarrow":
+        # Arrow-backed columns (text when pyarrow is installed): the buffers of each chunk
+        return [(chunk.offset, len(chunk), [buf.address if buf is not None else None for buf in chunk.buffers()])
+                for chunk in column.array.__arrow_array__().chunks]
+    elif isinstance(dtype, np.dtype) or getattr(dtype, "storage", None) == "python":
+        values = column.to_numpy(copy=False)
+    else:
+        return None
+    return values.__array_interface__["data"][0], values.shape, values.strides
+
+
+def same_data(column, other):
+    """Whether two Series hold the very same values in memory (one is a shallow copy of the other)"""
+    if len(column) != len(other) or column.dtype != other.dtype:
+        return False
+    buffers = _buffers(column)
+    return buffers is not None and buffers == _buffers(other)
+
+
+class StageSnapshot:
+    """One stored stage: its columns (Series shared with other stages) and which rows it keeps."""
+
+    def __init__(self, columns, index, rows=None, added=()):
+        self.columns = columns      # column name -> Series over the full rows of index
+        self.index = index
+        self.rows = rows            # positions of the kept rows, or None for all of them
+        self.added = list(added)    # columns this stage did not take from its base
+        self._frame = None          # the table of a stage of all rows, built on first use
+
+    def to_frame(self):
+        """
+        Return the stage as a DataFrame. A stage of all rows builds its table once and
+        each call gets a shallow copy of it; a stage of kept rows takes them on each call,
+        as holding the taken rows would copy the table the store saves.
+        """
+        if self.rows is not None:
+            return pd.DataFrame(self.columns, index=self.index, copy=False).take(self.rows)
+        if self._frame is None:
+            self._frame = pd.DataFrame(self.columns, index=self.index, copy=False)
+        # Copy-on-write keeps the built table unchanged when the copy is modified
+        return self._frame.copy(deep=False)
+
+
+class StageSnapshotStore:
+    """
+    The tables produced by the workflow steps, in the order they were stored.
+    Only the newest version of each stage is kept; storing a stage again replaces it.
+    """
+
+    def __init__(self):
+        self._stages = {}
+
+    def put(self, name, df, base=None):
+        """
+        Store df as stage `name`. If base names a stored stage that df was derived from,
+        the columns df holds unchanged from it are kept as references to base's columns
+        when df either
+          - has the same rows as base (the step added or replaced columns), or
+          - has a subset of base's rows, labelled as in base, with base's values (the step dropped rows).
+        Anything else (or no base) is stored as a table of its own. Storing None drops the stage.
+        """
+        snapshot = self._snapshot(df, self._stages.get(base) if base is not None else None)
+        # A stage stored again moves to the end, so undo and revert follow the order of the steps
+        self._stages.pop(name, None)
+        if snapshot is not None:
+            self._stages[name] = snapshot
+
+    def _snapshot(self, df, parent):
+        if df is None:
+            return None
+        if parent is not None and parent.rows is None:
+            if len(df) == len(parent.index) and df.index.equals(parent.index):
+                # A column the step replaced has the base's name but not its data
+                kept = {col for col in df.columns if col in parent.columns and same_data(df[col], parent.columns[col])}
+                columns = {col: parent.columns[col] if col in kept else df[col] for col in df.columns}
+                return StageSnapshot(columns, parent.index, added=[col for col in df.columns if col not in kept])
+            if all(col in parent.columns for col in df.columns) and parent.index.is_unique:
+                rows = parent.index.get_indexer(df.index)
+                # The kept rows are copies, so their values are compared with the base's
+                if (rows >= 0).all() and all(df[col].array.equals(parent.columns[col].array.take(rows))
+                                             for col in df.columns):
+                    return StageSnapshot({col: parent.columns[col] for col in df.columns}, parent.index, rows=rows)
+        return StageSnapshot({col: df[col] for col in df.columns}, df.index, added=df.columns)
+
+    def get(self, name):
+        """Return the table stored as stage `name`, or None"""
+        snapshot = self._stages.get(name)
+        return snapshot.to_frame() if snapshot is not None else None
+
+    def names(self):
+        """The stored stages, oldest first"""
+        return list(self._stages)
+
+    def revert(self, name):
+        """Drop every stage stored after `name` and return the table of `name`"""
+        if name not in self._stages:
+            raise KeyError(f"No stage named '{name}' has been stored")
+        names = self.names()
+        for later in names[names.index(name) + 1:]:
+            del self._stages[later]
+        return self.get(name)
+
+    def undo(self):
+        """Drop the newest stage and return the table of the one before it (None if none is left)"""
+        if self._stages:
+            self._stages.popitem()
+        return self.get(self.names()[-1]) if self._stages else None
+
+    def clear(self):
+        """Drop all stages"""
+        self._stages.clear()
+
+    def memory_usage(self):
+        """Bytes held by the stored stages, counting each shared column once (strings are not measured)"""
+        seen = {}
+        row_bytes = 0
+        for snapshot in self._stages.values():
+            for column in snapshot.columns.values():
+                seen[id(column)] = column
+            if snapshot.rows is not None:
+                row_bytes += snapshot.rows.nbytes
+        return int(sum(column.memory_usage(index=False) for column in seen.values())) + row_bytes
+
+    def describe(self):
+        """Return a short summary of the stored stages and the memory they share"""
+        parts = []
+        for name, snapshot in self._stages.items():
+            if snapshot.rows is not None:
+                parts.append(f"{name} ({len(snapshot.rows):,} rows kept)")
+            else:
+                parts.append(f"{name} (+{len(snapshot.added)} columns)")
+        return f"{', '.join(parts) or 'no stages'}; {self.memory_usage() / (1024 * 1024):.1f} MB"
+
+
+def stage_property(name, base=None):
+    """
+    A DataFrame attribute kept in the owner's StageSnapshotStore (owner.stages) as stage
+    `name`, derived from stage `base`. Reading it returns None until a table is stored.
+    """
+    return property(lambda owner: owner.stages.get(name),
+                    lambda owner, df: owner.stages.put(name, df, base))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Defines the step graph for incremental re-runs in the Data Joiner application.
+Each step's output is stored with a fingerprint of everything it was computed from
+(its inputs' fingerprints and its parameters). When the workflow runs again, a step
+whose fingerprint has not changed hands back its stored output instead of running,
+so changing one file's metadata or one column name only redoes what depends on it.
+"""
+
+import hashlib
+import json
+
+import pandas as pd
+
+
+def fingerprint(*parts):
+    """
+    Return a short hash of the given parts. DataFrames and Series are hashed by their
+    values, column names and dtypes; anything else by its JSON text.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+            columns = list(part.columns) if isinstance(part, pd.DataFrame) else [part.name]
+            dtypes = list(part.dtypes) if isinstance(part, pd.DataFrame) else [part.dtype]
+            digest.update(json.dumps([columns, dtypes], default=str).encode("utf-8"))
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class StepGraph:
+    """
+    The stored outputs of named steps, each under the fingerprint it was computed from.
+    Call start() before each run and finish() after it: outputs of steps that were not
+    part of the run (e.g. a dataset that was removed) are then dropped.
+    """
+
+    def __init__(self):
+        self._outputs = {}     # step name -> (fingerprint, output)
+        self.computed = []
+        self.reused = []
+        self._seen = set()
+
+    def start(self):
+        """Begin a run"""
+        self.computed = []
+        self.reused = []
+        self._seen = set()
+
+    def lookup(self, name, step_fingerprint):
+        """Return (True, output) if `name` was stored under this fingerprint, else (False, None)"""
+        self._seen.add(name)
+        stored = self._outputs.get(name)
+        if stored is not None and stored[0] == step_fingerprint:
+            self.reused.append(name)
+            return True, stored[1]
+        return False, None
+
+    def store(self, name, step_fingerprint, output):
+        """Store the output of a step that had to run"""
+        self._seen.add(name)
+        self._outputs[name] = (step_fingerprint, output)
+        self.computed.append(name)
+        return output
+
+    def run(self, name, step_fingerprint, compute):
+        """Return the stored output of `name` if its fingerprint is unchanged, else compute() it and store that"""
+        found, output = self.lookup(name, step_fingerprint)
+        return output if found else self.store(name, step_fingerprint, compute())
+
+    def finish(self):
+        """Drop the outputs of steps that were not part of this run"""
+        for name in list(self._outputs):
+            if name not in self._seen:
+                del self._outputs[name]
+
+    def clear(self):
+        """Drop every stored output"""
+        self._outputs.clear()
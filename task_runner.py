@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Defines the background task runner for the Data Joiner application.
+Long steps run on a worker thread while the Tk main loop keeps handling events;
+progress and results are handed back to the main thread by polling with root.after.
+"""
+
+import queue
+import threading
+import traceback
+
+
+class TaskCancelled(Exception):
+    """Raised inside a background task when the user cancels it."""
+
+
+class TaskProgress:
+    """
+    Passed to the work function of a task. Call it with (done, total) to report progress;
+    the call raises TaskCancelled once the user has asked for the task to stop.
+    """
+
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.updates = queue.Queue()
+
+    def __call__(self, done, total):
+        self.check_cancelled()
+        self.updates.put((done, total))
+
+    def check_cancelled(self):
+        """Raise TaskCancelled if the task has been cancelled"""
+        if self.cancel_event.is_set():
+            raise TaskCancelled()
+
+
+class TaskRunner:
+    """Runs one long step at a time on a background thread and relays its progress to the Tk main loop."""
+
+    POLL_MS = 100
+
+    def __init__(self, root, on_progress=None, on_state_change=None):
+        self.root = root
+        self.on_progress = on_progress            # called with (task_name, done, total)
+        self.on_state_change = on_state_change    # called with (busy, task_name)
+        self.task_name = None
+        self.progress = None
+        self._thread = None
+        self._outcome = None
+        self._callbacks = None
+
+    @property
+    def busy(self):
+        """True while a task is running (or its result has not been handed back yet)"""
+        return self._thread is not None
+
+    def start(self, name, work, on_success, on_error=None, on_cancel=None):
+        """
+        Run work(progress) on a background thread. The callbacks run on the main thread:
+        on_success(result), on_error(exception) or on_cancel().
+        Returns False (and does nothing) if another task is still running.
+        """
+        if self.busy:
+            return False
+
+        self.task_name = name
+        self.progress = TaskProgress()
+        self._outcome = None
+        self._callbacks = (on_success, on_error, on_cancel)
+        self._thread = threading.Thread(target=self._run, args=(work, self.progress), daemon=True)
+        self._thread.start()
+
+        if self.on_state_change:
+            self.on_state_change(True, name)
+        self.root.after(self.POLL_MS, self._poll)
+        return True
+
+    def cancel(self):
+        """Ask the running task to stop at its next progress report"""
+        if self.busy:
+            self.progress.cancel_event.set()
+
+    def _run(self, work, progress):
+        try:
+            self._outcome = ("success", work(progress))
+        except TaskCancelled:
+            self._outcome = ("cancelled", None)
+        except Exception as e:
+            traceback.print_exc()
+            self._outcome = ("error", e)
+
+    def _poll(self):
+        # Only the newest progress report matters for the progress bar
+        latest = None
+        while True:
+            try:
+                latest = self.progress.updates.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None and self.on_progress:
+            self.on_progress(self.task_name, *latest)
+
+        if self._thread.is_alive():
+            self.root.after(self.POLL_MS, self._poll)
+            return
+
+        status, value = self._outcome
+        on_success, on_error, on_cancel = self._callbacks
+        name = self.task_name
+        self._thread = None
+        self._callbacks = None
+        if self.on_state_change:
+            self.on_state_change(False, name)
+
+        if status == "success":
+            on_success(value)
+        elif status == "cancelled":
+            if on_cancel:
+                on_cancel()
+        elif on_error:
+            on_error(value)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Tests for the vectorized address cleaning engine
+"""
+
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from address_cache_store import PersistentAddressCache
+from address_cleaner import AddressCleaner, AddressCleaningCache
+from benchmarks import legacy_clean_address_column, make_synthetic_addresses
+from default_settings import DefaultSettings
+
+
+EDGE_CASE_ADDRESSES = pd.Series([
+    '123 Main St Apt 4B',
+    '456 Oak Ave Unit 12',
+    '789 Pine St Suite 100',
+    '321 Elm St #5',
+    '654 Maple Dr Lot 3',
+    '987 Cedar Ln PO Box 123',
+    '258 Spruce Ave',
+    '12 Unity Way',
+    'straße apt 3',
+    'Ünit 5',
+    'x\nAPT 4',
+    None,
+    float('nan'),
+    '',
+    '   ',
+    123,
+    4.5,
+], dtype=object)
+
+
+def assert_matches_legacy(addresses, settings):
+    """Assert the engine output is identical to the original per-row loop"""
+    expected = legacy_clean_address_column(addresses, settings)
+    actual = AddressCleaner(settings).clean(addresses)
+    for expected_series, actual_series in zip(expected, actual):
+        pd.testing.assert_series_equal(expected_series, actual_series)
+
+
+def test_matches_legacy_loop():
+    """Test that the engine reproduces the original loop on synthetic and edge-case data"""
+    print("Testing AddressCleaner against the legacy loop...")
+    settings = DefaultSettings.get_defaults()
+    assert_matches_legacy(make_synthetic_addresses(5000), settings)
+    assert_matches_legacy(EDGE_CASE_ADDRESSES, settings)
+
+    # Categorical columns are cleaned from their categories
+    for addresses in (make_synthetic_addresses(5000), EDGE_CASE_ADDRESSES):
+        expected = AddressCleaner(settings).clean(addresses)
+        actual = AddressCleaner(settings).clean(addresses.astype('category'))
+        for expected_series, actual_series in zip(expected, actual):
+            pd.testing.assert_series_equal(expected_series, actual_series)
+    print("[PASS] AddressCleaner output is identical to the legacy loop")
+
+
+def test_custom_settings():
+    """Test unusual settings: empty word lists and patterns with their own groups or flags"""
+    print("Testing AddressCleaner with custom settings...")
+    settings = DefaultSettings.get_defaults()
+    assert_matches_legacy(EDGE_CASE_ADDRESSES, dict(settings, apartment_words=[]))
+    assert_matches_legacy(EDGE_CASE_ADDRESSES, dict(settings, po_box_words=[]))
+    assert_matches_legacy(EDGE_CASE_ADDRESSES, dict(settings, number_patterns=[r'(\d)\1', r'(?i)box']))
+    print("[PASS] Custom settings are applied like the legacy loop")
+
+
+def test_parallel_matches_in_process():
+    """Test that the process pool returns the same results, in order, as in-process cleaning"""
+    print("Testing parallel AddressCleaner...")
+    settings = DefaultSettings.get_defaults()
+    addresses = make_synthetic_addresses(20000, distinct=20000)
+    parallel_settings = dict(settings, parallel_workers=2, parallel_chunk_size=3000, parallel_min_rows=0)
+
+    expected = AddressCleaner(settings).clean(addresses)
+    actual = AddressCleaner(parallel_settings).clean(addresses)
+    for expected_series, actual_series in zip(expected, actual):
+        pd.testing.assert_series_equal(expected_series, actual_series)
+    print("[PASS] Parallel cleaning matches in-process cleaning")
+
+
+def test_cache_reuses_results():
+    """Test that cached cleaning matches uncached cleaning and reports hits on a rerun"""
+    print("Testing AddressCleaningCache...")
+    settings = DefaultSettings.get_defaults()
+    addresses = make_synthetic_addresses(5000)
+    cache = AddressCleaningCache(max_entries=100000)
+
+    expected = AddressCleaner(settings).clean(addresses)
+    for _ in range(2):
+        actual = AddressCleaner(settings, cache=cache).clean(addresses)
+        for expected_series, actual_series in zip(expected, actual):
+            pd.testing.assert_series_equal(expected_series, actual_series)
+    assert cache.last_hit_rate == 1.0
+
+    # Padded and unpadded spellings normalize to the same key
+    AddressCleaner(settings, cache=cache).clean(pd.Series(['  77 Test Rd  ', '77 Test Rd']))
+    assert cache.last_hits == 0 and cache.last_misses == 1
+    print(f"[PASS] Cache results are identical ({cache.stats()})")
+
+
+def test_cache_limits_and_invalidation():
+    """Test that the cache evicts old entries and clears itself when the rules change"""
+    print("Testing AddressCleaningCache limits and invalidation...")
+    settings = DefaultSettings.get_defaults()
+    cache = AddressCleaningCache(max_entries=3)
+
+    AddressCleaner(settings, cache=cache).clean(pd.Series(['1 A St', '2 B St', '3 C St', '4 D St']))
+    assert len(cache) == 3 and '1 A St' not in cache.entries
+
+    changed = dict(settings, apartment_words=settings['apartment_words'] + ['BADOOM'])
+    cleaned, auto_cleaned, _ = AddressCleaner(changed, cache=cache).clean(pd.Series(['4 D St Badoom 2']))
+    assert cache.hits == 0 and len(cache) == 1
+    assert cleaned.tolist() == ['4 D St'] and auto_cleaned.tolist() == ['Yes']
+    print("[PASS] Cache is bounded and invalidated by rule changes")
+
+
+def test_persistent_store():
+    """Test that results persist on disk, are keyed by the rules, and can be cleared"""
+    print("Testing PersistentAddressCache...")
+    settings = DefaultSettings.get_defaults()
+    addresses = make_synthetic_addresses(2000)
+    expected = AddressCleaner(settings).clean(addresses)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        store = PersistentAddressCache(os.path.join(temp_dir, "cache.sqlite"))
+        for _ in range(2):
+            # A fresh in-memory cache each time, like a new session
+            actual = AddressCleaner(settings, cache=AddressCleaningCache(), store=store).clean(addresses)
+            for expected_series, actual_series in zip(expected, actual):
+                pd.testing.assert_series_equal(expected_series, actual_series)
+        stored_entries = store.info()["entries"]
+        assert stored_entries == addresses.dropna().str.strip().nunique()
+
+        # New rules must not reuse results stored under the old ones
+        changed = dict(settings, apartment_words=[])
+        cleaned, auto_cleaned, _ = AddressCleaner(changed, store=store).clean(pd.Series(['1 Main St Apt 2']))
+        assert cleaned.tolist() == ['1 Main St Apt 2'] and auto_cleaned.tolist() == ['No']
+        assert len(store.info()["rule_sets"]) == 2
+
+        store.clear()
+        assert store.info()["entries"] == 0
+    print("[PASS] Results persist per rule set and can be cleared")
+
+
+def test_expected_flags():
+    """Test the three outputs on a few hand-checked addresses"""
+    print("Testing AddressCleaner outputs...")
+    cleaned, auto_cleaned, may_have_word = AddressCleaner(DefaultSettings.get_defaults()).clean(
+        pd.Series(['123 Main St Apt 4B', '321 Elm St #5', 'Main St', None])
+    )
+    assert cleaned.tolist() == ['123 Main St', '321 Elm St #5', 'Main St', '']
+    assert auto_cleaned.tolist() == ['Yes', 'No', 'No', 'No']
+    assert may_have_word.tolist() == ['No', 'Yes', 'No', 'No']
+    print("[PASS] Outputs match the expected values")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Address Cleaner Tests")
+    print("=" * 60)
+
+    tests = [
+        test_matches_legacy_loop,
+        test_custom_settings,
+        test_parallel_matches_in_process,
+        test_cache_reuses_results,
+        test_cache_limits_and_invalidation,
+        test_persistent_store,
+        test_expected_flags,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the USPS address normalization and the blocked approximate address matching
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from address_matching import AddressMatcher, address_parts, normalize_addresses, similarity
+
+
+def test_normalize_addresses():
+    """Test that spellings of the same address normalize to the same text"""
+    print("Testing address normalization...")
+    addresses = pd.Series(["123 North Main Street", "123 n. main st", "45 Oak Avenue, Apartment 2",
+                           "77 Pine Road", "12 Court Street", "9 Elm St Springfield 01101-2345", None])
+    normalized = normalize_addresses(addresses)
+    assert normalized.tolist()[:5] == ["123 N MAIN ST", "123 N MAIN ST", "45 OAK AVE APT 2", "77 PINE RD", "12 COURT ST"]
+    assert pd.isna(normalized.iloc[-1])
+
+    parts = address_parts(normalized)
+    assert parts.loc[5, ["House", "Street", "ZIP", "Street_Initial"]].tolist() == ["9", "ELM ST SPRINGFIELD", "01101", "E"]
+    assert parts.loc[0, "Street_Initial"] == "M"
+    print("[PASS] Abbreviations, punctuation and ZIP codes are normalized")
+
+
+def test_match_addresses():
+    """Test exact, approximate and rejected matches"""
+    print("Testing approximate address matching...")
+    reference = ["123 North Main Street", "45 Oak Avenue Apt 2", "9 Elm St 01101", "77 Pine Road", "123 N Main St"]
+    matcher = AddressMatcher(reference, threshold=0.85)
+    assert matcher.duplicate_addresses == 1
+
+    addresses = pd.Series(["123 N Main St",      # equal once abbreviated
+                           "123 N. Mian St.",    # misspelled street
+                           "9 Elm Street",       # no ZIP code
+                           "9 Elm St 01102",     # another ZIP code
+                           "77 Pine Rd",
+                           "78 Pine Rd",         # another house number
+                           "500 Nowhere Ln",
+                           None,
+                           "123 N Main St"])
+    positions, scores = matcher.match(addresses)
+    assert positions.tolist() == [0, 0, 2, -1, 3, -1, -1, -1, 0]
+    assert scores[0] == 1 and 0.85 <= scores[1] < 1 and np.isnan(scores[3])
+
+    strict, _ = AddressMatcher(reference, threshold=0.95).match(addresses)
+    assert strict[1] == -1 and strict[0] == 0
+    assert similarity("N MAIN ST", "N MIAN ST") > similarity("N MAIN ST", "S ELM RD")
+
+    try:
+        AddressMatcher(reference, threshold=1.5)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("A threshold above 1 was accepted")
+    print("[PASS] Addresses match within their blocks, above the threshold")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Address Matching Tests")
+    print("=" * 60)
+
+    tests = [
+        test_normalize_addresses,
+        test_match_addresses,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
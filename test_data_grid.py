@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Tests for the virtualized preview grid, using stand-ins for the Treeview and scrollbar
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_grid import DEFAULT_VISIBLE_ROWS, VirtualDataGrid, filter_mask, format_rows
+
+
+class FakeTree:
+    """Records what a ttk.Treeview would show"""
+
+    def __init__(self, height=1):
+        self.height = height
+        self.options = {}
+        self.headings = {}
+        self.rows = {}
+        self.order = []
+        self.selected = ()
+        self.bindings = {}
+        self.inserts = 0
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def __setitem__(self, key, value):
+        self.options[key] = value
+
+    def bind(self, sequence, callback, add=None):
+        self.bindings[sequence] = callback
+
+    def heading(self, col, text):
+        self.headings[col] = text
+
+    def column(self, col, **options):
+        pass
+
+    def winfo_height(self):
+        return self.height
+
+    def insert(self, parent, index, values):
+        self.inserts += 1
+        iid = f"I{self.inserts}"
+        self.rows[iid] = values
+        self.order.append(iid)
+        return iid
+
+    def item(self, iid, values):
+        self.rows[iid] = values
+
+    def delete(self, iid):
+        del self.rows[iid]
+        self.order.remove(iid)
+
+    def selection(self):
+        return self.selected
+
+    def selection_remove(self, items):
+        self.selected = ()
+
+    def shown(self):
+        return [self.rows[iid] for iid in self.order]
+
+
+class FakeScrollbar:
+    def __init__(self):
+        self.command = None
+        self.position = None
+
+    def config(self, command):
+        self.command = command
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+
+def test_format_rows():
+    """Test that rows are formatted like the old preview, with missing values left blank"""
+    print("Testing row formatting...")
+    df = pd.DataFrame({'A': [1, None, 3], 'B': ['x', None, 'nan'], 'C': pd.Categorical(['Yes', 'No', None])})
+    assert format_rows(df, 0, 3) == [['1.0', 'x', 'Yes'], ['', '', 'No'], ['3.0', 'nan', '']]
+    assert format_rows(df, 2, 10) == [['3.0', 'nan', '']]
+    print("[PASS] Rows are formatted as text")
+
+
+def test_grid_only_fills_visible_rows():
+    """Test that a large frame only puts the visible rows in the tree and scrolls through all rows"""
+    print("Testing the virtual grid...")
+    rows = 1_000_000
+    df = pd.DataFrame({'ID': np.arange(rows), 'Name': ['client'] * rows})
+    tree, scrollbar = FakeTree(), FakeScrollbar()
+    grid = VirtualDataGrid(tree, scrollbar)
+    assert scrollbar.command == grid.yview and tree.options['yscrollcommand'] == ""
+
+    grid.show(df)
+    assert tree.options['columns'] == ['ID', 'Name'] and len(tree.shown()) == DEFAULT_VISIBLE_ROWS
+    assert tree.shown()[0] == ['0', 'client']
+
+    # Scrolling refills the same items
+    scrollbar.command("moveto", 0.5)
+    assert tree.shown()[0] == [str(rows // 2), 'client'] and tree.inserts == DEFAULT_VISIBLE_ROWS
+    scrollbar.command("scroll", 1, "pages")
+    assert tree.shown()[0][0] == str(rows // 2 + DEFAULT_VISIBLE_ROWS)
+    tree.bindings["<Button-4>"](None)
+    assert tree.shown()[0][0] == str(rows // 2 + DEFAULT_VISIBLE_ROWS - 3)
+    scrollbar.command("moveto", 1)
+    assert tree.shown()[-1][0] == str(rows - 1) and scrollbar.position[1] == 1
+
+    # A taller window shows more rows; a smaller frame or None shrinks or clears the tree
+    tree.height = 25 + 40 * 20
+    tree.bindings["<Configure>"](None)
+    assert len(tree.shown()) == 40
+    grid.show(df.head(3))
+    assert [row[0] for row in tree.shown()] == ['0', '1', '2']
+    grid.show(None)
+    assert tree.shown() == [] and scrollbar.position == (0, 1)
+    print("[PASS] Only visible rows are in the tree")
+
+
+def test_filter_mask():
+    """Test the filter conditions against each kind of column"""
+    print("Testing filter queries...")
+    df = pd.DataFrame({
+        'Client_ID': pd.Series(['A1', '1234', '1234', None], dtype='str'),
+        'Address': ['1 Main St Apt 2', '5 Oak Ave', None, '9 MAIN ST'],
+        'Address_may_have_word': pd.Categorical(['Yes', 'No', 'No', None]),
+        'Visits': [1, 3, 3.0, 7],
+    })
+    assert filter_mask(df, "Address_may_have_word = yes").tolist() == [True, False, False, False]
+    assert filter_mask(df, "address_may_have_word != No").tolist() == [True, False, False, True]
+    assert filter_mask(df, "Client_ID = 1234").tolist() == [False, True, True, False]
+    assert filter_mask(df, "Client_ID = a1").tolist() == [True, False, False, False]
+    assert filter_mask(df, "Address ~ main st").tolist() == [True, False, False, True]
+    assert filter_mask(df, "Address = ").tolist() == [False, False, True, False]
+    assert filter_mask(df, "Visits = 3").tolist() == [False, True, True, False]
+    assert filter_mask(df, "Visits = many").tolist() == [False, False, False, False]
+    assert filter_mask(df, "Visits = 3; Client_ID = 1234").tolist() == [False, True, True, False]
+    # Plain text searches the text columns and compares the number columns
+    assert filter_mask(df, "oak").tolist() == [False, True, False, False]
+    assert filter_mask(df, "7").tolist() == [False, False, False, True]
+    try:
+        filter_mask(df, "Missing = 1")
+        assert False, "Expected an unknown column to be reported"
+    except ValueError as e:
+        assert "Missing" in str(e)
+    print("[PASS] Filter queries match the expected rows")
+
+
+def test_grid_filter():
+    """Test that the grid scrolls through only the filtered rows and keeps the filter for new data"""
+    print("Testing the grid filter...")
+    rows = 100_000
+    df = pd.DataFrame({'ID': np.arange(rows), 'Flag': pd.Categorical(np.where(np.arange(rows) % 10 == 0, 'Yes', 'No'))})
+    tree, scrollbar = FakeTree(), FakeScrollbar()
+    grid = VirtualDataGrid(tree, scrollbar)
+    summaries = []
+    grid.on_change = lambda grid: summaries.append(grid.summary())
+
+    grid.show(df)
+    grid.set_filter("Flag = Yes")
+    assert summaries == ["100,000 rows", "10,000 of 100,000 rows match"]
+    assert [row[0] for row in tree.shown()[:3]] == ['0', '10', '20']
+    scrollbar.command("moveto", 1)
+    assert tree.shown()[-1] == ['99990', 'Yes']
+
+    # New data keeps the filter; a bad filter shows every row and says why
+    grid.show(df.head(30))
+    assert grid.summary() == "3 of 30 rows match"
+    grid.set_filter("Nope = 1")
+    assert grid.summary() == "No column named 'Nope'" and len(tree.shown()) == DEFAULT_VISIBLE_ROWS
+    grid.set_filter("")
+    assert grid.summary() == "30 rows"
+    print("[PASS] The grid shows only the filtered rows")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Data Grid Tests")
+    print("=" * 60)
+
+    tests = [
+        test_format_rows,
+        test_grid_only_fills_visible_rows,
+        test_filter_mask,
+        test_grid_filter,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Tests for Soundex keys, blocking and the clustering of duplicate clients
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from entity_resolution import (CLUSTER_COLUMN, candidate_pairs, cluster_pairs, find_duplicate_clients,
+                               normalize_names, phonetic_keys, soundex)
+
+
+def test_soundex():
+    """Test Soundex codes against the standard examples"""
+    print("Testing Soundex...")
+    examples = {"Robert": "R163", "Rupert": "R163", "Rubin": "R150", "Ashcraft": "A261",
+                "Tymczak": "T522", "Pfister": "P236", "Honeyman": "H555", "Lee": "L000", "": ""}
+    for word, code in examples.items():
+        assert soundex(word) == code, f"{word}: {soundex(word)} != {code}"
+
+    names = normalize_names(pd.Series(["Smith, John A.", "john smith", "J.", None]))
+    assert names.tolist()[:2] == ["JOHN SMITH", "JOHN SMITH"] and names.iloc[2:].isna().all()
+    assert phonetic_keys(names).iloc[0] == "J500 S530"
+    print("[PASS] Soundex codes and name keys are standard")
+
+
+def test_blocking_and_clusters():
+    """Test that pairs only come from the same block and that linked records share a root"""
+    print("Testing blocking and union-find...")
+    blocks = pd.Series(["a", "b", "a", None, "a", "b"])
+    sort_keys = pd.Series(["3", "1", "1", "2", "2", "2"])
+    first, second = candidate_pairs(blocks, sort_keys, window=10)
+    assert sorted(zip(first.tolist(), second.tolist())) == [(1, 5), (2, 0), (2, 4), (4, 0)]
+    # A window of 2 only pairs neighbours in sort order
+    first, _ = candidate_pairs(blocks, sort_keys, window=2)
+    assert len(first) == 3
+
+    roots = cluster_pairs(6, np.array([4, 1, 2]), np.array([2, 5, 0]))
+    assert roots.tolist() == [0, 1, 0, 3, 0, 1]
+    print("[PASS] Pairs stay within blocks and clusters follow links")
+
+
+def test_find_duplicate_clients():
+    """Test that spellings of the same client share a cluster and different clients do not"""
+    print("Testing duplicate client detection...")
+    df = pd.DataFrame({
+        'First': ['John', 'Jon', 'Jane', 'John', 'Maria', None, 'Marie', 'John'],
+        'Last': ['Smith', 'Smyth', 'Smith', 'Smith', 'Garcia', 'X', 'Garcia', 'Smith'],
+        'new_Address': ['12 Oak Street', '12 Oak St', '12 Oak St', '12 Oak Str', '5 Elm Rd', None, '5 Elm Road',
+                        '40 Pine Ave'],
+    }, index=np.arange(8) * 2)
+    result = find_duplicate_clients(df, ['First', 'Last'], 'new_Address')
+    clusters = result.data[CLUSTER_COLUMN].tolist()
+    assert clusters == [1, 1, 2, 1, 3, 4, 3, 5]
+    assert result.data.index.equals(df.index) and list(result.data.columns) == list(df.columns) + [CLUSTER_COLUMN]
+    assert (result.clusters_merged, result.rows_clustered) == (2, 5)
+
+    # A strict threshold links nothing but equal spellings
+    strict = find_duplicate_clients(df, ['First', 'Last'], 'new_Address', threshold=1.0)
+    assert strict.data[CLUSTER_COLUMN].tolist() == [1, 2, 3, 1, 4, 5, 6, 7]
+
+    for bad in [(['Missing'], 'new_Address', 0.8), (['First'], 'new_Address', 0)]:
+        try:
+            find_duplicate_clients(df, *bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"find_duplicate_clients{bad} did not raise ValueError")
+    print(f"[PASS] {result.describe()}")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Entity Resolution Tests")
+    print("=" * 60)
+
+    tests = [
+        test_soundex,
+        test_blocking_and_clusters,
+        test_find_duplicate_clients,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
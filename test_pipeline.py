@@ -0,0 +1,759 @@
+#!/usr/bin/env python3
+"""
+Tests for the GUI-free processing pipeline
+"""
+
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from address_cleaner import AddressCleaner
+import batch_runner
+from benchmarks import legacy_combine_datasets, legacy_deduplicate_by_date, legacy_detect_and_skip_dummy_rows
+import pipeline
+from dataset_cache import DatasetCache
+from default_settings import DefaultSettings
+from stage_store import same_data
+from step_graph import StepGraph
+from task_runner import TaskCancelled
+
+
+def write_sample_files(directory):
+    """Write two monthly client files (with report banners) and an additional visits file"""
+    january = pd.DataFrame({
+        'Client_ID': ['C1', 'C2', 'C3'],
+        'Address': ['1 Main St Apt 2', '2 Oak Ave #5', '3 Pine St'],
+        'Value': [10, 20, 30],
+    })
+    february = pd.DataFrame({
+        'Client_ID': ['C1', 'C4'],
+        'Address': ['1 Main St Unit 2', '4 Elm Dr'],
+        'Amount': [11, 40],
+    })
+    banner = pd.DataFrame({'Client_ID': ['CLIENT REPORT', ''], 'Address': ['', '']})
+    visits = pd.DataFrame({'Client': ['C1', 'C1', 'C2', 'C9']})
+
+    paths = {
+        'january': os.path.join(directory, 'clients_january.csv'),
+        'february': os.path.join(directory, 'clients_february.csv'),
+        'visits': os.path.join(directory, 'visits.csv'),
+    }
+    pd.concat([banner, january], ignore_index=True).to_csv(paths['january'], index=False)
+    pd.concat([banner, february], ignore_index=True).to_csv(paths['february'], index=False)
+    visits.to_csv(paths['visits'], index=False)
+    return paths
+
+
+def make_config(paths):
+    """Build a PipelineConfig for the sample files"""
+    return pipeline.PipelineConfig(
+        datasets=[
+            {'path': paths['january'], 'month': 'January', 'year': 2024, 'service': 'Outreach'},
+            {'path': paths['february'], 'month': 'February', 'year': 2024, 'service': 'Outreach',
+             'renames': {'Amount': 'Value'}},
+        ],
+        address_column='Address',
+        additional_dataset={'path': paths['visits']},
+        summarize_column='Client',
+        cleaned_join_column='Client_ID',
+        additional_join_column='Client',
+        dedup_column='Client_ID',
+    )
+
+
+def test_full_pipeline_run():
+    """Test that all steps run headless and produce the expected tables"""
+    print("Testing a full headless pipeline run...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result = pipeline.run_pipeline(make_config(write_sample_files(temp_dir)))
+
+    assert list(result.datasets) == ['clients_january', 'clients_february']
+    assert len(result.combined_data) == 5
+    assert list(result.combined_data.columns) == ['Client_ID', 'Address', 'Value', 'Month', 'Year', 'Service', 'Dataset_Name']
+    assert result.cleaned_data['new_Address'].tolist()[:2] == ['1 Main St', '2 Oak Ave #5']
+    assert result.cleaned_data['Address_may_have_word'].tolist()[:2] == ['No', 'Yes']
+
+    final = result.final_data.set_index('Client_ID')
+    assert sorted(final.index) == ['C1', 'C2', 'C3', 'C4']
+    assert final.loc['C1', 'Month'] == 'February'
+    assert final.loc['C1', 'Count'] == 2 and pd.isna(final.loc['C4', 'Count'])
+    assert list(result.timings) == ['load', 'rename', 'join', 'clean', 'load_additional',
+                                    'summarize', 'left_join', 'deduplicate']
+    print("[PASS] Pipeline produced the expected output")
+
+
+def test_deduplicate_matches_original():
+    """Test that the grouped dedup keeps the same rows, in the same order, as sorting then dropping duplicates"""
+    print("Testing deduplicate_by_date against the original...")
+    rng = np.random.default_rng(3)
+    rows = 5000
+    months = list(pipeline.MONTH_NUMBERS) + ['Unknown']
+    df = pd.DataFrame({
+        'Client_ID': pd.Series(rng.integers(0, 800, rows).astype(str), dtype='str').where(rng.random(rows) > 0.02),
+        'Month': pd.Categorical(rng.choice(months, rows)),
+        'Year': rng.integers(2021, 2025, rows),
+        'Value': np.arange(rows),
+    }, index=np.arange(rows) * 3)
+    with_missing_years = df.assign(Year=df['Year'].astype('float64').where(rng.random(rows) > 0.05))
+    text_months = df.assign(Month=df['Month'].astype(str))
+    # Years given as text fall back to the sort
+    text_years = df.assign(Year=df['Year'].astype(object).where(df['Value'] % 2 == 0, df['Year'].astype(str)))
+
+    for frame in [df, with_missing_years, text_months, text_years, df.head(0)]:
+        pd.testing.assert_frame_equal(pipeline.deduplicate_by_date(frame, 'Client_ID'),
+                                      legacy_deduplicate_by_date(frame, 'Client_ID'))
+    print("[PASS] Deduplication matches the original")
+
+
+def test_deduplicate_keys_and_tie_breaks():
+    """Test composite keys, tie-break orders and the per-group dropped-row report"""
+    print("Testing multi-key deduplication with tie-breaks...")
+    rng = np.random.default_rng(5)
+    rows = 3000
+    df = pd.DataFrame({
+        'Client_ID': rng.integers(0, 150, rows).astype(str),
+        'new_Address': pd.Categorical(rng.choice(['1 Main St', '2 Oak Ave', None], rows)),
+        'Month': rng.choice(['January', 'February'], rows),
+        'Year': rng.choice([2023, 2024], rows),
+        'Service': pd.Categorical(rng.choice(['Housing', 'Outreach', 'Food', None], rows)),
+        'Dataset_Name': rng.choice(['march_file', 'april_file'], rows),
+        'Visits': rng.integers(0, 4, rows),
+    })
+    keys = ['Client_ID', 'new_Address']
+    tie_breakers = pipeline.parse_tie_breakers('Service: Outreach > Housing, Dataset_Name: file order, Visits: descending')
+    assert tie_breakers == [('Service', ['Outreach', 'Housing']), ('Dataset_Name', 'file order'), ('Visits', 'descending')]
+    result = pipeline.deduplicate_records(df, keys, tie_breakers, file_order=['april_file', 'march_file'])
+
+    # The same as sorting by date, then each tie-break, then original order, and dropping duplicates
+    ranked = df.assign(
+        _month=df['Month'].map(pipeline.MONTH_NUMBERS),
+        _service=df['Service'].map({'Outreach': 0, 'Housing': 1}).astype('float64').fillna(2),
+        _file=df['Dataset_Name'].map({'april_file': 0, 'march_file': 1}),
+        _position=np.arange(rows))
+    expected = ranked.sort_values(['Year', '_month', '_service', '_file', 'Visits', '_position'],
+                                  ascending=[False, False, True, True, False, True])
+    expected = expected.drop_duplicates(subset=keys)[list(df.columns)]
+    pd.testing.assert_frame_equal(result.data, expected)
+
+    sizes = df.groupby(keys, dropna=False, observed=True).size()
+    assert result.rows_dropped == rows - len(expected) == int((sizes - 1).sum())
+    assert list(result.dropped.columns) == keys + ['Rows_Dropped']
+    assert result.dropped['Rows_Dropped'].is_monotonic_decreasing and (result.dropped['Rows_Dropped'] > 0).all()
+    top = result.dropped.iloc[0]
+    assert top['Rows_Dropped'] == sizes.max() - 1
+    assert pipeline.deduplicate_by_date(df, 'Client_ID')['Client_ID'].is_unique
+
+    for bad in [(df, 'Missing', ()), (df, keys, [('Visits', 'sideways')])]:
+        try:
+            pipeline.deduplicate_records(*bad)
+        except pipeline.PipelineError:
+            continue
+        raise AssertionError(f"deduplicate_records{bad[1:]} did not raise PipelineError")
+    print(f"[PASS] {result.describe()}")
+
+
+def test_join_matches_merge():
+    """Test that the indexed left join gives the same table as a merge and reports its matches"""
+    print("Testing the indexed left join...")
+    rng = np.random.default_rng(7)
+    rows = 2000
+    cleaned = pd.DataFrame({
+        'Client_ID': pd.Series(rng.integers(0, 300, rows).astype(str), dtype='str').where(rng.random(rows) > 0.05),
+        'Count': rng.integers(0, 9, rows),
+        'new_Address': rng.choice(['1 Main St', '2 Oak Ave'], rows),
+    }, index=np.arange(rows) * 2)
+    summarized = pipeline.summarize_additional_data(
+        pd.DataFrame({'Client_ID': rng.integers(100, 400, 500).astype(str)}), 'Client_ID')
+    renamed = summarized.rename(columns={'Client_ID': 'ID'})
+    merge = lambda right, right_on: cleaned.merge(right, left_on='Client_ID', right_on=right_on, how='left',
+                                                  suffixes=('', '_additional'))
+    for right, right_on in [(summarized, 'Client_ID'), (renamed, 'ID')]:
+        pd.testing.assert_frame_equal(pipeline.join_additional_dataset(cleaned, right, 'Client_ID', right_on),
+                                      merge(right, right_on))
+
+    index = pipeline.JoinIndex(summarized, 'Client_ID')
+    result = index.join(cleaned, 'Client_ID')
+    matched = int(cleaned['Client_ID'].isin(summarized['Client_ID']).sum())
+    report = result.report
+    assert (report.rows, report.matched_rows, report.missed_rows) == (rows, matched, rows - matched)
+    assert report.unused_keys == len(set(summarized['Client_ID']) - set(cleaned['Client_ID']))
+    assert index.matches(summarized, 'Client_ID') and not index.matches(summarized.copy(), 'Client_ID')
+
+    # Integer IDs on one side match the same IDs as text on the other, and a re-join reuses the index
+    numbers = cleaned.assign(Client_ID=cleaned['Client_ID'].astype('float64'))
+    again = index.join(numbers, 'Client_ID')
+    assert again.report.matched_rows == matched and again.report.key_kind == "text"
+    pd.testing.assert_series_equal(again.data['Count_additional'], result.data['Count_additional'])
+    assert list(index._indexes) == ["text"]
+
+    # Keys equal once normalized are counted, and the first one is used
+    doubled = pd.DataFrame({'Client_ID': ['12', 12.0, 13], 'Count': [1, 2, 3]})
+    report = pipeline.JoinIndex(doubled, 'Client_ID').join(pd.DataFrame({'Client_ID': [12, 14]}), 'Client_ID').report
+    assert (report.matched_rows, report.duplicate_keys, report.unused_keys) == (1, 1, 1)
+    print(f"[PASS] {result.report.describe()}")
+
+
+def test_address_join():
+    """Test the approximate address join, on its own and in a pipeline run"""
+    print("Testing the address join...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        pd.DataFrame({'Location': ['1 Main Street', '1 Main Street', '2 Oak Avenue', '3 Pien St',
+                                   '7 Birch Rd']}).to_csv(paths['visits'], index=False)
+        config = make_config(paths)
+        config.summarize_column = config.additional_join_column = 'Location'
+        config.cleaned_join_column = 'new_Address'
+        config.match_addresses = True
+        graph = StepGraph()
+        result = pipeline.run_pipeline(config, graph=graph)
+
+        joined = result.joined_additional_data.set_index('Client_ID')
+        assert (joined.loc['C1', 'Location'] == '1 Main Street').all() and (joined.loc['C1', 'Match_Score'] == 1).all()
+        assert joined.loc['C3', 'Location'] == '3 Pien St' and 0.85 <= joined.loc['C3', 'Match_Score'] < 1
+        # The leftover unit number makes '2 Oak Ave #5' too unlike '2 Oak Avenue'
+        assert pd.isna(joined.loc['C2', 'Location']) and pd.isna(joined.loc['C4', 'Match_Score'])
+        report = result.join.report
+        assert (report.matched_rows, report.approximate_rows, report.unused_keys, report.key_kind) == (3, 1, 2, "address")
+
+        # A stricter threshold builds a new index; an unchanged one is reused
+        pipeline.run_pipeline(config, graph=graph)
+        assert 'join_index' in graph.reused
+        config.match_threshold = 1.0
+        strict = pipeline.run_pipeline(config, graph=graph)
+        assert 'join_index' in graph.computed and strict.join.report.approximate_rows == 0
+
+    fuzzy = pipeline.AddressJoinIndex(result.summarized_additional_data, 'Location', 0.8)
+    assert fuzzy.matches(result.summarized_additional_data, 'Location', 0.8)
+    assert not fuzzy.matches(result.summarized_additional_data, 'Location', 0.9)
+    misspelled = fuzzy.join(pd.DataFrame({'new_Address': ['1 Mian Street']}), 'new_Address')
+    assert misspelled.data.loc[0, 'Location'] == '1 Main Street' and misspelled.report.approximate_rows == 1
+    for bad in [('Missing', 0.8), ('Location', 0)]:
+        try:
+            pipeline.AddressJoinIndex(result.summarized_additional_data, *bad)
+        except pipeline.PipelineError:
+            continue
+        raise AssertionError(f"AddressJoinIndex{bad} did not raise PipelineError")
+    print(f"[PASS] {report.describe()}")
+
+
+def test_duplicate_clients():
+    """Test that a pipeline run can link spellings of a client and deduplicate on the cluster"""
+    print("Testing duplicate clients in a pipeline run...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        pd.DataFrame({'Client_ID': ['C1', 'C2', 'C3'], 'Name': ['John Smith', 'Maria Garcia', 'Ann Lee'],
+                      'Address': ['1 Main St Apt 2', '2 Oak Ave', '3 Pine St']}).to_csv(paths['january'], index=False)
+        pd.DataFrame({'Client_ID': ['C7', 'C4'], 'Name': ['Smith, Jon', 'Bo Chen'],
+                      'Address': ['1 Main Street Unit 2', '4 Elm Dr'], 'Amount': [1, 2]}).to_csv(paths['february'], index=False)
+        config = make_config(paths)
+        config.client_name_columns = ['Name']
+        config.dedup_column = 'Client_Cluster'
+        result = pipeline.run_pipeline(config)
+
+    clusters = result.cleaned_data.set_index('Client_ID')['Client_Cluster']
+    assert clusters['C1'] == clusters['C7'] and clusters.nunique() == 4
+    assert len(result.final_data) == 4 and result.final_data.set_index('Client_Cluster').loc[clusters['C1'], 'Month'] == 'February'
+    assert 'resolve_clients' in result.timings and result.clients.clusters_merged == 1
+
+    config.client_name_columns = ['Missing']
+    try:
+        pipeline.run_pipeline(config)
+    except pipeline.PipelineError:
+        pass
+    else:
+        raise AssertionError("A missing name column did not raise PipelineError")
+    print(f"[PASS] {result.clients.describe()}")
+
+
+def test_combine_matches_original():
+    """Test that combining column by column gives the same table as copying and concatenating"""
+    print("Testing combine_datasets against the original...")
+    datasets = {
+        'january': pd.DataFrame({'Client_ID': ['C1', 'nan'], 'Value': [1, 2]}),
+        'february': pd.DataFrame({'Client_ID': [3], 'Notes': ['Moved']}),
+        'march': pd.DataFrame({'Client_ID': pd.Series([], dtype=object), 'Value': pd.Series([], dtype=float)}),
+    }
+    info = {'january': {'month': 'January', 'year': 2024, 'service': 'Outreach'},
+            'february': {'month': 'February', 'year': '2024', 'service': 'Outreach'},
+            'march': {'month': 'March', 'year': 2024, 'service': 'Housing'}}
+
+    combined = pipeline.combine_datasets(datasets, info)
+    expected = legacy_combine_datasets(datasets, info)
+    for col in ['Month', 'Service', 'Dataset_Name']:
+        assert isinstance(combined[col].dtype, pd.CategoricalDtype)
+        combined[col] = combined[col].astype(expected[col].dtype)
+    pd.testing.assert_frame_equal(combined, expected)
+    print("[PASS] Combined table matches the original")
+
+
+def test_optimize_dtypes():
+    """Test that low-cardinality text becomes categorical and exports the same text"""
+    print("Testing categorical dtype optimization...")
+    rows = 1000
+    df = pd.DataFrame({
+        'Client_ID': [f'C{i}' for i in range(rows)],
+        'Status': ['Active', 'Closed', None, 'Pending'] * (rows // 4),
+        'Visits': list(range(4)) * (rows // 4),
+        'Mixed': [1, 'a'] * (rows // 2),
+    })
+    optimized = pipeline.optimize_dtypes(df)
+    assert isinstance(optimized['Status'].dtype, pd.CategoricalDtype)
+    assert list(optimized['Status'].cat.categories) == ['Active', 'Closed', 'Pending']
+    for col in ['Client_ID', 'Visits', 'Mixed']:
+        assert optimized[col].dtype == df[col].dtype, col
+    assert optimized.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+    assert optimized.sort_values('Status')['Status'].tolist() == df.sort_values('Status')['Status'].tolist()
+
+    flags = pipeline.yes_no_category(pd.Series(['Yes', 'No', 'No']))
+    assert flags.dtype.categories.tolist() == ['No', 'Yes'] and flags.tolist() == ['Yes', 'No', 'No']
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for extension in ('.csv', '.xlsx'):
+            paths = [os.path.join(temp_dir, f'{name}{extension}') for name in ('text', 'optimized')]
+            pipeline.export_dataset(df.assign(Flag=['Yes', 'No'] * (rows // 2)), paths[0])
+            pipeline.export_dataset(optimized.assign(Flag=pipeline.yes_no_category(pd.Series(['Yes', 'No'] * (rows // 2)))), paths[1])
+            reader = pd.read_csv if extension == '.csv' else pd.read_excel
+            pd.testing.assert_frame_equal(reader(paths[0]), reader(paths[1]))
+    print("[PASS] Categorical columns use less memory and export unchanged")
+
+
+def test_stage_snapshots():
+    """Test that stages share unchanged columns and can be reverted"""
+    print("Testing stage snapshots...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result = pipeline.run_pipeline(make_config(write_sample_files(temp_dir)))
+
+    stages = result.stages
+    assert stages.names() == ['combined', 'cleaned', 'joined', 'final']
+    combined, cleaned, joined = result.combined_data, result.cleaned_data, result.joined_additional_data
+    # The cleaned and joined stages hold references to the combined columns, not copies
+    for later in (cleaned, joined):
+        for col in ('Year', 'Address', 'Month'):
+            assert same_data(later[col], combined[col]), col
+    assert 'cleaned (+3 columns)' in stages.describe() and 'rows kept' in stages.describe()
+    pd.testing.assert_frame_equal(result.final_data, pipeline.deduplicate_by_date(joined, 'Client_ID'))
+
+    copies = sum(df.memory_usage(index=False).sum() for df in (combined, cleaned, joined, result.final_data))
+    assert stages.memory_usage() < copies
+
+    pd.testing.assert_frame_equal(stages.undo(), joined)
+    pd.testing.assert_frame_equal(stages.revert('combined'), combined)
+    assert stages.names() == ['combined'] and result.cleaned_data is None
+
+    # A step that replaces a column of its base keeps its own values
+    reloaded = pipeline.PipelineResult()
+    reloaded.combined_data = pd.DataFrame({'Address': ['12 Main Street', '9 Oak Road'], 'new_Address': ['OLD', 'OLD']})
+    cleaner = AddressCleaner(DefaultSettings.get_defaults())
+    expected = pipeline.clean_address_data(reloaded.combined_data, 'Address', cleaner)
+    reloaded.cleaned_data = pipeline.clean_address_data(reloaded.combined_data, 'Address', cleaner)
+    pd.testing.assert_frame_equal(reloaded.cleaned_data, expected)
+    assert reloaded.cleaned_data['new_Address'].tolist() != ['OLD', 'OLD']
+    reloaded.joined_additional_data = reloaded.cleaned_data
+    reloaded.final_data = reloaded.joined_additional_data.iloc[[1]].assign(Address='changed')
+    assert reloaded.final_data['Address'].tolist() == ['changed']
+
+    # Reading a stage again does not rebuild it, and changing what was read leaves the stage as stored
+    first = reloaded.cleaned_data
+    first['Address'] = 'edited'
+    assert same_data(first['new_Address'], reloaded.cleaned_data['new_Address'])
+    assert reloaded.cleaned_data['Address'].tolist() == ['12 Main Street', '9 Oak Road']
+    first = reloaded.final_data
+    first['Address'] = 'edited'
+    assert reloaded.final_data['Address'].tolist() == ['changed']
+
+    # Shallow copies share their data whichever way the column is stored; replaced columns do not
+    columns = {
+        'numbers': pd.Series([1.5, 2.5, 3.5]),
+        'text': pd.Series(['a', 'b', None], dtype=pd.StringDtype('python', na_value=np.nan)),
+        'category': pd.Series(['x', 'y', 'x'], dtype='category'),
+        'dates': pd.Series(pd.to_datetime(['2024-01-01', '2024-02-01', None])),
+    }
+    if importlib.util.find_spec('pyarrow'):
+        columns['arrow_text'] = pd.Series(['a', 'b', None], dtype=pd.StringDtype('pyarrow', na_value=np.nan))
+    table = pd.DataFrame(columns, copy=False)
+    shallow = table.copy(deep=False).assign(Extra=1)
+    for col in columns:
+        assert same_data(shallow[col], columns[col]), col
+        assert not same_data(pd.Series(columns[col].tolist(), dtype=columns[col].dtype), columns[col]), col
+    print(f"[PASS] Stages share columns ({stages.memory_usage():,} bytes held, {', '.join(columns)} checked)")
+
+
+def test_incremental_rerun():
+    """Test that a re-run with a step graph only redoes what a change made stale"""
+    print("Testing incremental re-runs...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        config = make_config(paths)
+        graph = StepGraph()
+        first = pipeline.run_pipeline(config, graph=graph)
+        assert first.reused == [] and 'clean:clients_january' in graph.computed
+
+        # Only the metadata changed: the files and the cleaned addresses are reused
+        config.datasets[1]['month'] = 'March'
+        second = pipeline.run_pipeline(config, graph=graph)
+        assert graph.computed == ['combine', 'left_join', 'deduplicate'] and 'join_index' in second.reused
+        assert second.final_data.set_index('Client_ID').loc['C1', 'Month'] == 'March'
+
+        # One file changed: only that file is read and cleaned again
+        pd.DataFrame({'Client_ID': ['C1', 'C5'], 'Address': ['9 Elm St Apt 1', '5 Oak Ave'],
+                      'Amount': [1, 2]}).to_csv(paths['february'], index=False)
+        os.utime(paths['february'], ns=(0, os.stat(paths['february']).st_mtime_ns + 10**9))
+        third = pipeline.run_pipeline(config, graph=graph)
+        assert 'load:clients_january' in third.reused and 'clean:clients_january' in third.reused
+        assert 'clean:clients_february' in graph.computed
+
+        full = pipeline.run_pipeline(config)
+        for stage in ('combined_data', 'cleaned_data', 'joined_additional_data', 'final_data'):
+            pd.testing.assert_frame_equal(getattr(third, stage), getattr(full, stage))
+    print(f"[PASS] Re-runs reuse {len(third.reused)} unchanged steps and match a full run")
+
+
+def test_step_errors():
+    """Test that steps report bad options with PipelineError"""
+    print("Testing pipeline step errors...")
+    df = pd.DataFrame({'A': [1]})
+    for step, args in [
+        (pipeline.combine_datasets, ({}, {})),
+        (pipeline.rename_columns, (df, {'Missing': 'B'})),
+        (pipeline.summarize_additional_data, (df, 'Missing')),
+        (pipeline.deduplicate_by_date, (df, 'A')),
+    ]:
+        try:
+            step(*args)
+        except pipeline.PipelineError:
+            continue
+        raise AssertionError(f"{step.__name__} did not raise PipelineError")
+    print("[PASS] Bad options raise PipelineError")
+
+
+def test_export_round_trip():
+    """Test that export writes CSV and Excel files that read back the same"""
+    print("Testing export...")
+    df = pd.DataFrame({'Client_ID': ['C1', 'C2'], 'Count': [2, 1]})
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for extension, reader in [('.csv', pd.read_csv), ('.xlsx', pd.read_excel)]:
+            path = os.path.join(temp_dir, f'export{extension}')
+            report = pipeline.export_dataset(df, path)
+            pd.testing.assert_frame_equal(reader(path), df, check_dtype=False)
+            assert report.rows == 2 and len(report.parts) == 1
+    print("[PASS] Exports read back unchanged")
+
+
+def test_excel_export_splits_sheets():
+    """Test that the streaming Excel export leaves missing cells empty and splits at the sheet limit"""
+    print("Testing Excel export across sheets...")
+    df = pd.DataFrame({
+        'Client_ID': [f'C{i}' for i in range(7)],
+        'Count': [1, 2, None, 4, 5, 6, 7],
+        'Flag': pipeline.yes_no_category(pd.Series(['Yes', 'No'] * 3 + ['Yes'])),
+        'Note': ['a', None, 'c', 'd', 'e', 'f', 'g'],
+    })
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'export.xlsx')
+        progress = []
+        # Four rows per sheet: the header and three data rows
+        sheets = pipeline.write_excel(df, path, lambda done, total: progress.append((done, total)), max_rows=4)
+        assert sheets == ['Sheet1', 'Sheet2', 'Sheet3'] and progress[-1] == (7, 7)
+        read_back = pd.read_excel(path, sheet_name=None)
+        assert list(read_back) == sheets and [len(part) for part in read_back.values()] == [3, 3, 1]
+        expected = df.assign(Flag=df['Flag'].astype(object))
+        pd.testing.assert_frame_equal(pd.concat(read_back.values(), ignore_index=True), expected, check_dtype=False)
+
+        # An empty frame still gets its header row
+        pipeline.write_excel(df.head(0), path)
+        assert list(pd.read_excel(path).columns) == list(df.columns)
+    print("[PASS] Excel export splits across sheets")
+
+
+def test_export_formats():
+    """Test the compressed CSV, SQLite and Parquet exports (Parquet and zstd only when installed)"""
+    print("Testing export formats...")
+    df = pd.DataFrame({
+        'Client_ID': ['C1', 'C2', None],
+        'Count': [2, None, 1],
+        'Flag': pipeline.yes_no_category(pd.Series(['Yes', 'No', 'Yes'])),
+    })
+    expected = df.assign(Flag=df['Flag'].astype(object))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'export.csv.gz')
+        progress = []
+        pipeline.export_dataset(df, path, lambda done, total: progress.append(done))
+        pd.testing.assert_frame_equal(pd.read_csv(path), expected, check_dtype=False)
+        assert progress == [3]
+
+        path = os.path.join(temp_dir, 'export.sqlite')
+        pipeline.export_dataset(df.head(1), path, index_columns=['Client_ID', 'Missing'])
+        # Exporting again replaces the table
+        report = pipeline.export_dataset(df, path, index_columns=['Client_ID', 'Missing'])
+        connection = sqlite3.connect(path)
+        try:
+            read_back = pd.read_sql('SELECT * FROM export', connection)
+            indexes = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        finally:
+            connection.close()
+        pd.testing.assert_frame_equal(read_back, expected, check_dtype=False)
+        assert indexes == [('export_Client_ID',)] and report.rows == 3
+
+        # A cancelled export leaves the existing file or table as it was, and no partial file
+        def cancel(done, total):
+            raise TaskCancelled()
+
+        def read_export(path):
+            if path.endswith('.sqlite'):
+                with closing(sqlite3.connect(path)) as connection:
+                    return pd.read_sql('SELECT * FROM export', connection)
+            return pd.read_csv(path)
+
+        for path in [os.path.join(temp_dir, 'export.csv.gz'), os.path.join(temp_dir, 'export.sqlite')]:
+            before = read_export(path)
+            try:
+                pipeline.export_dataset(df.head(2), path, cancel)
+            except TaskCancelled:
+                pass
+            else:
+                raise AssertionError("The cancelled export finished")
+            pd.testing.assert_frame_equal(read_export(path), before)
+        assert not [name for name in os.listdir(temp_dir) if name.endswith('.partial')]
+
+        for extension, available in [('.parquet', pipeline.PARQUET_AVAILABLE), ('.csv.zst', pipeline.ZSTD_AVAILABLE)]:
+            path = os.path.join(temp_dir, f'export{extension}')
+            try:
+                pipeline.export_dataset(df, path)
+            except pipeline.PipelineError:
+                assert not available
+                continue
+            read_back = pd.read_parquet(path) if extension == '.parquet' else pd.read_csv(path)
+            pd.testing.assert_frame_equal(read_back.astype({'Flag': object}), expected, check_dtype=False)
+    print(f"[PASS] Export formats read back unchanged (Parquet: {pipeline.PARQUET_AVAILABLE}, zstd: {pipeline.ZSTD_AVAILABLE})")
+
+
+def test_excel_sheets():
+    """Test that sheet names come from the workbook index and a chosen sheet is read"""
+    print("Testing Excel sheet discovery and reading...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'clients.xlsx')
+        with pd.ExcelWriter(path) as writer:
+            pd.DataFrame({'Client_ID': ['C1'], 'Value': [1]}).to_excel(writer, sheet_name='Summary', index=False)
+            pd.DataFrame({'Client_ID': ['C2', 'C3'], 'Value': [2, 3]}).to_excel(writer, sheet_name='Détail 2024', index=False)
+
+        with pd.ExcelFile(path, engine='openpyxl') as excel_file:
+            assert pipeline.get_sheet_names(path) == excel_file.sheet_names == ['Summary', 'Détail 2024']
+        assert pipeline.read_dataset(path)['Client_ID'].tolist() == ['C1']
+        assert pipeline.read_dataset(path, 'Détail 2024')['Value'].tolist() == [2, 3]
+    print(f"[PASS] Sheets are listed and read (engine: {pipeline.EXCEL_ENGINE or 'openpyxl'})")
+
+
+def test_dummy_row_detection():
+    """Test that vectorized dummy-row detection matches the original per-cell check"""
+    print("Testing dummy-row detection...")
+    blocks = [
+        pd.DataFrame({'A': ['REPORT', None, '1', '2'], 'B': [None, None, '3.5', 'x'], 'C': [None, 'nan', '-1e3', None]}),
+        pd.DataFrame({'A': ['Title', 'NaN', ' +nan '], 'B': [None, '4', '5'], 'C': [True, False, True]}),
+        pd.DataFrame({'A': [1, 2], 'B': [pd.Timestamp('2024-01-01'), pd.NaT], 'C': ['a', 'b']}),
+        pd.DataFrame({'A': ['only', 'text', 'here']}),
+        pd.DataFrame({'A': [None, None], 'B': [None, None]}),
+    ]
+    for df in blocks:
+        pd.testing.assert_frame_equal(pipeline.detect_and_skip_dummy_rows(df), legacy_detect_and_skip_dummy_rows(df))
+    assert pipeline.find_header_row(blocks[-1]) == (0, None)
+    print("[PASS] Dummy rows match the original check")
+
+
+def test_raw_header_scan():
+    """Test that a long title banner is skipped and the real header row is used"""
+    print("Testing the raw header scan...")
+    banner = [['MONTHLY CLIENT REPORT'], ['Prepared by WMPH']] + [[f'Note {i}'] for i in range(10)] + [[]]
+    rows = banner + [['Client_ID', 'Address', 'Value'], ['', '', ''], ['C1', '1 Main St', '10'], ['C2', '2 Oak Ave', '20']]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        csv_path = os.path.join(temp_dir, 'report.csv')
+        xlsx_path = os.path.join(temp_dir, 'report.xlsx')
+        padded = pd.DataFrame([row + [''] * (3 - len(row)) for row in rows])
+        padded.to_csv(csv_path, header=False, index=False)
+        padded.replace('', None).to_excel(xlsx_path, header=False, index=False)
+
+        for path in (csv_path, xlsx_path):
+            df = pipeline.read_dataset(path, header_window=20, scan_raw=True)
+            assert list(df.columns) == ['Client_ID', 'Address', 'Value'], path
+            assert df['Client_ID'].tolist() == ['C1', 'C2'], path
+        # Without the raw scan, pandas takes the banner title as the header
+        assert 'Client_ID' not in pipeline.read_dataset(csv_path, header_window=20).columns
+    print("[PASS] Title banners longer than the default window are skipped")
+
+
+def test_load_files_in_parallel():
+    """Test that files load in worker processes, in order, with per-file errors and times"""
+    print("Testing parallel file loading...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        files = [(paths['january'], None), (os.path.join(temp_dir, 'missing.csv'), None), (paths['visits'], None)]
+        sequential = pipeline.load_files(files, workers=1)
+        parallel = pipeline.load_files(files, workers=2)
+
+    assert [load.ok for load in parallel] == [True, False, True]
+    assert 'missing.csv' in parallel[1].error
+    for expected, actual in zip(sequential, parallel):
+        assert actual.file_path == expected.file_path and actual.seconds >= 0
+        if expected.ok:
+            pd.testing.assert_frame_equal(expected.data, actual.data)
+    print("[PASS] Files load concurrently and report their own errors")
+
+
+def test_dataset_cache():
+    """Test that unchanged files reload from the dataset cache and changed files are parsed again"""
+    print("Testing the dataset cache...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        cache = DatasetCache(os.path.join(temp_dir, 'cache'))
+        files = [(paths['january'], None), (paths['visits'], None)]
+
+        first = pipeline.load_files(files, cache=cache)
+        second = pipeline.load_files(files, cache=cache)
+        assert [load.cached for load in first] == [False, False]
+        assert [load.cached for load in second] == [True, True]
+        for parsed, cached in zip(first, second):
+            pd.testing.assert_frame_equal(parsed.data, cached.data)
+
+        pd.DataFrame({'Client': ['C5']}).to_csv(paths['visits'], index=False)
+        os.utime(paths['visits'], ns=(0, os.stat(paths['visits']).st_mtime_ns + 10**9))
+        third = pipeline.load_files(files, cache=cache)
+        assert [load.cached for load in third] == [True, False]
+        assert third[1].data['Client'].tolist() == ['C5']
+        assert cache.info()['entries'] == 2
+
+        cache.clear()
+        assert cache.info()['entries'] == 0
+    print("[PASS] Unchanged files come from the cache")
+
+
+def test_streaming_matches_in_memory():
+    """Test that streaming CSVs in chunks writes the same joined rows as the in-memory run"""
+    print("Testing streaming CSV ingestion...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        # Grow the monthly files so they span several chunks
+        for path in (paths['january'], paths['february']):
+            df = pd.read_csv(path, dtype=str)
+            extra = df.iloc[2:].sample(60, replace=True, random_state=1)
+            pd.concat([df, extra], ignore_index=True).to_csv(path, index=False)
+
+        config = make_config(paths)
+        expected_path = os.path.join(temp_dir, 'expected.csv')
+        streamed_path = os.path.join(temp_dir, 'streamed.csv')
+        pipeline.run_pipeline(config).joined_additional_data.to_csv(expected_path, index=False)
+
+        chunks = []
+        result = pipeline.stream_pipeline(config, streamed_path, chunk_rows=10,
+                                          progress=lambda done, total: chunks.append((done, total)))
+        expected = pd.read_csv(expected_path)
+        streamed = pd.read_csv(streamed_path)
+
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
+    assert result.rows_written == len(expected) == 125
+    assert len(chunks) > 10 and chunks[-1][0] == chunks[-1][1]
+    print(f"[PASS] Streamed {result.rows_written} rows in {len(chunks)} chunks")
+
+
+def test_batch_manifest():
+    """Test that a JSON manifest runs end to end and writes the requested exports"""
+    print("Testing the batch runner...")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = write_sample_files(temp_dir)
+        manifest = {
+            'datasets': [
+                {'path': 'clients_january.csv', 'month': 'January', 'year': 2024, 'service': 'Outreach'},
+                {'path': 'clients_february.csv', 'month': 'February', 'year': 2024, 'service': 'Outreach',
+                 'renames': {'Amount': 'Value'}},
+            ],
+            'address_column': 'Address',
+            'additional_dataset': {'path': 'visits.csv', 'summarize_column': 'Client'},
+            'join_column': 'Client_ID',
+            'dedup_column': 'Client_ID',
+            'exports': {'final': 'output/final.csv', 'cleaned': 'output/cleaned.xlsx',
+                        'joined': 'output/joined.sqlite'},
+        }
+        manifest_path = os.path.join(temp_dir, 'job.json')
+        settings_path = os.path.join(temp_dir, 'settings.json')
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        with open(settings_path, 'w') as f:
+            json.dump({'cache_file': '', 'dataset_cache_dir': ''}, f)
+
+        result = batch_runner.run_job(manifest_path, settings_path)
+        expected = pipeline.run_pipeline(make_config(paths)).final_data
+        final = pd.read_csv(os.path.join(temp_dir, 'output', 'final.csv'))
+        assert final['Client_ID'].tolist() == expected['Client_ID'].tolist()
+        assert os.path.exists(os.path.join(temp_dir, 'output', 'cleaned.xlsx'))
+        # The rows dropped for each key are written beside the final export
+        dropped = pd.read_csv(os.path.join(temp_dir, 'output', 'final_dropped.csv'))
+        assert dropped.to_dict('records') == [{'Client_ID': 'C1', 'Rows_Dropped': 1}]
+        connection = sqlite3.connect(os.path.join(temp_dir, 'output', 'joined.sqlite'))
+        try:
+            assert connection.execute('SELECT COUNT(*) FROM export').fetchone()[0] == len(result.joined_additional_data)
+            assert [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")] == [
+                'export_Client_ID']
+        finally:
+            connection.close()
+        assert len(result.timings) == 8
+
+        del manifest['dedup_column']
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        assert batch_runner.main([manifest_path, '--settings', settings_path]) == 1
+    print("[PASS] Manifest jobs run headless and report failures")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Pipeline Tests")
+    print("=" * 60)
+
+    tests = [
+        test_full_pipeline_run,
+        test_combine_matches_original,
+        test_deduplicate_matches_original,
+        test_deduplicate_keys_and_tie_breaks,
+        test_join_matches_merge,
+        test_address_join,
+        test_duplicate_clients,
+        test_optimize_dtypes,
+        test_stage_snapshots,
+        test_incremental_rerun,
+        test_step_errors,
+        test_export_round_trip,
+        test_excel_export_splits_sheets,
+        test_export_formats,
+        test_excel_sheets,
+        test_dummy_row_detection,
+        test_raw_header_scan,
+        test_load_files_in_parallel,
+        test_dataset_cache,
+        test_streaming_matches_in_memory,
+        test_batch_manifest,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
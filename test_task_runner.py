@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for the background task runner and the progress reporting of the pipeline steps
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+import pipeline
+from address_cleaner import AddressCleaner
+from benchmarks import make_synthetic_addresses
+from default_settings import DefaultSettings
+from task_runner import TaskCancelled, TaskRunner
+
+
+class PollingLoop:
+    """Stands in for the Tk main loop: runs the callbacks scheduled with after()"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def run_until_idle(self, timeout=10):
+        deadline = time.time() + timeout
+        while self.scheduled and time.time() < deadline:
+            self.scheduled.pop(0)()
+            time.sleep(0.01)
+        assert not self.scheduled, "task did not finish in time"
+
+
+def test_task_reports_progress_and_result():
+    """Test that progress and the result are handed back through the polling loop"""
+    print("Testing TaskRunner progress and results...")
+    loop = PollingLoop()
+    reported, states, results = [], [], []
+    runner = TaskRunner(loop, on_progress=lambda name, done, total: reported.append((done, total)),
+                        on_state_change=lambda busy, name: states.append(busy))
+
+    def work(progress):
+        for done in range(1, 4):
+            progress(done, 3)
+            time.sleep(0.02)
+        return threading.current_thread() is not threading.main_thread()
+
+    assert runner.start("Counting", work, results.append)
+    assert not runner.start("Second task", work, results.append)
+    loop.run_until_idle()
+
+    assert results == [True], "work should run off the main thread"
+    assert reported and reported[-1] == (3, 3)
+    assert states == [True, False] and not runner.busy
+    print("[PASS] Progress and results reach the main loop")
+
+
+def test_task_cancel_and_error():
+    """Test that cancelling stops a task and that errors are passed to on_error"""
+    print("Testing TaskRunner cancel and errors...")
+    loop = PollingLoop()
+    runner = TaskRunner(loop)
+    outcomes = []
+
+    def endless(progress):
+        while True:
+            progress(0, 1)
+            time.sleep(0.01)
+
+    runner.start("Endless", endless, outcomes.append, on_cancel=lambda: outcomes.append("cancelled"))
+    runner.cancel()
+    loop.run_until_idle()
+
+    def failing(progress):
+        raise ValueError("bad column")
+
+    runner.start("Failing", failing, outcomes.append, on_error=lambda e: outcomes.append(str(e)))
+    loop.run_until_idle()
+    assert outcomes == ["cancelled", "bad column"]
+    print("[PASS] Tasks can be cancelled and report errors")
+
+
+def test_pipeline_steps_report_progress():
+    """Test that cleaning and CSV export report row progress and can be cancelled midway"""
+    print("Testing pipeline progress reporting...")
+    settings = dict(DefaultSettings.get_defaults(), parallel_chunk_size=1000)
+    df = pd.DataFrame({'Address': make_synthetic_addresses(10000, distinct=10000)})
+
+    reported = []
+    cleaned = pipeline.clean_address_data(df, 'Address', AddressCleaner(settings),
+                                          lambda done, total: reported.append((done, total)))
+    expected = pipeline.clean_address_data(df, 'Address', AddressCleaner(settings))
+    pd.testing.assert_frame_equal(cleaned, expected)
+    assert len(reported) > 5 and reported[-1][0] == reported[-1][1]
+
+    def cancel_halfway(done, total):
+        if done > total / 2:
+            raise TaskCancelled()
+
+    try:
+        pipeline.clean_address_data(df, 'Address', AddressCleaner(settings), cancel_halfway)
+        raise AssertionError("cleaning was not cancelled")
+    except TaskCancelled:
+        pass
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for frame in (expected, expected.head(0)):
+            chunked_path = os.path.join(temp_dir, 'chunked.csv')
+            plain_path = os.path.join(temp_dir, 'plain.csv')
+            pipeline.export_dataset(frame, chunked_path, lambda done, total: None)
+            pipeline.export_dataset(frame, plain_path)
+            with open(chunked_path, 'rb') as chunked, open(plain_path, 'rb') as plain:
+                assert chunked.read() == plain.read()
+    print("[PASS] Steps report progress without changing their output")
+
+
+def main():
+    """Run all tests"""
+    print("=" * 60)
+    print("Task Runner Tests")
+    print("=" * 60)
+
+    tests = [
+        test_task_reports_progress_and_result,
+        test_task_cancel_and_error,
+        test_pipeline_steps_report_progress,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except Exception as e:
+            print(f"[FAIL] {test.__name__}: {e}")
+        print()
+
+    print("=" * 60)
+    print(f"Tests completed: {passed}/{len(tests)} passed")
+    print("=" * 60)
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)